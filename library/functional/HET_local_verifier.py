@@ -0,0 +1,515 @@
+import sympy
+import keyword
+import math
+from sympy.parsing.sympy_parser import parse_expr
+from sympy.parsing.sympy_parser import convert_xor
+from sympy.parsing.sympy_parser import _token_splittable
+from sympy.parsing.sympy_parser import split_symbols_custom
+from sympy.parsing.sympy_parser import implicit_application
+from sympy.parsing.sympy_parser import implicit_multiplication
+from sympy.parsing.sympy_parser import standard_transformations
+from ..fundamental import *
+
+
+__all__ = [
+    "HET_local_verify",
+]
+
+
+# 与 HET_model_verify 提示词中的数值容差保持一致
+_relative_tolerance: float = 0.01
+_max_expression_length: int = 300
+_sample_point_num: int = 6
+_min_valid_sample_num: int = 3
+
+
+_greek_letters: Tuple[str, ...] = (
+    "alpha", "beta", "gamma", "delta", "epsilon", "zeta", "eta", "theta", "iota", "kappa",
+    "mu", "nu", "xi", "rho", "sigma", "tau", "upsilon", "phi", "chi", "psi", "omega",
+    "Gamma", "Delta", "Theta", "Xi", "Sigma", "Upsilon", "Phi", "Psi", "Omega",
+)
+_latex_names: Dict[str, str] = {
+    **{letter: letter for letter in _greek_letters},
+    "lambda": "lamda", "Lambda": "Lamda",
+    "varepsilon": "epsilon", "vartheta": "theta", "varphi": "phi", "varrho": "rho", "varsigma": "sigma",
+    "pi": "pi", "hbar": "hbar", "ell": "ell",
+    "sin": "sin", "cos": "cos", "tan": "tan", "cot": "cot", "sec": "sec", "csc": "csc",
+    "arcsin": "asin", "arccos": "acos", "arctan": "atan",
+    "sinh": "sinh", "cosh": "cosh", "tanh": "tanh",
+    "exp": "exp", "ln": "log", "log": "log",
+    "cdot": "*", "times": "*", "div": "/",
+}
+_unsplittable_names: Set[str] = {"hbar", "ell", "lamda", "Lamda"}
+_sympy_functions: Tuple[str, ...] = (
+    "sqrt", "exp", "log", "sin", "cos", "tan", "cot", "sec", "csc",
+    "asin", "acos", "atan", "sinh", "cosh", "tanh",
+)
+
+# parse_expr 内部用 eval 执行转换后的代码：只开放必要的 sympy 名字并屏蔽内置函数
+# 注意不放入 E / I / N / S 等 sympy 默认名字，物理题中它们通常是普通物理量
+_parse_globals: Dict[str, Any] = {
+    "__builtins__": {},
+    "Integer": sympy.Integer,
+    "Float": sympy.Float,
+    "Rational": sympy.Rational,
+    "Symbol": sympy.Symbol,
+    "Function": sympy.Function,
+    "Add": sympy.Add,
+    "Mul": sympy.Mul,
+    "Pow": sympy.Pow,
+    "pi": sympy.pi,
+    **{name: getattr(sympy, name) for name in _sympy_functions},
+}
+_parse_transformations = standard_transformations + (
+    convert_xor,
+    split_symbols_custom(lambda name: name not in _unsplittable_names and _token_splittable(name)),
+    implicit_multiplication,
+    implicit_application,
+)
+
+_sub_question_marker_pattern = re.compile(r"(?:^|(?<=[\s;；,，.。:：]))[（(]\s*(\d{1,2})\s*[)）]")
+_boxed_command_pattern = re.compile(r"\\(?:boxed|fbox)\s*\{")
+_math_delimiter_pattern = re.compile(r"\$|\\\(|\\\)|\\\[|\\\]")
+_relation_pattern = re.compile(r"=|\\approx|\\simeq|\\equiv|≈")
+_spacing_pattern = re.compile(r"\\[,;:! ]|\\q?quad|~|\\displaystyle|\\left|\\right")
+_unit_start_pattern = re.compile(r"\\(?:mathrm|text|rm|mbox|textrm|unit)\b|\^\s*\{?\s*\\circ|°|\\?%")
+_font_command_pattern = re.compile(r"\\(?:mathrm|text|rm|mathit|textrm|operatorname)\s*\{([^{}]*)\}")
+_latex_command_pattern = re.compile(r"\\([A-Za-z]+)")
+_safe_expression_pattern = re.compile(r"[0-9A-Za-z_+\-*/^().\s]*")
+_identifier_pattern = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_choice_answer_pattern = re.compile(r"^\(?([A-H])\)?(?:[.．、:：\s]|$)")
+_cjk_pattern = re.compile(r"[\u3400-\u9fff]")
+
+
+def HET_local_verify(
+    problem: str,
+    answer: str,
+    response: str,
+)-> Dict[str, Any]:
+
+    """
+    HET_model_verify 之前的本地快速判定，毫秒级，不调用任何模型
+    - 从 response 中提取 \\boxed{} 答案，按 (1) (2) 等标记把参考答案与模型答案拆成小问后逐问比较
+    - 先比较规范化后的 LaTeX 文本，再用 sympy 解析：纯数值按 ±1% 容差比较，含符号的表达式在随机采样点上比较数值
+    - 只给出有把握的结论：纯数值不符才判错；符号表达式不等价、带不同单位（包括 %、角度与弧度）、无法解析或无法对齐小问时一律不下结论
+    返回 verdict（"pass" / "fail" / "undecided"）、score（与 HET_model_verify 同尺度，undecided 时为 None）与 justification
+    """
+
+    try:
+        return _local_verify(problem, answer, response)
+    except Exception as error:
+        return _undecided(f"本地判定出错: {error}")
+
+
+def _local_verify(
+    problem: str,
+    answer: str,
+    response: str,
+)-> Dict[str, Any]:
+
+    if not isinstance(response, str) or not isinstance(answer, str):
+        return _undecided("参考答案或模型回答缺失")
+
+    response_answers = _extract_boxed(response)
+    if not response_answers:
+        return _undecided("模型回答中没有 \\boxed{} 答案")
+
+    reference_boxed = _extract_boxed(answer)
+    if len(reference_boxed) > 1:
+        reference_parts = reference_boxed
+    else:
+        reference_parts = _split_sub_questions(reference_boxed[0] if reference_boxed else answer)
+
+    if len(response_answers) == 1 and len(reference_parts) > 1:
+        response_answers = _split_sub_questions(response_answers[0])
+
+    if len(reference_parts) == 1 and len(response_answers) > 1:
+        # 参考答案只有一问而模型框了多个答案时，只在最后一个框通过时下结论
+        if _compare_answers(problem, reference_parts[0], response_answers[-1])[0] is True:
+            return {
+                "verdict": "pass",
+                "score": 100.0,
+                "justification": "本地判定：共 1 问，模型最后一个 \\boxed{} 答案与参考答案等价",
+            }
+        return _undecided("参考答案只有一问，但模型给出了多个 \\boxed{} 答案")
+
+    if len(reference_parts) != len(response_answers):
+        return _undecided(f"参考答案有 {len(reference_parts)} 问，模型给出 {len(response_answers)} 个答案，无法对齐")
+
+    outcomes: List[bool] = []
+    details: List[str] = []
+    for index, (reference_part, response_part) in enumerate(zip(reference_parts, response_answers), 1):
+        outcome, reason = _compare_answers(problem, reference_part, response_part)
+        if outcome is None:
+            return _undecided(f"第 {index} 问{reason}")
+        outcomes.append(outcome)
+        details.append(f"第 {index} 问{'通过' if outcome else '未通过'}（{reason}）")
+
+    score = round(100.0 * sum(outcomes) / len(outcomes), 1)
+    return {
+        "verdict": "pass" if all(outcomes) else "fail",
+        "score": score,
+        "justification": f"本地判定：共 {len(outcomes)} 问；" + "；".join(details),
+    }
+
+
+def _undecided(
+    reason: str,
+)-> Dict[str, Any]:
+
+    return {
+        "verdict": "undecided",
+        "score": None,
+        "justification": reason,
+    }
+
+
+def _extract_boxed(
+    text: str,
+)-> List[str]:
+
+    results: List[str] = []
+    for match in _boxed_command_pattern.finditer(text):
+        content = _read_braced(text, match.end() - 1)
+        if content is not None:
+            results.append(content[0].strip())
+    return results
+
+
+def _read_braced(
+    text: str,
+    start: int,
+)-> Optional[Tuple[str, int]]:
+
+    """
+    text[start] 为左花括号时返回与之配对的花括号内的内容及右花括号之后的位置，不配对时返回 None
+    """
+
+    depth = 0
+    for index in range(start, len(text)):
+        if text[index] == "\\":
+            continue
+        if text[index] == "{" and (index == 0 or text[index - 1] != "\\"):
+            depth += 1
+        elif text[index] == "}" and text[index - 1] != "\\":
+            depth -= 1
+            if depth == 0:
+                return text[start + 1 : index], index + 1
+    return None
+
+
+def _split_sub_questions(
+    text: str,
+)-> List[str]:
+
+    # 只认从 1 开始连续编号、且第一个标记之前没有正文的拆分
+    matches = list(_sub_question_marker_pattern.finditer(text))
+    if len(matches) < 2 or text[:matches[0].start()].strip(" $\n"):
+        return [text.strip()]
+    if [int(match.group(1)) for match in matches] != list(range(1, len(matches) + 1)):
+        return [text.strip()]
+    return [
+        # 小问之间的分隔符（包括 "\\ " 这类 LaTeX 空格）不属于答案
+        text[match.end() : (matches[index + 1].start() if index + 1 < len(matches) else len(text))].strip().rstrip("\\;；,，").strip()
+        for index, match in enumerate(matches)
+    ]
+
+
+def _compare_answers(
+    problem: str,
+    reference: str,
+    candidate: str,
+)-> Tuple[Optional[bool], str]:
+
+    reference = _clean_latex(reference)
+    candidate = _clean_latex(candidate)
+    if not reference or not candidate:
+        return None, "答案为空"
+    if reference.replace(" ", "") == candidate.replace(" ", ""):
+        return True, "与参考答案文本一致"
+
+    choice_outcome = _compare_choices(problem, reference, candidate)
+    if choice_outcome is not None:
+        return choice_outcome
+
+    if _cjk_pattern.search(reference) or _cjk_pattern.search(candidate):
+        return None, "含有文字描述"
+
+    reference_value, reference_unit = _split_unit(_last_relation_side(reference))
+    candidate_value, candidate_unit = _split_unit(_last_relation_side(candidate))
+    if reference_unit != candidate_unit:
+        return None, "单位写法不同"
+
+    reference_expression = _parse_latex(reference_value)
+    candidate_expression = _parse_latex(candidate_value)
+    if reference_expression is None or candidate_expression is None:
+        return None, "无法解析为表达式"
+
+    reference_symbols = _free_symbols(reference_expression)
+    candidate_symbols = _free_symbols(candidate_expression)
+    if {symbol.name for symbol in reference_symbols} != {symbol.name for symbol in candidate_symbols}:
+        return None, "所含符号不同"
+
+    if not reference_symbols:
+        reference_number = _evaluate(reference_expression, {})
+        candidate_number = _evaluate(candidate_expression, {})
+        if reference_number is None or candidate_number is None:
+            return None, "无法求出数值"
+        if _is_close(candidate_number, reference_number):
+            return True, f"数值 {_format_number(candidate_number)} 与参考答案 {_format_number(reference_number)} 相差不超过 1%"
+        # \frac{\pi}{6} 与 30 这类差异可能只是弧度与角度的写法不同，与单位不同一样不下结论
+        if _may_differ_in_angle_unit(reference_expression, candidate_expression, reference_number, candidate_number):
+            return None, "数值不同，但可能只是弧度与角度的写法不同"
+        return False, f"数值 {_format_number(candidate_number)} 与参考答案 {_format_number(reference_number)} 相差超过 1%"
+
+    # 符号表达式在随机正数采样点上比较，采样点固定，保证判定可复现
+    generator = random.Random(0)
+    symbols = sorted(reference_symbols | candidate_symbols, key=lambda symbol: symbol.name)
+    valid_sample_num = 0
+    for _ in range(_sample_point_num):
+        point: Dict[sympy.Basic, Union[sympy.Basic, float]] = {
+            symbol: generator.uniform(0.5, 2.0) for symbol in symbols
+        }
+        reference_number = _evaluate(reference_expression, point)
+        candidate_number = _evaluate(candidate_expression, point)
+        if reference_number is None or candidate_number is None:
+            continue
+        if not _is_close(candidate_number, reference_number):
+            return None, "符号表达式在采样点上与参考答案不一致"
+        valid_sample_num += 1
+    if valid_sample_num < _min_valid_sample_num:
+        return None, "有效采样点不足"
+    return True, "符号表达式在随机采样点上与参考答案一致"
+
+
+def _free_symbols(
+    expression: sympy.Expr,
+)-> Set[sympy.Symbol]:
+
+    # parse_expr 只会产生 Symbol 类型的自由符号
+    return {cast(sympy.Symbol, symbol) for symbol in expression.free_symbols}
+
+
+def _may_differ_in_angle_unit(
+    reference_expression: sympy.Expr,
+    candidate_expression: sympy.Expr,
+    reference_number: complex,
+    candidate_number: complex,
+)-> bool:
+
+    # 只有一侧写了 π，或两个数值恰好相差 180/π 倍
+    if reference_expression.has(sympy.pi) != candidate_expression.has(sympy.pi):
+        return True
+    degrees_per_radian = 180.0 / math.pi
+    return (
+        _is_close(candidate_number, reference_number * degrees_per_radian)
+        or _is_close(candidate_number, reference_number / degrees_per_radian)
+    )
+
+
+def _compare_choices(
+    problem: str,
+    reference: str,
+    candidate: str,
+)-> Optional[Tuple[Optional[bool], str]]:
+
+    # 只有题面确实列出了选项时才按选择题比较，避免把物理量 B、C 当成选项
+    reference_match = _choice_answer_pattern.match(reference)
+    candidate_match = re.fullmatch(r"\(?([A-H])\)?", candidate)
+    if reference_match is None or candidate_match is None:
+        return None
+    reference_choice = reference_match.group(1)
+    candidate_choice = candidate_match.group(1)
+    for choice in {reference_choice, candidate_choice}:
+        if not re.search(rf"(?:^|\s|[(（]){choice}\s*[.．、:：)）]", problem):
+            return None
+    if reference_choice == candidate_choice:
+        return True, f"选项 {candidate_choice} 正确"
+    return False, f"选项 {candidate_choice} 与参考答案 {reference_choice} 不同"
+
+
+def _clean_latex(
+    text: str,
+)-> str:
+
+    text = _math_delimiter_pattern.sub(" ", text)
+    text = _spacing_pattern.sub(" ", text)
+    text = text.replace("\\dfrac", "\\frac").replace("\\tfrac", "\\frac").replace("{,}", "")
+    text = text.replace("\\{", "(").replace("\\}", ")")
+    return text.strip().rstrip(".,;。，；").strip()
+
+
+def _last_relation_side(
+    text: str,
+)-> str:
+
+    # "v = \sqrt{2gh}" 或 "x \approx 1.5" 只比较最右侧的值
+    return _relation_pattern.split(text)[-1].strip()
+
+
+def _split_unit(
+    text: str,
+)-> Tuple[str, str]:
+
+    """
+    把 "3\\,\\mathrm{m/s}"、"30^\\circ"、"40\\%" 这类末尾带单位的答案拆成数值与单位，单位去掉空白后用于逐字比较
+    下标中的 \\mathrm 不是单位，先在 _rewrite_subscripts 中去掉
+    """
+
+    text = _rewrite_subscripts(text)
+    match = _unit_start_pattern.search(text)
+    if match is None or not text[:match.start()].strip():
+        return text, ""
+    unit = re.sub(r"[\s{}]|\\cdot", "", text[match.start():]).replace("\\%", "%")
+    return text[:match.start()].strip(), unit
+
+
+def _rewrite_subscripts(
+    text: str,
+)-> str:
+
+    # m_{\mathrm{e}}、v_{\max}、\omega_0 等下标并入变量名，得到 m_e、v_max、omega_0
+    pieces: List[str] = []
+    index = 0
+    while index < len(text):
+        character = text[index]
+        if character != "_":
+            pieces.append(character)
+            index += 1
+            continue
+        if index + 1 < len(text) and text[index + 1] == "{":
+            braced = _read_braced(text, index + 1)
+            if braced is None:
+                pieces.append(text[index:])
+                break
+            content, index = braced
+        else:
+            content, index = text[index + 1 : index + 2], index + 2
+        content = _font_command_pattern.sub(r"\1", content)
+        content = re.sub(r"\\([A-Za-z]+)", r"\1", content).replace(" ", "")
+        pieces.append("_" + content)
+    return "".join(pieces)
+
+
+def _parse_latex(
+    text: str,
+)-> Optional[sympy.Expr]:
+
+    if not text or len(text) > _max_expression_length:
+        return None
+    expression_text = _latex_to_sympy_text(text)
+    if expression_text is None or not _safe_expression_pattern.fullmatch(expression_text):
+        return None
+    for identifier in _identifier_pattern.findall(expression_text):
+        if keyword.iskeyword(identifier) or identifier.startswith("_") or "__" in identifier:
+            return None
+    try:
+        expression = parse_expr(
+            expression_text,
+            local_dict = {},
+            global_dict = dict(_parse_globals),
+            transformations = _parse_transformations,
+            # 不化简，避免 9^{9^{9}} 之类的输入在解析阶段算出巨大的整数
+            evaluate = False,
+        )
+    except Exception:
+        return None
+    return expression if isinstance(expression, sympy.Expr) else None
+
+
+def _latex_to_sympy_text(
+    text: str,
+)-> Optional[str]:
+
+    expanded_text = _expand_command_with_arguments(text, "frac")
+    if expanded_text is None: return None
+    expanded_text = _expand_command_with_arguments(expanded_text, "sqrt")
+    if expanded_text is None: return None
+    text = expanded_text
+
+    def replace_command(
+        match: re.Match,
+    )-> str:
+
+        name = _latex_names.get(match.group(1))
+        # 未知命令原样保留，之后会因字符不合法而放弃解析；名字后不补空格，以免与下标分开
+        return f" {name}" if name is not None else match.group(0)
+
+    text = _latex_command_pattern.sub(replace_command, text)
+    text = text.replace("{", "(").replace("}", ")").replace("[", "(").replace("]", ")")
+    return text
+
+
+def _expand_command_with_arguments(
+    text: str,
+    command: str,
+)-> Optional[str]:
+
+    """
+    把 \\frac{a}{b} 改写为 ((a)/(b))，\\sqrt{a} 改写为 sqrt(a)，\\sqrt[n]{a} 改写为 ((a)**(1/(n)))；也接受 \\frac12 这类省略花括号的写法
+    """
+
+    pattern = re.compile(rf"\\{command}(?![A-Za-z])\s*")
+    while True:
+        match = pattern.search(text)
+        if match is None:
+            return text
+        index = match.end()
+        root: Optional[str] = None
+        if command == "sqrt" and index < len(text) and text[index] == "[":
+            end = text.find("]", index)
+            if end < 0: return None
+            root, index = text[index + 1 : end], end + 1
+        arguments: List[str] = []
+        for _ in range(2 if command == "frac" else 1):
+            while index < len(text) and text[index] == " ":
+                index += 1
+            if index >= len(text):
+                return None
+            if text[index] == "{":
+                braced = _read_braced(text, index)
+                if braced is None: return None
+                argument, index = braced
+            else:
+                argument, index = text[index], index + 1
+            arguments.append(argument)
+        if command == "frac":
+            replacement = f"(({arguments[0]})/({arguments[1]}))"
+        elif root is not None:
+            replacement = f"(({arguments[0]})**(1/({root})))"
+        else:
+            replacement = f"sqrt({arguments[0]})"
+        text = text[:match.start()] + replacement + text[index:]
+
+
+def _evaluate(
+    expression: sympy.Expr,
+    point: Dict[sympy.Basic, Union[sympy.Basic, float]],
+)-> Optional[complex]:
+
+    try:
+        value = complex(expression.evalf(n = 15, subs = point))
+    except Exception:
+        return None
+    if value != value or abs(value) == float("inf"):
+        return None
+    return value
+
+
+def _is_close(
+    candidate: complex,
+    reference: complex,
+)-> bool:
+
+    if reference == 0:
+        return abs(candidate) <= 1e-12
+    return abs(candidate - reference) <= _relative_tolerance * abs(reference)
+
+
+def _format_number(
+    value: complex,
+)-> str:
+
+    if abs(value.imag) <= 1e-12 * max(1.0, abs(value.real)):
+        return f"{value.real:.6g}"
+    return f"{value.real:.6g}{value.imag:+.6g}i"
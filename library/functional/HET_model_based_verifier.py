@@ -1,12 +1,60 @@
-import xml.etree.ElementTree as ET
 from ..fundamental import *
+from .HET_local_verifier import *
 
 
 __all__ = [
+    "HET_verify",
     "HET_model_verify",
 ]
 
 
+_evaluation_schema: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "score": {"type": "number", "minimum": 0.0, "maximum": 100.0},
+        "justification": {"type": "string"},
+    },
+    "required": ["score", "justification"],
+    "additionalProperties": False,
+}
+
+
+async def HET_verify(
+    problem: str,
+    answer: str,
+    response: str,
+    use_local_verifier: bool = True,
+)-> Dict[str, Any]:
+    
+    """
+    先用 HET_local_verify 在本地判定，本地无法下结论时才调用 HET_model_verify
+    返回 score、justification 与 verifier（"local" 或 "model"，标明结论来源）
+    """
+    
+    if use_local_verifier:
+        local_result = HET_local_verify(
+            problem = problem,
+            answer = answer,
+            response = response,
+        )
+        if local_result["verdict"] != "undecided":
+            return {
+                "score": local_result["score"],
+                "justification": local_result["justification"],
+                "verifier": "local",
+            }
+    
+    model_result = await HET_model_verify(
+        problem = problem,
+        answer = answer,
+        response = response,
+    )
+    return {
+        **model_result,
+        "verifier": "model",
+    }
+
+
 async def HET_model_verify(
     problem: str,
     answer: str,
@@ -18,6 +66,11 @@ async def HET_model_verify(
     timeout: int = 300
     trial_num: int = 20
     trial_interval: int = 5
+    hedging_percentile: float = 0.95
+    hedging_max_extra_cost_ratio: float = 0.1
+    use_cache: bool = True
+    # 重试总时长上限，避免慢或故障的服务商把评测卡上 trial_num × timeout
+    deadline: float = 1200.0
     
     eval_message = f"""
 <Problem>
@@ -33,7 +86,8 @@ async def HET_model_verify(
 </Model_Response_to_Verify>
 """
 
-    prompt = f"""
+    # 评测规则与输出格式放进固定的 system_prompt，所有评测请求共享同一前缀，便于命中提示词缓存
+    system_prompt = f"""
 <system_role>
 You are an extremely strict Equivalence Validator. Your ONLY task is to compare the final result contained in <Model_Response_to_Verify> against the <Ground_Truth_Answer>.
 </system_role>
@@ -66,19 +120,18 @@ You are an extremely strict Equivalence Validator. Your ONLY task is to compare
     - Why any failure occurred (e.g., "Sub-question (2) failed: Model result 15.0 outside tolerance of GT 12.0").
     
 **OUTPUT PROTOCOL:**
-You MUST return a single XML object wrapped in **<evaluation>...</evaluation>** tags.
+You MUST return a single JSON object with exactly the keys "score" and "justification", and nothing else.
 </instruction>
 
 <required_schema>
-<evaluation>
-    <score>...</score>
-    <justification>...</justification>
-</evaluation>
+{{"score": <float between 0.0 and 100.0>, "justification": "<string>"}}
 </required_schema>
+"""
 
+    prompt = f"""
 {eval_message}
 
-Please generate the final XML evaluation now.
+Please generate the final JSON evaluation now.
 """
     
     final_result: Dict[str, Any] = {}
@@ -89,33 +142,11 @@ Please generate the final XML evaluation now.
         nonlocal final_result
         
         try:
-            # 1. 提取 XML 块
-            xml_pattern = r'<evaluation>(.*?)</evaluation>'
-            matches = re.findall(xml_pattern, response_text, re.DOTALL)
-            
-            if not matches:
-                root = ET.fromstring(response_text.strip())
-            else:
-                xml_string = f"<evaluation>{matches[0].strip()}</evaluation>"
-                root = ET.fromstring(xml_string)
-
-            # 2. 查找关键元素
-            score_element = root.find('score')
-            justification_element = root.find('justification')
-
-            if score_element is None or justification_element is None:
-                return False
-
-            # 3. 校验类型和范围
-            assert score_element.text is not None
-            assert justification_element.text is not None
-            
-            score_value = float(score_element.text.strip())
-            justification_value = justification_element.text.strip()
+            # response_schema 已完成解析与 schema 校验，这里拿到的是规范化的 JSON 文本
+            evaluation = deserialize_json(response_text)
+            score_value = float(evaluation["score"])
+            justification_value = evaluation["justification"].strip()
             
-            if not (0.0 <= score_value <= 100.0):
-                return False
-                
             final_result = {
                 "score": round(score_value, 1),
                 "justification": justification_value,
@@ -132,6 +163,7 @@ Please generate the final XML evaluation now.
     await get_answer_async(
         prompt = prompt,
         model = model,
+        system_prompt = system_prompt,
         images = [],
         image_placeholder = image_placeholder,
         temperature = temperature,
@@ -139,6 +171,19 @@ Please generate the final XML evaluation now.
         trial_num = trial_num,
         trial_interval = trial_interval,
         check_and_accept = check_and_accept,
+        hedging_percentile = hedging_percentile,
+        hedging_max_extra_cost_ratio = hedging_max_extra_cost_ratio,
+        use_cache = use_cache,
+        deadline = deadline,
+        response_schema = _evaluation_schema,
+        call_site = "HET_model_verify",
+        # 解析失败时追问一轮只修正格式，而不是重新评测
+        repair_trial_num = 1,
+        repair_prompt_builder = lambda _: (
+            "Your previous evaluation could not be parsed. "
+            "Output the same evaluation again as a single JSON object with keys "
+            "\"score\" (a number from 0 to 100) and \"justification\" (a string), without any other text."
+        ),
     )
 
     return final_result
\ No newline at end of file
@@ -1,2 +1,3 @@
 from .lark_bots import *
+from .HET_local_verifier import *
 from .HET_model_based_verifier import *
\ No newline at end of file
@@ -28,7 +28,7 @@ class AccumulatorBot(ParallelThreadLarkBot):
     
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         
         message_type = parsed_message.get("message_type")
@@ -52,16 +52,16 @@ class AccumulatorBot(ParallelThreadLarkBot):
     async def get_initial_context(
         self,
         thread_root_id: str,
-    )-> Dict[str, Any]:
+    )-> ThreadContext:
 
-        return {"numbers": [], "sum": 0}
+        return ThreadContext.create(log_fields=["numbers"], sum=0)
 
 
     async def process_message_in_context(
         self,
         parsed_message: Dict[str, Any],
-        context: Dict[str, Any],
-    )-> Dict[str, Any]:
+        context: ThreadContext,
+    )-> ThreadContext:
         
         try:
             message_id = parsed_message["message_id"]
@@ -71,9 +71,9 @@ class AccumulatorBot(ParallelThreadLarkBot):
             print("  -> [Worker] 累加器出现未知异常")
             return context
           
-        context = deepcopy(context)
-        context["numbers"].append(current_number)
-        context["sum"] += current_number
+        context = context.append("numbers", current_number).set(
+            sum = context["sum"] + current_number,
+        )
         
         response = f"{' + '.join(str(number) for number in context['numbers'])} = {context['sum']}"
         reply_message_result = await self.reply_message_async(
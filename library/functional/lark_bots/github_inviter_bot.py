@@ -65,7 +65,7 @@ class GithubInviterBot(ParallelThreadLarkBot):
 
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         chat_type = parsed_message["chat_type"]
         is_thread_root = parsed_message["is_thread_root"]
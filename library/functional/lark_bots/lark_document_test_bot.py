@@ -37,7 +37,7 @@ class LarkDocumentTestBot(ParallelThreadLarkBot):
     
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         
         if parsed_message["chat_type"] == "group":
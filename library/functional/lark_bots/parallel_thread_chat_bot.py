@@ -27,11 +27,17 @@ class ParallelThreadChatBot(ParallelThreadLarkBot):
         
         self._acceptance_cache_size: int = context_cache_size
         self._acceptance_cache: OrderedDict[str, bool] = OrderedDict()
+        
+        self._chat_model: str = "Qwen-VL-Max"
+        # 长话题只发送摘要 + 最近若干轮原文，每轮请求的 token 数与图片数有上界
+        self._context_window_manager: ContextWindowManager = ContextWindowManager(
+            model = self._chat_model,
+        )
     
     
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         
         if parsed_message["chat_type"] == "group":
@@ -58,26 +64,23 @@ class ParallelThreadChatBot(ParallelThreadLarkBot):
     async def get_initial_context(
         self,
         thread_root_id: str,
-    )-> Dict[str, Any]:
+    )-> ThreadContext:
 
         is_accepted: bool = thread_root_id in self._acceptance_cache
         if not is_accepted:
             print(f"[ParallelThreadChatBot] Thread {thread_root_id} not in acceptance cache. Ignoring.")
 
-        return {
-            "is_accepted": is_accepted,
-            "history": {
-                "prompt": [],
-                "images": [],
-            }, 
-        }
+        return ThreadContext.create(
+            log_fields = ["history_prompt", "history_images"],
+            is_accepted = is_accepted,
+        )
 
     
     async def process_message_in_context(
         self,
         parsed_message: Dict[str, Any],
-        context: Dict[str, Any],
-    )-> Dict[str, Any]:
+        context: ThreadContext,
+    )-> ThreadContext:
         
         try:
             
@@ -105,18 +108,35 @@ class ParallelThreadChatBot(ParallelThreadLarkBot):
             
             print(f" -> [Worker] 收到任务: {text}，开始处理")
             
-            image_bytes_list = await self.download_message_images_async(
-                message_id = message_id,
-                image_keys = image_keys,
+            # 快照不可变：只有完整处理完毕才返回新版本，中途出错时话题历史保持原样
+            new_context = context.append("history_prompt", text).append(
+                "history_images",
+                # 上下文只保存图片引用 (message_id, image_key)，字节由共享图片缓存持有，构造请求时再解析
+                *[(message_id, image_key) for image_key in image_keys],
+            )
+            # 超出图片预算的旧图片之后不会再发送，直接从保存的历史中移除，话题的图片引用不会无限增长
+            pruned_prompt_list, pruned_images = self._context_window_manager.drop_old_images(
+                prompt_list = new_context["history_prompt"],
+                images = new_context["history_images"],
+                image_placeholder = self.image_placeholder,
+            )
+            if pruned_images is not new_context["history_images"]:
+                new_context = new_context.set(
+                    history_prompt = AppendOnlyLog(list(pruned_prompt_list)),
+                    history_images = AppendOnlyLog(list(pruned_images)),
+                )
+            # 日志直接交给 build_request_async 按下标读取，不再每轮复制整个历史
+            request_prompt, request_image_refs = await self._context_window_manager.build_request_async(
+                prompt_list = new_context["history_prompt"],
+                images = new_context["history_images"],
+                image_placeholder = self.image_placeholder,
             )
-            context = deepcopy(context)
-            context["history"]["prompt"].append(text)
-            context["history"]["images"].extend(image_bytes_list)
+            request_images = await self.resolve_image_refs_async(request_image_refs)
             
             response = await get_answer_async(
-                prompt = context["history"]["prompt"],
-                model = "Qwen-VL-Max",
-                images = context["history"]["images"],
+                prompt = request_prompt,
+                model = self._chat_model,
+                images = request_images,
                 image_placeholder = self.image_placeholder,
                 tools = [
                     python_tool(timeout=30, verbose=True),
@@ -137,7 +157,7 @@ class ParallelThreadChatBot(ParallelThreadLarkBot):
                     f"{reply_message_result.code}, {reply_message_result.msg}"
                 )
             
-            context["history"]["prompt"].append(response)
+            context = new_context.append("history_prompt", response)
 
         except Exception as error:
             print(
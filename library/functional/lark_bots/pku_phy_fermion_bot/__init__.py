@@ -1,3 +1,4 @@
 from .pku_phy_fermion_bot import *
 from .equation_rendering import *
+from .topic_records import *
 from .workflows import *
\ No newline at end of file
@@ -26,7 +26,8 @@ async def render_equation_async(
     image_placeholder = "<image_never_used>"
     
     # 采用 XML 结构 + CDATA 以彻底解决 JSON 转义灾难和长文本指令不遵循问题
-    prompt = f"""
+    # 静态的角色、指令与示例放进 system_prompt，保证请求前缀逐字节不变，命中服务商的提示词缓存
+    system_prompt = f"""
 <system_role>
 You are a professional typesetting and equation rendering assistant.
 Your goal is to format text for Feishu/Lark documents by correctly wrapping math formulas.
@@ -88,7 +89,9 @@ Please process the content in <input_text> following these rules:
         <note>Backslash preserved as single backslash inside CDATA.</note>
     </example_3>
 </examples>
+"""
 
+    prompt = f"""
 <input_text>
 {text}
 </input_text>
@@ -105,11 +108,12 @@ Please generate the XML response now.
 """
 
     result = {}
+    last_parse_error = ""
 
     def check_and_accept(
         response: str,
     )-> bool:
-        nonlocal result
+        nonlocal result, last_parse_error
         print(f"Render Equation: checking the following response now\n{response}")
         try:
             # 使用 Regex 健壮地提取 XML 标签中的内容
@@ -127,12 +131,14 @@ Please generate the XML response now.
             matches = re.findall(xml_pattern, response, re.DOTALL | re.IGNORECASE)
             
             if not matches:
+                last_parse_error = "No complete <rendered_text>...</rendered_text> element was found."
                 return False
             
             extracted_text = matches[0]
             
             # 如果原文不为空，但提取出的内容全是空白，视为无效响应
             if text.strip() and not extracted_text.strip():
+                last_parse_error = "The <rendered_text> element is empty."
                 return False
             
             # 提取出的内容即为最终文本，无需像 JSON 那样进行反序列化，避免了转义符地狱
@@ -140,17 +146,31 @@ Please generate the XML response now.
             return True
         except Exception as e:
             print(f"Render Equation: check_and_accept failed with error: {e}")
+            last_parse_error = str(e)
             return False
 
     _ = await get_answer_async(
         prompt = prompt,
         model = model,
+        system_prompt = system_prompt,
         image_placeholder = image_placeholder,
         temperature = temperature,
         timeout = timeout,
         trial_num = trial_num,
         trial_interval = trial_interval,
         check_and_accept = check_and_accept,
+        # 温度为 0 时渲染结果可复现，同一段文本重复渲染直接命中缓存
+        use_cache = (temperature == 0.0),
+        # 渲染结果是长段 LaTeX 文本，放进 JSON 字符串反而容易出转义错误，因此保留 XML + CDATA 而不用结构化输出
+        call_site = "render_equation",
+        # 多数拒收只是外层标签残缺：先本地补标签，不行再追问一轮，而不是整段重新渲染
+        repair_functions = [make_xml_tag_repair("rendered_text")],
+        repair_trial_num = 1,
+        repair_prompt_builder = lambda _: (
+            f"Your previous reply could not be parsed: {last_parse_error} "
+            "Output the same rendered text again, strictly as "
+            "<rendered_text><![CDATA[ ... ]]></rendered_text>, without any other text."
+        ),
     )
 
     return result["rendered_text"]
\ No newline at end of file
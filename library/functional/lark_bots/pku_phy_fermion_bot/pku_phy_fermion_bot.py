@@ -1,6 +1,9 @@
 from ....fundamental import *
 from .equation_rendering import *
 from .problem_understanding import *
+from .topic_records import *
+from .problem_registry import *
+from .problem_catalog import *
 from .workflows import *
 from ....fundamental.lark_tools._lark_sdk import P2ContactUserCreatedV3
 from ...HET_model_based_verifier import *
@@ -58,9 +61,21 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             **inference_arguments,
         )
         
-        self._next_problem_no = 1
-        self._next_problem_no_lock = asyncio.Lock()
-        self._problem_id_to_context: Dict[int, Dict[str, Any]] = {}
+        # 话题被上下文缓存驱逐时经 on_context_evicted 转为墓碑
+        self._problem_registry: ProblemRegistry = ProblemRegistry()
+        # 题目、trial 与打分的持久化目录，不受内存索引驱逐影响；连接与写线程在首次使用时才创建
+        problem_catalog_path = self._config.get(
+            "problem_catalog_path",
+            f"WorkingTable{seperator}local_storage{seperator}problem_catalog.sqlite",
+        )
+        self._problem_catalog: ProblemCatalog = ProblemCatalog(
+            path = problem_catalog_path,
+        )
+        # 同一 scope 的所有进程（例如多个费米子实例）共享题号空间，重启后从上次租出的编号之后继续
+        self._problem_no_allocator: BlockIdAllocator = BlockIdAllocator(
+            path = problem_catalog_path,
+            scope = self._config.get("problem_no_scope", "pku_phy_fermion"),
+        )
 
         self._workflows: List[str] = [
             "Qwen-Max with tools",
@@ -78,7 +93,7 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             "Gemini-2.5-Pro": "直接让 Gemini-2.5-Pro 解题",
             "GPT-5": "直接让 GPT-5 解题",
         }
-        self._workflow_implementations: Dict[str, Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]] = {
+        self._workflow_implementations: Dict[str, Callable[[FermionTopicContext], Awaitable[Dict[str, Any]]]] = {
             "Qwen-Max with tools": with_tools_func_factory("Qwen-Max", self),
             "Gemini-2.5-Pro with tools": with_tools_func_factory("Gemini-2.5-Pro", self),
             "GPT-5 with tools": with_tools_func_factory("GPT-5", self),
@@ -90,6 +105,9 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             "Qwen-Max with tools",
         ]
         
+        self._event_loop_profiler = EventLoopProfiler()
+        self._memory_snapshot_differ = MemorySnapshotDiffer()
+        
         self.register_user_created(self._handle_user_created_bridge)
     
     
@@ -97,9 +115,7 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
         self,
     )-> int:
         
-        async with self._next_problem_no_lock:
-            self._next_problem_no += 1
-            return self._next_problem_no - 1
+        return await self._problem_no_allocator.allocate_async()
 
     
     def _mark_thread_as_accepted(
@@ -117,7 +133,7 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
 
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         
         chat_type = parsed_message["chat_type"]
@@ -156,40 +172,32 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
     async def get_initial_context(
         self,
         thread_root_id: str,
-    )-> Dict[str, Any]:
+    )-> FermionTopicContext:
 
         is_accepted: bool = thread_root_id in self._acceptance_cache
         
-        return {
-            "is_tombstone": False,
-            "lock": asyncio.Lock(), 
-            "thread_root_id": thread_root_id,
-            "is_accepted": is_accepted,
-            "owner": None,
-            "history": {
-                "prompt": [],
-                "images": [],
-                "roles": [],
-            },
-            "problem_no": None,
-            "problem_text": None,
-            "problem_images": None,
-            "answer": None,
-            "document_created": False,
-            "document_id": None,
-            "document_title": None,
-            "document_url": None,
-            "document_block_num": None,
-            "trials": [], 
-            "running_workflows": 0,
-            "is_archived": False,
-        }
+        return FermionTopicContext(
+            thread_root_id = thread_root_id,
+            is_accepted = is_accepted,
+        )
+    
+    
+    def on_context_evicted(
+        self,
+        thread_root_id: str,
+        context: FermionTopicContext,
+    )-> None:
+        
+        problem_no: Optional[int] = context["problem_no"]
+        if problem_no is None: return
+        if self._problem_registry.tombstone(problem_no, context):
+            print(f"[PkuPhyFermionBot] 题目 {problem_no} 的上下文已被驱逐，转为墓碑索引。")
     
     
     async def _maintain_context_history(
         self,
         parsed_message: Dict[str, Any],
-        context: Dict[str, Any],
+        context: FermionTopicContext,
     )-> None:
         
         text: str = parsed_message["text"]
@@ -203,8 +211,8 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
     async def process_message_in_context(
         self,
         parsed_message: Dict[str, Any],
-        context: Dict[str, Any],
-    )-> Dict[str, Any]:
+        context: FermionTopicContext,
+    )-> FermionTopicContext:
 
         message_id: str = parsed_message["message_id"]
         chat_type: str = parsed_message["chat_type"]
@@ -259,81 +267,255 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
 
     async def _start_user_specific_topic(
         self,
-        context: Dict[str, Any],
+        context: FermionTopicContext,
         parsed_message: Dict[str, Any],
         sender: Optional[str],
     ) -> None:
         
-        message_id = parsed_message["message_id"]
-        await self.reply_message_async(
-            response = "您的题目已受理，请稍候...",
-            message_id = message_id,
-            reply_in_thread = True
-        )
+        """
+        话题状态机：pending -> intaking -> ready -> archived，受理失败时进入 failed
+        受理可能持续数分钟，放到后台任务中执行，话题队列中的后续消息（工作流编号、归档等）可以立即得到处理
+        """
         
         assert context["owner"] is None
         context["owner"] = sender
         context["is_accepted"] = True
+        context["topic_state"] = "intaking"
         
         await self._maintain_context_history(parsed_message, context)
         assert len(context["history"]["prompt"]) == 1
+        # 受理期间的后续消息也会追加进 history，这里先取下根消息的内容
+        message_id = parsed_message["message_id"]
         raw_text = context["history"]["prompt"][0]
-        raw_image_keys = context["history"]["images"]
+        raw_image_keys = list(context["history"]["images"])
+        context["problem_images"] = raw_image_keys
+        context["problem_message_id"] = message_id
         
-        clean_text = raw_text.replace(self.image_placeholder, "").replace(self._mention_me_text, "")
-        raw_images = await self.download_message_images_async(
-            message_id = message_id,
-            image_keys = raw_image_keys,
+        # 受理不占用工作流配额，否则可能排在自己启动的默认工作流之后
+        self.spawn_background_task(
+            self._run_intake_async(context, message_id, raw_text, raw_image_keys),
+            thread_root_id = context["thread_root_id"],
+            name = "intake",
+            exempt_from_quota = True,
         )
 
+
+    async def _run_intake_async(
+        self,
+        context: FermionTopicContext,
+        message_id: str,
+        raw_text: str,
+        raw_image_keys: List[str],
+    )-> None:
+        
         try:
-            understand_result = await understand_problem_async(
+            await self._intake_problem_async(context, message_id, raw_text, raw_image_keys)
+        except Exception as error:
+            print(f"[PkuPhyFermionBot] Intake for {message_id} crashed: {error}\n{traceback.format_exc()}")
+            await self._fail_intake_async(context, message_id, None)
+
+
+    async def _fail_intake_async(
+        self,
+        context: FermionTopicContext,
+        message_id: str,
+        document_id: Optional[str],
+    )-> None:
+        
+        if context["topic_state"] == "intaking":
+            context["topic_state"] = "failed"
+        # 已提前启动的工作流的结果无处推送，直接取消，不再继续调用模型；受理任务本身在同一组中，需要保留
+        assert self._task_supervisor is not None
+        cancelled_num = self._task_supervisor.cancel_group(
+            context["thread_root_id"],
+            exclude_task = asyncio.current_task(),
+        )
+        if cancelled_num:
+            print(f"[PkuPhyFermionBot] 题目受理失败，取消了 {cancelled_num} 个已启动的工作流")
+        # 取消前已在 _run_workflow 中等待文档的工作流会发现文档未建成，放弃推送
+        context["document_ready"].set()
+        dropped_workflows = context["pending_workflows"]
+        context["pending_workflows"] = []
+        if document_id is not None:
+            try:
+                await self.delete_file_async(document_id, "docx")
+            except Exception as error:
+                print(f"[PkuPhyFermionBot] 删除未完成的题目文档失败: {error}")
+        response = "非常抱歉，题目解析出错。请稍后重试或联系志愿者。"
+        if dropped_workflows:
+            response += f"\n整理期间预约的工作流 {', '.join(dropped_workflows)} 未能启动。"
+        await self.reply_message_async(
+            response = response,
+            message_id = message_id,
+            reply_in_thread = True,
+        )
+
+
+    async def _intake_problem_async(
+        self,
+        context: FermionTopicContext,
+        message_id: str,
+        raw_text: str,
+        raw_image_keys: List[str],
+    )-> None:
+        
+        clean_text = raw_text.replace(self.image_placeholder, "").replace(self._mention_me_text, "")
+        
+        # 受理流程是一张依赖图，互不依赖的步骤并发执行：
+        #   题号分配 -> 以临时标题建文档 ─────────────────────┬-> 更新标题
+        #   下载图片 -> 题目解析 -> 渲染题干 / 渲染答案 ───────┴-> 写入文档 -> 文档就绪
+        #   （可选）默认工作流直接从原始题面启动，与上面全部步骤重叠
+        # 工作流的结果在文档就绪后才会推送，见 _run_workflow
+        # 原始题面可能夹带参考答案，因此提前启动默认关闭，需在配置中显式开启
+        start_workflows_from_raw_text: bool = self._config.get("start_workflows_from_raw_text", False)
+        equation_rendering_arguments = {
+            "model": self._config["equation_rendering"]["model"],
+            "temperature": self._config["equation_rendering"]["temperature"],
+            "timeout": self._config["equation_rendering"]["timeout"],
+            "trial_num": self._config["equation_rendering"]["trial_num"],
+            "trial_interval": self._config["equation_rendering"]["trial_interval"],
+        }
+        
+        async def acknowledge()-> None:
+            await self.reply_message_async(
+                response = "您的题目已受理，请稍候...",
+                message_id = message_id,
+                reply_in_thread = True,
+            )
+        
+        async def download_images()-> List[bytes]:
+            return await self.download_message_images_async(
+                message_id = message_id,
+                image_keys = raw_image_keys,
+            )
+        
+        async def allocate_problem_no()-> int:
+            return await self._get_problem_no()
+        
+        async def create_document(
+            allocate_problem_no: int,
+        )-> str:
+            return await self.create_document_async(
+                title = f"题目 {allocate_problem_no}",
+                folder_token = self._config["problem_set_folder_token"],
+            )
+        
+        async def understand(
+            download_images: List[bytes],
+        )-> Dict[str, Any]:
+            return await understand_problem_async(
                 message = clean_text,
-                problem_images = raw_images,
+                problem_images = download_images,
                 model = self._config["problem_understanding"]["model"],
                 temperature = self._config["problem_understanding"]["temperature"],
                 timeout = self._config["problem_understanding"]["timeout"],
                 trial_num = self._config["problem_understanding"]["trial_num"],
                 trial_interval = self._config["problem_understanding"]["trial_interval"],
             )
-        except Exception:
-            await self.reply_message_async(
-                response = "非常抱歉，题目解析出错。请稍后重试或联系志愿者。", 
-                message_id = message_id,
-                reply_in_thread = True,
+        
+        async def render_problem(
+            understand: Dict[str, Any],
+        )-> str:
+            problem_text = await self._render_equation_async(
+                text = understand["problem_text"],
+                **equation_rendering_arguments,
             )
-            return
+            return problem_text + len(raw_image_keys) * self.image_placeholder
         
-        problem_title = understand_result["problem_title"]
-        problem_text = understand_result["problem_text"]
-        answer = understand_result["answer"]
-
-        problem_text_task = self._render_equation_async(
-            text = problem_text,
-            model = self._config["equation_rendering"]["model"],
-            temperature = self._config["equation_rendering"]["temperature"],
-            timeout = self._config["equation_rendering"]["timeout"],
-            trial_num = self._config["equation_rendering"]["trial_num"],
-            trial_interval = self._config["equation_rendering"]["trial_interval"],
-        )
-        answer_task = self._render_equation_async(
-            text = answer,
-            model = self._config["equation_rendering"]["model"],
-            temperature = self._config["equation_rendering"]["temperature"],
-            timeout = self._config["equation_rendering"]["timeout"],
-            trial_num = self._config["equation_rendering"]["trial_num"],
-            trial_interval = self._config["equation_rendering"]["trial_interval"],
-        )
+        async def render_answer(
+            understand: Dict[str, Any],
+        )-> str:
+            return await self._render_equation_async(
+                text = understand["answer"],
+                **equation_rendering_arguments,
+            )
         
-        problem_text, answer = await asyncio.gather(problem_text_task, answer_task)
-        problem_text = problem_text + len(raw_images) * self.image_placeholder
-        problem_no = await self._get_problem_no()
+        async def update_title(
+            allocate_problem_no: int,
+            create_document: str,
+            understand: Dict[str, Any],
+        )-> str:
+            document_title = f"题目 {allocate_problem_no} | {understand['problem_title']}"
+            try:
+                await self.update_document_title_async(
+                    document_id = create_document,
+                    title = document_title,
+                )
+            except Exception as error:
+                print(f"[PkuPhyFermionBot] 题目 {allocate_problem_no} 的文档标题更新失败: {error}")
+            return document_title
         
-        document_title = f"题目 {problem_no} | {problem_title}"
-        document_id = await self.create_document_async(
-            title = document_title,
-            folder_token = self._config["problem_set_folder_token"],
-        )
+        async def write_document(
+            create_document: str,
+            download_images: List[bytes],
+            render_problem: str,
+            render_answer: str,
+        )-> int:
+            content = ""
+            content += f"{self.begin_of_second_heading}题目{self.end_of_second_heading}"
+            content += render_problem.strip()
+            content += self.divider_placeholder
+            content += f"{self.begin_of_second_heading}参考答案{self.end_of_second_heading}"
+            content += render_answer.strip()
+            content += self.divider_placeholder
+            content += f"{self.begin_of_second_heading}AI 解答{self.end_of_second_heading}"
+            blocks = self.build_document_blocks(content)
+            await self.overwrite_document_async(
+                document_id = create_document,
+                blocks = blocks,
+                images = download_images,
+                existing_block_num = 0,
+            )
+            return len(blocks)
+        
+        def start_default_workflows()-> None:
+            for workflow_name in self._default_workflows:
+                self._spawn_workflow(context, workflow_name, message_id)
+        
+        async def start_workflows_early()-> None:
+            # 原始题面可能夹带用户给出的参考答案，会随题面一起交给工作流
+            context["problem_text"] = clean_text + len(raw_image_keys) * self.image_placeholder
+            start_default_workflows()
+        
+        async def start_workflows(
+            render_problem: str,
+        )-> None:
+            context["problem_text"] = render_problem
+            start_default_workflows()
+        
+        intake_graph = TaskGraph(f"题目受理 {message_id}")
+        intake_graph.add_node("acknowledge", acknowledge)
+        intake_graph.add_node("download_images", download_images)
+        intake_graph.add_node("allocate_problem_no", allocate_problem_no)
+        intake_graph.add_node("create_document", create_document, ["allocate_problem_no"])
+        intake_graph.add_node("understand", understand, ["download_images"])
+        intake_graph.add_node("render_problem", render_problem, ["understand"])
+        intake_graph.add_node("render_answer", render_answer, ["understand"])
+        intake_graph.add_node("update_title", update_title, ["allocate_problem_no", "create_document", "understand"])
+        intake_graph.add_node("write_document", write_document, ["create_document", "download_images", "render_problem", "render_answer"])
+        if start_workflows_from_raw_text:
+            intake_graph.add_node("start_workflows", start_workflows_early)
+        else:
+            intake_graph.add_node("start_workflows", start_workflows, ["render_problem"])
+        
+        results = await intake_graph.run_async()
+        print(f"[PkuPhyFermionBot] {intake_graph.format_timings()}")
+        
+        intake_errors = {
+            name: error for name, error in intake_graph.errors.items()
+            if name not in ["acknowledge", "update_title"]
+        }
+        if intake_errors:
+            for name, error in intake_errors.items():
+                print(f"[PkuPhyFermionBot] 题目受理步骤 {name} 失败: {error}")
+            await self._fail_intake_async(context, message_id, results.get("create_document"))
+            return
+        
+        problem_no = results["allocate_problem_no"]
+        problem_text = results["render_problem"]
+        answer = results["render_answer"]
+        document_id = results["create_document"]
+        document_title = results["update_title"]
         document_url = get_lark_document_url(
             tenant = self._config["association_tenant"],
             document_id = document_id,
@@ -341,68 +523,48 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
 
         context["problem_no"] = problem_no
         context["problem_text"] = problem_text
-        context["problem_images"] = raw_image_keys
-        context["problem_message_id"] = message_id
         context["answer"] = answer
+        # 渲染后的答案带有公式标记，只用于文档展示；答案比对使用题目解析给出的原文
+        context["raw_answer"] = results["understand"]["answer"]
         context["document_created"] = True
         context["document_id"] = document_id
         context["document_title"] = document_title
         context["document_url"] = document_url
-        context["document_block_num"] = 0
-        
-        # 防止内存泄漏：父类已驱逐的话题，context 变为墓碑；条件触发
-        if len(self._problem_id_to_context) > self._init_arguments["context_cache_size"] * 1.1:
-            alive_context_ids = {id(ctx) for ctx in self._context_cache.values()}
-            ids_to_shrink = []
-            for pid, ctx in self._problem_id_to_context.items():
-                if id(ctx) not in alive_context_ids and not ctx["is_tombstone"]:
-                    ids_to_shrink.append(pid)
-            for pid in ids_to_shrink:
-                old_ctx = self._problem_id_to_context[pid]
-                tombstone_ctx = {
-                    "is_tombstone": True,
-                    "problem_no": old_ctx.get("problem_no"), 
-                    "document_title": old_ctx["document_title"],
-                    "document_url": old_ctx["document_url"],
-                    "is_archived": True,
-                    "trials": [],
-                    "history": {},
-                }
-                # 替换引用后，设想 Python 的 GC 会自动释放原 context 的内存
-                self._problem_id_to_context[pid] = tombstone_ctx
-            if ids_to_shrink:
-                print(f"[PkuPhyFermionBot] 内存优化: 将 {len(ids_to_shrink)} 个旧题目缩略为墓碑索引。")
-
-        self._problem_id_to_context[problem_no] = context
-        
-        content = ""
-        content += f"{self.begin_of_second_heading}题目{self.end_of_second_heading}"
-        content += problem_text.strip()
-        content += self.divider_placeholder
-        content += f"{self.begin_of_second_heading}参考答案{self.end_of_second_heading}"
-        content += answer.strip()
-        content += self.divider_placeholder
-        content += f"{self.begin_of_second_heading}AI 解答{self.end_of_second_heading}"
-        
-        blocks = self.build_document_blocks(content)
-        await self.overwrite_document_async(
-            document_id = document_id,
-            blocks = blocks,
-            images = raw_images,
-            existing_block_num = 0,
-        )
-        context["document_block_num"] = len(blocks)
-
-        for workflow_name in self._default_workflows:
-            asyncio.create_task(self._run_workflow(context, workflow_name, message_id))
+        context["document_block_num"] = results["write_document"]
+        context["document_ready"].set()
+        # 受理期间用户可能已经归档了话题
+        is_archived = context["topic_state"] == "archived"
+        if not is_archived: context["topic_state"] = "ready"
         
-        workflow_menu, _ = self._get_workflow_menu_and_mapping()
-        response_text = (
-            f"您的题目已整理进文档 {self.begin_of_hyperlink}{document_title}{self.end_of_hyperlink}\n"
-            f"已在后台启动默认工作流: {', '.join(self._default_workflows)}\n\n"
-            f"您可以稍作等待（如果您的题目较难，AI 可能需要较长时间解答），也可以输入数字编号以调用其他工作流：\n"
-            f"{workflow_menu}"
+        self._problem_registry.register(problem_no, context)
+        self._problem_catalog.upsert_problem(
+            problem_no = problem_no,
+            title = document_title,
+            document_url = document_url,
+            owner = context["owner"],
+            problem_text = problem_text,
+            answer = answer,
+            status = "archived" if is_archived else "active",
         )
+        
+        pending_workflows = context["pending_workflows"]
+        context["pending_workflows"] = []
+        if is_archived:
+            response_text = (
+                f"您的题目已整理进文档 {self.begin_of_hyperlink}{document_title}{self.end_of_hyperlink}\n"
+                f"话题已归档，不再启动新的工作流。"
+            )
+        else:
+            for workflow_name in pending_workflows:
+                self._spawn_workflow(context, workflow_name, message_id)
+            workflow_menu, _ = self._get_workflow_menu_and_mapping()
+            started_workflows = self._default_workflows + pending_workflows
+            response_text = (
+                f"您的题目已整理进文档 {self.begin_of_hyperlink}{document_title}{self.end_of_hyperlink}\n"
+                f"已在后台启动工作流: {', '.join(started_workflows)}\n\n"
+                f"您可以稍作等待（如果您的题目较难，AI 可能需要较长时间解答），也可以输入数字编号以调用其他工作流：\n"
+                f"{workflow_menu}"
+            )
 
         await self.reply_message_async(
             response = response_text,
@@ -414,23 +576,34 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
 
     async def _handle_owner_input_in_topic(
         self,
-        context: Dict[str, Any],
+        context: FermionTopicContext,
         parsed_message: Dict[str, Any],
     ) -> None:
         
         assert context["owner"] == parsed_message["sender"]
         message_id = parsed_message["message_id"]
-        if context["is_archived"]:
+        topic_state = context["topic_state"]
+        if topic_state == "archived":
             await self.reply_message_async(
                 response = f"题目已归档，此话题即将不再受理；您可以重新 @ 我以开启一个新的解题话题。",
                 message_id = message_id,
                 reply_in_thread = True
             )
             return
+        if topic_state == "failed":
+            await self.reply_message_async(
+                response = f"题目整理失败，此话题无法继续；您可以重新 @ 我以开启一个新的解题话题。",
+                message_id = message_id,
+                reply_in_thread = True
+            )
+            return
             
         text = parsed_message["text"].strip()
         if "归档" in text:
-            context["is_archived"] = True
+            context["topic_state"] = "archived"
+            # 受理中的题目还没有题号，受理完成时会以归档状态写入题目目录
+            if context["problem_no"] is not None:
+                self._problem_catalog.update_problem_status(context["problem_no"], "archived")
             await self.reply_message_async(
                 response = f"题目已归档。感谢您的使用！",
                 message_id = message_id,
@@ -449,12 +622,28 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                 target_workflow = mapping[index]
         elif text in self._workflow_implementations:
             target_workflow = text
+        
+        if topic_state == "intaking":
+            if target_workflow:
+                context["pending_workflows"].append(target_workflow)
+                await self.reply_message_async(
+                    response = f"题目仍在整理中，已预约 {self.begin_of_bold}[{target_workflow}]{self.end_of_bold} 工作流，整理完成后自动启动。",
+                    message_id = message_id,
+                    reply_in_thread = True,
+                )
+            else:
+                await self.reply_message_async(
+                    response = f"题目正在整理中，请稍候。整理期间您可以回复以下工作流的编号或名称预约解题，也可以输入“归档”结束此话题：\n{workflow_menu}",
+                    message_id = message_id,
+                    reply_in_thread = True,
+                )
+            return
             
         async with context["lock"]:
             running_workflows = context["running_workflows"]
         
         if target_workflow:
-            asyncio.create_task(self._run_workflow(context, target_workflow, message_id))
+            self._spawn_workflow(context, target_workflow, message_id)
             await self.reply_message_async(
                 response = f"收到。已启动 {self.begin_of_bold}[{target_workflow}]{self.end_of_bold} 工作流。\n当前有 {running_workflows + 1} 个工作流正在运行。",
                 message_id = message_id,
@@ -522,15 +711,30 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
         )
     
 
+    def _spawn_workflow(
+        self,
+        context: FermionTopicContext,
+        workflow_name: str,
+        reply_message_id: str,
+    )-> None:
+        
+        self.spawn_background_task(
+            self._run_workflow(context, workflow_name, reply_message_id),
+            thread_root_id = context["thread_root_id"],
+            name = "workflow",
+        )
+
+
     async def _run_workflow(
         self,
-        context: Dict[str, Any],
+        context: FermionTopicContext,
         workflow_name: str,
         reply_message_id: str,
     ) -> None:
 
         workflow_func = self._workflow_implementations[workflow_name]
         start_time = get_time_stamp()
+        start_monotonic = time.monotonic()
         
         async with context["lock"]:
             context["running_workflows"] += 1
@@ -539,19 +743,42 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             workflow_result = await workflow_func(context)
             assert isinstance(workflow_result, dict), f"Workflow {workflow_name} must return a dict"
             assert "document_content" in workflow_result, f"Workflow {workflow_name} missing 'document_content'"
+            # 受理时从原始题面提前启动的工作流可能先于题目文档完成，推送前等待文档就绪
+            await context["document_ready"].wait()
+            if not context["document_created"]:
+                raise RuntimeError("题目整理失败，工作流结果无法写入云文档")
             
+            # 锁内只登记 trial、确定解答编号并领取云文档写入票号；评分与文档写入在锁外进行，多个解答的评分可以并发
             async with context["lock"]:
-                trial_record = {
-                    "workflow": workflow_name,
-                    "status": "success",
-                    "start_time": start_time,
-                    "end_time": get_time_stamp(),
-                    **workflow_result,
-                }
+                trial_record = FermionTrialRecord.from_workflow_result(
+                    workflow = workflow_name,
+                    status = "success",
+                    start_time = start_time,
+                    end_time = get_time_stamp(),
+                    workflow_result = workflow_result,
+                )
                 context["trials"].append(trial_record)
-                # 按照工作流完成的时间顺序，把成功的工作流加到 trials 里并推送到飞书云文档中
-                await self._push_latest_trial_to_document(context, workflow_result)
-                
+                trial_no = len(context["trials"])
+                ticket = context["document_sequencer"].take_ticket()
+            
+            # 按照工作流完成的时间顺序（即解答编号顺序）推送到飞书云文档中
+            score = await self._push_trial_to_document(
+                context = context,
+                trial_record = trial_record,
+                trial_no = trial_no,
+                ticket = ticket,
+                workflow_result = workflow_result,
+            )
+            self._problem_catalog.record_trial(
+                problem_no = context["problem_no"],
+                trial_no = trial_no,
+                workflow = workflow_name,
+                status = "success",
+                latency_seconds = time.monotonic() - start_monotonic,
+                score = score,
+            )
+            
+            async with context["lock"]:
                 context["running_workflows"] -= 1
                 running_workflows = context["running_workflows"]
             
@@ -573,10 +800,39 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                     reply_in_thread = True,
                 )
 
+        except asyncio.CancelledError:
+            # 超过截止时间、被管理员取消或进程退出时排空超时
+            print(f"[PkuPhyFermionBot] Workflow {workflow_name} cancelled.")
+            async with context["lock"]:
+                context["running_workflows"] -= 1
+            if context["problem_no"] is not None:
+                self._problem_catalog.record_trial(
+                    problem_no = context["problem_no"],
+                    trial_no = 0,
+                    workflow = workflow_name,
+                    status = "cancelled",
+                    latency_seconds = time.monotonic() - start_monotonic,
+                )
+            await self.reply_message_async(
+                response = f"{self.begin_of_bold}[{workflow_name}]{self.end_of_bold} 工作流已中止（超时、被管理员取消或服务重启）。您可以重新启动该工作流。",
+                message_id = reply_message_id,
+                reply_in_thread = True,
+            )
+            raise
+
         except Exception as error:
             print(f"[PkuPhyFermionBot] Workflow {workflow_name} failed: {error}\n{traceback.format_exc()}")
             async with context["lock"]:
                 context["running_workflows"] -= 1
+            # 失败的工作流不会写入云文档，不占用解答编号，记为 0
+            if context["problem_no"] is not None:
+                self._problem_catalog.record_trial(
+                    problem_no = context["problem_no"],
+                    trial_no = 0,
+                    workflow = workflow_name,
+                    status = "failed",
+                    latency_seconds = time.monotonic() - start_monotonic,
+                )
             await self.reply_message_async(
                 response = f"{self.begin_of_bold}[{workflow_name}]{self.end_of_bold} 非常抱歉，工作流执行出错: {str(error)}\n您可以联系志愿者以排查问题。",
                 message_id = reply_message_id,
@@ -584,34 +840,69 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             )
 
 
-    async def _push_latest_trial_to_document(
+    async def _push_trial_to_document(
         self,
-        context: Dict[str, Any],
+        context: FermionTopicContext,
+        trial_record: FermionTrialRecord,
+        trial_no: int,
+        ticket: int,
         workflow_result: Dict[str, Any],
-    )-> None:
+    )-> Optional[float]:
         
         """
-        将 context 中最新的 trial 追加到云文档，加锁调用
+        为第 trial_no 个解答评分并追加到云文档，无需持有 context["lock"]
+        评分与文档块的构建可与其他解答并发；追加按 ticket 在 context["document_sequencer"] 上排队，保证文档中的解答按编号排列
+        出错或被取消时放弃 ticket，不会阻塞后面的解答
+        返回 AI 裁判员的打分；未打分时返回 None
         """
         
-        latest_trial = context["trials"][-1]
-        if latest_trial["status"] != "success": return
-        trial_no = len(context["trials"]) 
-        workflow_name = latest_trial["workflow"]
-        document_content = latest_trial["document_content"]
+        sequencer: TicketSequencer = context["document_sequencer"]
+        try:
+            content_str, score = await self._build_trial_document_content(
+                context = context,
+                trial_record = trial_record,
+                trial_no = trial_no,
+                workflow_result = workflow_result,
+            )
+            blocks = self.build_document_blocks(content_str)
+        except BaseException:
+            sequencer.skip(ticket)
+            raise
+        
+        async with sequencer.turn(ticket):
+            await self.append_document_blocks_async(
+                document_id = context["document_id"],
+                blocks = blocks,
+            )
+        return score
+    
+    
+    async def _build_trial_document_content(
+        self,
+        context: FermionTopicContext,
+        trial_record: FermionTrialRecord,
+        trial_no: int,
+        workflow_result: Dict[str, Any],
+    )-> Tuple[str, Optional[float]]:
+        
+        score: Optional[float] = None
+        workflow_name = trial_record["workflow"]
+        document_content = trial_record["document_content"]
 
         content_str = ""
         content_str += f"{self.begin_of_third_heading}AI 解答 {trial_no} | {workflow_name}{self.end_of_third_heading}"
         content_str += document_content.strip()
         
-        if "response" in workflow_result and context["answer"] != "暂无":
-            eval_result = await HET_model_verify(
+        if "response" in workflow_result and context["raw_answer"] != "暂无":
+            # 答案能在本地判定时（例如与参考答案数值相同）不再调用 AI 裁判员
+            eval_result = await HET_verify(
                 problem = context["problem_text"],
-                answer = context["answer"],
+                answer = context["raw_answer"],
                 response = workflow_result["response"],
+                use_local_verifier = self._config.get("use_local_verifier", True),
             )
             content_str += self.begin_of_forth_heading
-            content_str += "AI 裁判员打分"
+            content_str += "AI 裁判员打分" if eval_result["verifier"] == "model" else "本地答案比对打分"
             content_str += self.end_of_forth_heading
             content_str += self.begin_of_fifth_heading
             content_str += "分数"
@@ -621,15 +912,10 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             content_str += "评分依据"
             content_str += self.end_of_fifth_heading
             content_str += eval_result["justification"].strip()
+            score = float(eval_result["score"])
         
         content_str += self.divider_placeholder
-        
-        blocks = self.build_document_blocks(content_str)
-        
-        await self.append_document_blocks_async(
-            document_id = context["document_id"],
-            blocks = blocks,
-        )
+        return content_str, score
     
     
     def _handle_user_created_bridge(
@@ -722,8 +1008,22 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                     "        批量概览题目状态\n\n"
                     "    /view <ID|-1|random> [--verbose]\n"
                     "        查看题目详情上下文 (-1 为最新，random 为随机)\n\n"
+                    "    /search <关键词...>\n"
+                    "        在题目目录中全文检索标题、题干与答案\n\n"
+                    "    /top <数量> [score|latency]\n"
+                    "        列出裁判打分最高 / 耗时最长的解答\n\n"
                     "    /update_config [路径]\n"
-                    "        热重载配置文件 (默认使用启动路径)\n"
+                    "        热重载配置文件 (默认使用启动路径)\n\n"
+                    "    /profile start [秒数] | /profile stop\n"
+                    "        在事件循环线程上开启 / 停止 cProfile，结果以云文档形式返回\n\n"
+                    "    /memsnap [stop]\n"
+                    "        记录 tracemalloc 快照并与上一次快照比较 (stop 关闭追踪)\n\n"
+                    "    /llmstats\n"
+                    "        按调用点显示模型调用的尝试、拒收、修复与缓存命中统计\n\n"
+                    "    /ctxmem\n"
+                    "        显示缓存中话题上下文的数量与内存占用\n\n"
+                    "    /tasks [cancel <ID>]\n"
+                    "        显示后台任务（受理、工作流）的运行与排队情况，或取消某道题目的全部后台任务\n"
                 )
             await self.reply_message_async(help_text, message_id)
             return
@@ -733,8 +1033,20 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             return
 
         if command == "/stats":
-            current_total = self._next_problem_no - 1
-            await self.reply_message_async(f"当前题库总数: {current_total}", message_id)
+            latest_problem_no = await self._problem_catalog.get_max_problem_no_async()
+            high_water_mark = await self._problem_no_allocator.get_high_water_mark_async()
+            allocator_stats = self._problem_no_allocator.get_stats()
+            registry_stats = self._problem_registry.get_stats()
+            task_stats = self.get_background_task_stats()
+            await self.reply_message_async(
+                f"最新题号: {latest_problem_no}\n"
+                f"题号分配: 本进程已分配 {allocator_stats['allocated']}，"
+                f"全局已租出至 {high_water_mark}（本进程预留 {allocator_stats['local_remaining']}）\n"
+                f"内存索引: 活跃 {registry_stats['live']}，墓碑 {registry_stats['tombstone']}\n"
+                f"后台任务: 运行 {task_stats.get('running', 0)}，排队 {task_stats.get('queued', 0)}，"
+                f"其中受理 {task_stats.get('by_name', {}).get('intake', 0)}",
+                message_id,
+            )
             return
 
         elif command == "/glance":
@@ -755,23 +1067,28 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                 await self.reply_message_async("错误: 范围过大 (最大 50)", message_id)
                 return
 
+            entries: Dict[int, Tuple[str, str, str]] = {}
+            for problem_id, context in self._problem_registry.iterate_range(start_id, end_id):
+                if context["is_tombstone"]:
+                    status = "[清理]"
+                elif context["topic_state"] == "archived":
+                    status = "[归档]"
+                else:
+                    status = "[活跃]"
+                entries[problem_id] = (status, context["document_title"], context["document_url"])
+            # 内存索引中没有的题号（例如重启前创建的题目）从题目目录补齐
+            if len(entries) < end_id - start_id + 1:
+                for row in await self._problem_catalog.get_problems_in_range_async(start_id, end_id):
+                    if row["problem_no"] in entries: continue
+                    status = "[归档]" if row["status"] == "archived" else "[目录]"
+                    entries[row["problem_no"]] = (status, row["title"], row["document_url"])
+
             hyperlinks = []
             lines = [f"题库概览 ({start_id} -> {end_id})"]
-            for problem_id in range(start_id, end_id + 1):
-                context = self._problem_id_to_context.get(problem_id, None)
-                if context is not None:
-                    title = context["document_title"]
-                    document_url = context["document_url"]
-                    if context["is_tombstone"]:
-                        status = "[清理]"
-                    elif context["is_archived"]:
-                        status = "[归档]"
-                    else:
-                        status = "[活跃]"
-                    lines.append(f"#{problem_id:<4} {status} {self.begin_of_hyperlink}{title}{self.end_of_hyperlink}")
-                    hyperlinks.append(document_url)
-                else:
-                    pass
+            for problem_id in sorted(entries):
+                status, title, document_url = entries[problem_id]
+                lines.append(f"#{problem_id:<4} {status} {self.begin_of_hyperlink}{title}{self.end_of_hyperlink}")
+                hyperlinks.append(document_url)
             
             report = "\n".join(lines)
             await self.reply_message_async(
@@ -791,7 +1108,7 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             verbose = "--verbose" in args
             
             try:
-                current_max = self._next_problem_no - 1
+                current_max = await self._problem_catalog.get_max_problem_no_async()
                 if target_str == "-1":
                     target_id = current_max
                 elif target_str == "random":
@@ -805,10 +1122,27 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                 await self.reply_message_async("错误: ID 格式无效", message_id)
                 return
 
-            context = self._problem_id_to_context.get(target_id, None)
+            context = self._problem_registry.get(target_id)
             if context is None:
-                await self.reply_message_async(f"错误: 内存中未找到题目 #{target_id}", message_id)
-                return
+                catalog_row = await self._problem_catalog.get_problem_async(target_id)
+                if catalog_row is None:
+                    await self.reply_message_async(f"错误: 未找到题目 #{target_id}", message_id)
+                    return
+                best_score = catalog_row["best_score"]
+                info = (
+                    f"题目编号:   {target_id}\n"
+                    f"当前状态:   {'已归档' if catalog_row['status'] == 'archived' else '仅存于题目目录'}\n"
+                    f"解答次数:   {catalog_row['trial_num']}\n"
+                    f"最高打分:   {'无' if best_score is None else f'{best_score:g}'}\n"
+                    f"文档链接:   {self.begin_of_hyperlink}{catalog_row['title']}{self.end_of_hyperlink}\n"
+                )
+                await self.reply_message_async(
+                    response = info,
+                    message_id = message_id,
+                    hyperlinks = [catalog_row["document_url"]],
+                    reply_in_thread = False,
+                )
+                return None
 
             document_title = context["document_title"]
             document_url = context["document_url"]
@@ -818,7 +1152,7 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                 status = "已清理 (仅索引)"
                 last_workflow = "数据已释放"
             else:
-                status = "已归档" if context.get("is_archived") else "进行中"
+                status = "已归档" if context["topic_state"] == "archived" else "进行中"
                 last_workflow = "无"
                 if context.get("trials"):
                     last_workflow = context["trials"][-1]["workflow"]
@@ -835,7 +1169,12 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
                 history = context.get("history", {})
                 debug_view["history_len"] = len(history.get("prompt", [])) if isinstance(history, dict) else 0
                 debug_view["trials_count"] = len(context.get("trials", []))
-                json_str = json.dumps(debug_view, indent=2, default=str, ensure_ascii=False)
+                json_str = json.dumps(
+                    debug_view, 
+                    indent = 2, 
+                    default = lambda value: value.to_dict() if isinstance(value, SlottedRecord) else str(value), 
+                    ensure_ascii = False,
+                )
                 info += f"\n上下文转储 (Dump):\n{json_str}"
 
             await self.reply_message_async(
@@ -846,6 +1185,86 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             )
             return None
         
+        elif command == "/search":
+            keywords = args[1:]
+            if not keywords:
+                await self.reply_message_async("用法: /search <关键词...>", message_id)
+                return None
+            rows = await self._problem_catalog.search_async(keywords, limit=20)
+            if not rows:
+                await self.reply_message_async(f"未找到包含 {' '.join(keywords)} 的题目", message_id)
+                return None
+            lines = [f"检索结果 ({' '.join(keywords)})"]
+            for row in rows:
+                status = "[归档]" if row["status"] == "archived" else "[活跃]"
+                lines.append(
+                    f"#{row['problem_no']:<4} {status} {self.begin_of_hyperlink}{row['title']}{self.end_of_hyperlink}"
+                )
+            await self.reply_message_async(
+                response = "\n".join(lines),
+                hyperlinks = [row["document_url"] for row in rows],
+                message_id = message_id,
+                reply_in_thread = False,
+            )
+            return None
+
+        elif command == "/top":
+            order_by_arg = args[2].lower() if len(args) > 2 else "score"
+            order_by: Literal["score", "latency"] = "latency" if order_by_arg == "latency" else "score"
+            try:
+                n = int(args[1])
+                assert 0 < n <= 50
+                assert order_by_arg == order_by
+            except (IndexError, ValueError, AssertionError):
+                await self.reply_message_async("用法: /top <数量 (1-50)> [score|latency]", message_id)
+                return None
+            rows = await self._problem_catalog.top_trials_async(n, order_by=order_by)
+            if not rows:
+                await self.reply_message_async("题目目录中暂无解答记录", message_id)
+                return None
+            lines = [f"解答排行 (按{'打分' if order_by == 'score' else '耗时'}，前 {n} 条)"]
+            for row in rows:
+                score = "无" if row["score"] is None else f"{row['score']:g}"
+                latency = "无" if row["latency_seconds"] is None else f"{row['latency_seconds']:.1f} s"
+                lines.append(
+                    f"#{row['problem_no']:<4} 解答 {row['trial_no']} [{row['workflow']}] "
+                    f"打分 {score}，耗时 {latency} "
+                    f"{self.begin_of_hyperlink}{row['title']}{self.end_of_hyperlink}"
+                )
+            await self.reply_message_async(
+                response = "\n".join(lines),
+                hyperlinks = [row["document_url"] for row in rows],
+                message_id = message_id,
+                reply_in_thread = False,
+            )
+            return None
+        
+        elif command == "/tasks":
+            if len(args) >= 3 and args[1].lower() == "cancel":
+                try:
+                    target_id = int(args[2])
+                except ValueError:
+                    await self.reply_message_async("错误: ID 必须为整数", message_id)
+                    return None
+                context = self._problem_registry.get(target_id)
+                if context is None or context["is_tombstone"]:
+                    await self.reply_message_async(f"错误: 内存中没有题目 #{target_id} 的活跃话题", message_id)
+                    return None
+                assert self._task_supervisor is not None
+                cancelled_num = self._task_supervisor.cancel_group(context["thread_root_id"])
+                await self.reply_message_async(f"已取消题目 #{target_id} 的 {cancelled_num} 个后台任务", message_id)
+                return None
+            task_stats = self.get_background_task_stats()
+            await self.reply_message_async(
+                f"后台任务: 运行 {task_stats.get('running', 0)}，排队 {task_stats.get('queued', 0)}，"
+                f"涉及 {task_stats.get('groups', 0)} 个话题\n"
+                f"按类型: {', '.join(f'{name} {count}' for name, count in task_stats.get('by_name', {}).items()) or '无'}\n"
+                f"累计: 完成 {task_stats.get('completed', 0)}，失败 {task_stats.get('failed', 0)}，"
+                f"取消 {task_stats.get('cancelled', 0)}，超时 {task_stats.get('timed_out', 0)}",
+                message_id,
+            )
+            return None
+        
         elif command == "/update_config":
             target_path = args[1] if len(args) > 1 else self._config_path
             await self.reply_message_async(
@@ -862,6 +1281,156 @@ class PkuPhyFermionBot(ParallelThreadLarkBot):
             )
             return None
 
+        elif command == "/profile":
+            action = args[1].lower() if len(args) > 1 else ""
+            if action == "start":
+                seconds: Optional[float] = None
+                if len(args) > 2:
+                    try:
+                        seconds = float(args[2])
+                        assert seconds > 0
+                    except (ValueError, AssertionError):
+                        await self.reply_message_async("错误: 秒数必须为正数", message_id)
+                        return None
+                if self._event_loop_profiler.is_running:
+                    await self.reply_message_async(
+                        f"错误: profiler 已运行 {self._event_loop_profiler.elapsed_seconds:.1f} s，请先 /profile stop", 
+                        message_id,
+                    )
+                    return None
+                async def on_auto_stop(report: str)-> None:
+                    await self._upload_diagnostic_report_async(
+                        title = "Profile 报告",
+                        report = report,
+                        message_id = message_id,
+                    )
+                self._event_loop_profiler.start(
+                    seconds = seconds,
+                    on_auto_stop = on_auto_stop,
+                )
+                if seconds is None:
+                    await self.reply_message_async("profiler 已启动，输入 /profile stop 以结束并获取报告", message_id)
+                else:
+                    await self.reply_message_async(f"profiler 已启动，将在 {seconds:g} s 后自动停止并上传报告", message_id)
+                return None
+            elif action == "stop":
+                if not self._event_loop_profiler.is_running:
+                    await self.reply_message_async("错误: profiler 未在运行", message_id)
+                    return None
+                report = self._event_loop_profiler.stop()
+                await self._upload_diagnostic_report_async(
+                    title = "Profile 报告",
+                    report = report,
+                    message_id = message_id,
+                )
+                return None
+            else:
+                await self.reply_message_async("用法: /profile start [秒数] | /profile stop", message_id)
+                return None
+        
+        elif command == "/memsnap":
+            if len(args) > 1 and args[1].lower() == "stop":
+                self._memory_snapshot_differ.stop()
+                await self.reply_message_async("tracemalloc 已关闭，基线快照已清除", message_id)
+                return None
+            # 快照本身会短暂阻塞事件循环，放到线程里做
+            report = await asyncio.to_thread(self._memory_snapshot_differ.snapshot)
+            await self._upload_diagnostic_report_async(
+                title = "内存快照报告",
+                report = report,
+                message_id = message_id,
+            )
+            return None
+
+        elif command == "/ctxmem":
+            context_memory_stats = self.get_context_memory_stats()
+            await self.reply_message_async(
+                f"缓存中的话题上下文: {context_memory_stats['context_num']} 个，"
+                f"共 {context_memory_stats['total_bytes'] / 1024:.1f} KiB，"
+                f"平均 {context_memory_stats['mean_bytes'] / 1024:.1f} KiB，"
+                f"最大 {context_memory_stats['max_bytes'] / 1024:.1f} KiB",
+                message_id,
+            )
+            return None
+
+        elif command == "/llmstats":
+            lines = ["[模型调用统计] (本进程启动以来)"]
+            for call_site, call_site_stats in get_call_site_stats().items():
+                lines.append(
+                    f"{call_site}: 调用 {call_site_stats.get('calls', 0)}，"
+                    f"尝试 {call_site_stats.get('attempts', 0)} "
+                    f"(平均 {call_site_stats['attempts_per_call']:.2f})，"
+                    f"拒收率 {call_site_stats['rejection_rate']:.1%}，"
+                    f"本地修复 {call_site_stats.get('local_repairs', 0)}，"
+                    f"追问修复 {call_site_stats.get('followup_repairs', 0)}，"
+                    f"缓存命中 {call_site_stats.get('cache_hits', 0)}，"
+                    f"失败 {call_site_stats.get('failures', 0)}"
+                )
+            for model_name, prompt_cache_stats in get_prompt_cache_stats().items():
+                lines.append(
+                    f"{model_name}: 输入 {prompt_cache_stats['prompt_tokens']} tokens，"
+                    f"提示词缓存命中 {prompt_cache_stats['cached_tokens']} tokens "
+                    f"({prompt_cache_stats['cached_token_rate']:.1%})"
+                )
+            await self.reply_message_async("\n".join(lines), message_id)
+            return None
+
         else:
             await self.reply_message_async(f"错误: 未知指令 '{command}'", message_id)
-            return None
\ No newline at end of file
+            return None
+    
+    
+    async def on_shutdown(
+        self,
+    )-> None:
+        
+        # 题目目录的写入在后台线程中批量提交，退出前等它写完
+        flushed = await asyncio.to_thread(self._problem_catalog.flush, 10.0)
+        if not flushed:
+            print("[PkuPhyFermionBot] 题目目录在 10 s 内未能写完，部分记录可能丢失。")
+    
+    
+    async def _upload_diagnostic_report_async(
+        self,
+        title: str,
+        report: str,
+        message_id: str,
+    )-> None:
+        
+        """
+        把诊断报告写入一篇新的云文档，并在管理员私聊中回复文档链接
+        """
+        
+        try:
+            document_title = f"{title} | {self._config['name']} | {get_time_stamp(show_minute=True, show_second=True)}"
+            document_id = await self.create_document_async(
+                title = document_title,
+                folder_token = self._config.get("diagnostics_folder_token", self._config["problem_set_folder_token"]),
+            )
+            document_url = get_lark_document_url(
+                tenant = self._config["association_tenant"],
+                document_id = document_id,
+            )
+            content = (
+                f"{self.begin_of_code}"
+                f"{self.begin_of_language}Plain Text{self.end_of_language}"
+                f"{self.begin_of_content}{report}{self.end_of_content}"
+                f"{self.end_of_code}"
+            )
+            await self.overwrite_document_async(
+                document_id = document_id,
+                blocks = self.build_document_blocks(content),
+                images = [],
+                existing_block_num = 0,
+            )
+            await self.reply_message_async(
+                response = f"{title}已生成: {self.begin_of_hyperlink}{document_title}{self.end_of_hyperlink}",
+                message_id = message_id,
+                hyperlinks = [document_url],
+            )
+        except Exception as error:
+            print(f"[PkuPhyFermionBot] Failed to upload diagnostic report: {error}\n{traceback.format_exc()}")
+            await self.reply_message_async(
+                response = f"{title}上传失败: {error}\n报告前 2000 字符如下：\n{report[:2000]}",
+                message_id = message_id,
+            )
\ No newline at end of file
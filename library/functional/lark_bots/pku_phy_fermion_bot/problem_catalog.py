@@ -0,0 +1,372 @@
+import queue
+import sqlite3
+from ....fundamental import *
+
+
+__all__ = [
+    "ProblemCatalog",
+]
+
+
+class ProblemCatalog:
+
+    """
+    题目、工作流 trial 与裁判打分的持久化目录，供 /search、/top 以及内存索引之外的 /view、/glance 查询
+    - 写入只是把写操作放进队列，由单独的写线程批量地在同一事务中提交，不阻塞事件循环
+    - 读取在线程中执行，WAL 模式下与写线程互不阻塞
+    - 题目全文检索使用 FTS5 trigram 分词（支持中文子串匹配）；SQLite 不支持时退化为 unicode61 分词或 LIKE
+    """
+
+    def __init__(
+        self,
+        path: str,
+        write_batch_size: int = 256,
+    )-> None:
+
+        # 构造函数可能在主进程与子进程中各执行一次，连接与写线程都延迟到首次使用时创建
+        self._path: str = path
+        self._write_batch_size: int = write_batch_size
+
+        # 队列元素是在写线程里针对写连接执行的函数，同一批次在一个事务中提交
+        self._write_queue: "queue.Queue[Callable[[sqlite3.Connection], Any]]" = queue.Queue()
+        self._writer_thread: Optional[threading.Thread] = None
+        self._writer_lock: threading.Lock = threading.Lock()
+
+        self._read_connection: Optional[sqlite3.Connection] = None
+        self._read_lock: threading.Lock = threading.Lock()
+        self._fts_mode: Optional[Literal["trigram", "unicode61", "like"]] = None
+
+        self.write_errors: int = 0
+
+
+    # ------------------ 写入（任意线程，非阻塞） ------------------
+
+    def upsert_problem(
+        self,
+        problem_no: int,
+        title: str,
+        document_url: str,
+        owner: Optional[str],
+        problem_text: str,
+        answer: str,
+        status: str = "active",
+    )-> None:
+
+        now = time.time()
+
+        def write(
+            connection: sqlite3.Connection,
+        )-> None:
+
+            connection.execute(
+                "INSERT INTO problems "
+                "(problem_no, title, document_url, owner, problem_text, answer, status, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) "
+                "ON CONFLICT(problem_no) DO UPDATE SET "
+                "title = excluded.title, document_url = excluded.document_url, owner = excluded.owner, "
+                "problem_text = excluded.problem_text, answer = excluded.answer, "
+                "status = excluded.status, updated_at = excluded.updated_at",
+                (problem_no, title, document_url, owner, problem_text, answer, status, now, now),
+            )
+            if self._fts_mode == "like": return
+            connection.execute("DELETE FROM problems_fts WHERE rowid = ?", (problem_no,))
+            connection.execute(
+                "INSERT INTO problems_fts (rowid, title, problem_text, answer) VALUES (?, ?, ?, ?)",
+                (problem_no, title, problem_text, answer),
+            )
+
+        self._enqueue(write)
+
+
+    def update_problem_status(
+        self,
+        problem_no: int,
+        status: str,
+    )-> None:
+
+        updated_at = time.time()
+        self._enqueue(lambda connection: connection.execute(
+            "UPDATE problems SET status = ?, updated_at = ? WHERE problem_no = ?",
+            (status, updated_at, problem_no),
+        ))
+
+
+    def record_trial(
+        self,
+        problem_no: int,
+        trial_no: int,
+        workflow: str,
+        status: str,
+        latency_seconds: Optional[float],
+        score: Optional[float] = None,
+    )-> None:
+
+        created_at = time.time()
+        self._enqueue(lambda connection: connection.execute(
+            "INSERT INTO trials (problem_no, trial_no, workflow, status, latency_seconds, score, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (problem_no, trial_no, workflow, status, latency_seconds, score, created_at),
+        ))
+
+
+    def flush(
+        self,
+        timeout: float,
+    )-> bool:
+
+        """
+        阻塞等待队列中的写入全部提交，返回是否在 timeout 秒内完成
+        """
+
+        end_time = time.monotonic() + timeout
+        with self._write_queue.all_tasks_done:
+            while self._write_queue.unfinished_tasks:
+                remaining_seconds = end_time - time.monotonic()
+                if remaining_seconds <= 0: return False
+                self._write_queue.all_tasks_done.wait(remaining_seconds)
+        return True
+
+
+    # ------------------ 查询（异步，线程中执行） ------------------
+
+    async def search_async(
+        self,
+        keywords: List[str],
+        limit: int = 10,
+    )-> List[Dict[str, Any]]:
+
+        return await asyncio.to_thread(self._search, keywords, limit)
+
+
+    async def top_trials_async(
+        self,
+        n: int,
+        order_by: Literal["score", "latency"] = "score",
+    )-> List[Dict[str, Any]]:
+
+        if order_by == "score":
+            condition, order = "t.score IS NOT NULL", "t.score DESC"
+        else:
+            condition, order = "t.latency_seconds IS NOT NULL", "t.latency_seconds DESC"
+        return await asyncio.to_thread(
+            self._query,
+            "SELECT t.problem_no, p.title, p.document_url, t.trial_no, t.workflow, t.score, t.latency_seconds "
+            f"FROM trials t JOIN problems p ON p.problem_no = t.problem_no WHERE {condition} "
+            f"ORDER BY {order} LIMIT ?",
+            (n,),
+        )
+
+
+    async def get_problem_async(
+        self,
+        problem_no: int,
+    )-> Optional[Dict[str, Any]]:
+
+        rows = await asyncio.to_thread(
+            self._query,
+            "SELECT p.*, "
+            "(SELECT COUNT(*) FROM trials t WHERE t.problem_no = p.problem_no) AS trial_num, "
+            "(SELECT MAX(t.score) FROM trials t WHERE t.problem_no = p.problem_no) AS best_score "
+            "FROM problems p WHERE p.problem_no = ?",
+            (problem_no,),
+        )
+        return rows[0] if rows else None
+
+
+    async def get_problems_in_range_async(
+        self,
+        start_no: int,
+        end_no: int,
+    )-> List[Dict[str, Any]]:
+
+        return await asyncio.to_thread(
+            self._query,
+            "SELECT problem_no, title, document_url, status FROM problems "
+            "WHERE problem_no BETWEEN ? AND ? ORDER BY problem_no",
+            (start_no, end_no),
+        )
+
+
+    async def get_max_problem_no_async(
+        self,
+    )-> int:
+
+        rows = await asyncio.to_thread(
+            self._query, "SELECT COALESCE(MAX(problem_no), 0) AS max_problem_no FROM problems", (),
+        )
+        return rows[0]["max_problem_no"]
+
+
+    # ------------------ 内部实现 ------------------
+
+    def _enqueue(
+        self,
+        write: Callable[[sqlite3.Connection], Any],
+    )-> None:
+
+        self._ensure_writer()
+        self._write_queue.put(write)
+
+
+    def _ensure_writer(
+        self,
+    )-> None:
+
+        if self._writer_thread is not None and self._writer_thread.is_alive(): return
+        with self._writer_lock:
+            if self._writer_thread is not None and self._writer_thread.is_alive(): return
+            self._writer_thread = threading.Thread(
+                target = self._writer_loop,
+                name = "ProblemCatalogWriter",
+                daemon = True,
+            )
+            self._writer_thread.start()
+
+
+    def _writer_loop(
+        self,
+    )-> None:
+
+        connection = self._connect()
+        while True:
+            batch = [self._write_queue.get()]
+            while len(batch) < self._write_batch_size:
+                try:
+                    batch.append(self._write_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with connection:
+                    for write in batch: write(connection)
+            except Exception as error:
+                # 整批已回滚：逐条在各自的事务中重试，只丢弃本身写不进去的记录
+                print(f"[ProblemCatalog] 批量写入失败，逐条重试 {len(batch)} 条记录: {error}")
+                for write in batch:
+                    try:
+                        with connection:
+                            write(connection)
+                    except Exception as write_error:
+                        self.write_errors += 1
+                        print(f"[ProblemCatalog] 写入失败，丢弃该记录: {write_error}")
+            finally:
+                for _ in batch: self._write_queue.task_done()
+
+
+    def _connect(
+        self,
+    )-> sqlite3.Connection:
+
+        directory = os.path.dirname(self._path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._path, check_same_thread=False, timeout=30.0)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        with connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS problems ("
+                "problem_no INTEGER PRIMARY KEY, "
+                "title TEXT NOT NULL, "
+                "document_url TEXT NOT NULL, "
+                "owner TEXT, "
+                "problem_text TEXT NOT NULL, "
+                "answer TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "created_at REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS trials ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                "problem_no INTEGER NOT NULL, "
+                "trial_no INTEGER NOT NULL, "
+                "workflow TEXT NOT NULL, "
+                "status TEXT NOT NULL, "
+                "latency_seconds REAL, "
+                "score REAL, "
+                "created_at REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS trials_problem_no ON trials (problem_no)")
+            connection.execute("CREATE INDEX IF NOT EXISTS trials_score ON trials (score)")
+            connection.execute("CREATE INDEX IF NOT EXISTS trials_latency ON trials (latency_seconds)")
+        if self._fts_mode is None:
+            self._fts_mode = self._create_fts_table(connection)
+        return connection
+
+
+    @staticmethod
+    def _create_fts_table(
+        connection: sqlite3.Connection,
+    )-> Literal["trigram", "unicode61", "like"]:
+
+        for tokenize_clause in [", tokenize='trigram'", ""]:
+            try:
+                with connection:
+                    connection.execute(
+                        "CREATE VIRTUAL TABLE IF NOT EXISTS problems_fts "
+                        f"USING fts5(title, problem_text, answer{tokenize_clause})"
+                    )
+            except sqlite3.OperationalError:
+                continue
+            table_sql = connection.execute(
+                "SELECT sql FROM sqlite_master WHERE name = 'problems_fts'"
+            ).fetchone()[0]
+            return "trigram" if "trigram" in table_sql else "unicode61"
+        print("[ProblemCatalog] SQLite 不支持 FTS5，/search 退化为 LIKE 扫描")
+        return "like"
+
+
+    def _query(
+        self,
+        sql: str,
+        params: Tuple[Any, ...],
+    )-> List[Dict[str, Any]]:
+
+        with self._read_lock:
+            if self._read_connection is None:
+                self._read_connection = self._connect()
+            rows = self._read_connection.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+
+    def _search(
+        self,
+        keywords: List[str],
+        limit: int,
+    )-> List[Dict[str, Any]]:
+
+        if self._fts_mode is None: self._query("SELECT 1", ())
+        keywords = [keyword for keyword in keywords if keyword.strip()]
+        if not keywords: return []
+
+        columns = "p.problem_no, p.title, p.document_url, p.status"
+        # trigram 分词只能匹配不短于 3 个字符的词，更短的词用 LIKE 在 FTS 命中结果上过滤
+        if self._fts_mode == "trigram":
+            match_terms = [keyword for keyword in keywords if len(keyword) >= 3]
+        elif self._fts_mode == "unicode61":
+            match_terms = keywords
+        else:
+            match_terms = []
+        like_terms = [keyword for keyword in keywords if keyword not in match_terms]
+
+        like_conditions = " AND ".join(
+            "(p.title || p.problem_text || p.answer) LIKE ?" for _ in like_terms
+        )
+        like_params = tuple(f"%{keyword}%" for keyword in like_terms)
+
+        # 结果按题号倒序（最新的题目在前）：bm25 排序需要为每条命中打分，常见词命中上万条时会拖到上百毫秒
+        if match_terms:
+            match_expression = " AND ".join(
+                '"' + keyword.replace('"', '""') + '"' for keyword in match_terms
+            )
+            return self._query(
+                f"SELECT {columns} FROM problems_fts f JOIN problems p ON p.problem_no = f.rowid "
+                f"WHERE problems_fts MATCH ? {'AND ' + like_conditions if like_terms else ''} "
+                "ORDER BY f.rowid DESC LIMIT ?",
+                (match_expression, *like_params, limit),
+            )
+        return self._query(
+            f"SELECT {columns} FROM problems p WHERE {like_conditions} "
+            "ORDER BY p.problem_no DESC LIMIT ?",
+            (*like_params, limit),
+        )
@@ -0,0 +1,147 @@
+import bisect
+from array import array
+from ....fundamental import *
+from .topic_records import *
+
+
+__all__ = [
+    "ProblemRegistry",
+]
+
+
+class ProblemRegistry:
+
+    """
+    题号 -> 话题上下文的索引
+    - 活跃话题保存完整的 FermionTopicContext
+    - 话题被上下文缓存驱逐后由 tombstone() 转为墓碑，只在按题号排序的列式存储中保留标题、链接与状态
+    - 题号由 BlockIdAllocator 按段租用：跨重启递增，且与其他进程交错，本进程拿到的题号稀疏且不从 1 开始
+      因此墓碑按题号有序存放而不是按题号直接寻址，占用只与本进程登记过的题目数成正比
+    - get 为 O(log 墓碑数)，iterate_range 为 O(log 墓碑数 + 活跃话题数 + 结果数)
+    """
+
+    def __init__(
+        self,
+    )-> None:
+
+        self._live_contexts: Dict[int, FermionTopicContext] = {}
+        # 墓碑的三列按题号升序对齐；话题大致按题号顺序被驱逐，插入位置通常在末尾
+        self._tombstone_numbers: array = array("q")
+        self._tombstone_titles: List[Optional[str]] = []
+        self._tombstone_urls: List[Optional[str]] = []
+
+
+    def register(
+        self,
+        problem_no: int,
+        context: FermionTopicContext,
+    )-> None:
+
+        self._remove_tombstone(problem_no)
+        self._live_contexts[problem_no] = context
+
+
+    def tombstone(
+        self,
+        problem_no: int,
+        context: Optional[FermionTopicContext] = None,
+    )-> bool:
+
+        """
+        把活跃话题转为墓碑；给出 context 时，只有它仍是该题号登记的上下文才转换
+        返回是否发生了转换
+        """
+
+        live_context = self._live_contexts.get(problem_no)
+        if live_context is None: return False
+        if context is not None and live_context is not context: return False
+        del self._live_contexts[problem_no]
+        index = bisect.bisect_left(self._tombstone_numbers, problem_no)
+        self._tombstone_numbers.insert(index, problem_no)
+        self._tombstone_titles.insert(index, live_context["document_title"])
+        self._tombstone_urls.insert(index, live_context["document_url"])
+        return True
+
+
+    def get(
+        self,
+        problem_no: int,
+    )-> Optional[Union[FermionTopicContext, FermionTopicTombstone]]:
+
+        live_context = self._live_contexts.get(problem_no)
+        if live_context is not None: return live_context
+        index = self._find_tombstone(problem_no)
+        if index is None: return None
+        return self._make_tombstone(index)
+
+
+    def iterate_range(
+        self,
+        start_no: int,
+        end_no: int,
+    )-> Iterator[Tuple[int, Union[FermionTopicContext, FermionTopicTombstone]]]:
+
+        # 活跃话题数以上下文缓存大小为上界，直接筛选后与有序的墓碑归并
+        live_numbers = sorted(
+            problem_no for problem_no in self._live_contexts
+            if start_no <= problem_no <= end_no
+        )
+        index = bisect.bisect_left(self._tombstone_numbers, start_no)
+        end_index = bisect.bisect_right(self._tombstone_numbers, end_no)
+        live_position = 0
+        while live_position < len(live_numbers) or index < end_index:
+            if index >= end_index or (
+                live_position < len(live_numbers)
+                and live_numbers[live_position] < self._tombstone_numbers[index]
+            ):
+                problem_no = live_numbers[live_position]
+                live_position += 1
+                yield problem_no, self._live_contexts[problem_no]
+            else:
+                yield self._tombstone_numbers[index], self._make_tombstone(index)
+                index += 1
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, int]:
+
+        return {
+            "live": len(self._live_contexts),
+            "tombstone": len(self._tombstone_numbers),
+        }
+
+
+    def _find_tombstone(
+        self,
+        problem_no: int,
+    )-> Optional[int]:
+
+        index = bisect.bisect_left(self._tombstone_numbers, problem_no)
+        if index < len(self._tombstone_numbers) and self._tombstone_numbers[index] == problem_no:
+            return index
+        return None
+
+
+    def _remove_tombstone(
+        self,
+        problem_no: int,
+    )-> None:
+
+        index = self._find_tombstone(problem_no)
+        if index is None: return
+        del self._tombstone_numbers[index]
+        del self._tombstone_titles[index]
+        del self._tombstone_urls[index]
+
+
+    def _make_tombstone(
+        self,
+        index: int,
+    )-> FermionTopicTombstone:
+
+        return FermionTopicTombstone(
+            problem_no = self._tombstone_numbers[index],
+            document_title = self._tombstone_titles[index],
+            document_url = self._tombstone_urls[index],
+        )
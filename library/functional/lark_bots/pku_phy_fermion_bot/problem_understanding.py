@@ -6,6 +6,18 @@ __all__ = [
 ]
 
 
+_understanding_schema: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "problem_title": {"type": "string", "minLength": 1},
+        "problem_text": {"type": "string", "minLength": 1},
+        "answer": {"type": "string", "minLength": 1},
+    },
+    "required": ["problem_title", "problem_text", "answer"],
+    "additionalProperties": False,
+}
+
+
 async def understand_problem_async(
     message: str,
     problem_images: List[bytes],
@@ -33,7 +45,8 @@ async def understand_problem_async(
     image_placeholder = "<image_never_used>"
     
     # 采用 XML 结构 + 指令三明治 + Few-Shots (返回 JSON 格式)
-    prompt = f"""
+    # 静态的角色、指令与示例放进 system_prompt，每次请求只有 user 消息不同，便于命中提示词缓存
+    system_prompt = f"""
 <system_role>
 You are a professional Physics Problem Organizer.
 Your task is to FAITHFULLY extract and structure raw user input into a standardized format.
@@ -115,7 +128,9 @@ Please analyze the content in <input_text> and extract information into a JSON o
         <note>Clean separation of Question and Answer.</note>
     </example_3>
 </examples>
+"""
 
+    prompt = f"""
 <input_text>
 {message + len(problem_images) * image_placeholder}
 </input_text>
@@ -131,11 +146,12 @@ Please generate the JSON response now.
 """
 
     result = {}
+    last_parse_error = ""
 
     def check_and_accept(
         response: str,
     )-> bool:
-        nonlocal result
+        nonlocal result, last_parse_error
         print(f"Understand Problem: checking the following response now\n{response}")
         try:
             halfway_result = {}
@@ -148,6 +164,7 @@ Please generate the JSON response now.
                     deserialize_json(response.strip())
                     json_string = response.strip()
                 except:
+                    last_parse_error = "No ```json code block was found"
                     return False
             else:
                 json_string = matches[0].strip()
@@ -156,10 +173,10 @@ Please generate the JSON response now.
             
             required_keys = ["problem_title", "problem_text", "answer"]
             for key in required_keys:
-                assert key in json_dict
-                assert isinstance(json_dict[key], str)
+                assert key in json_dict, f"missing key {key}"
+                assert isinstance(json_dict[key], str), f"{key} is not a string"
                 # 简单的非空校验
-                assert len(json_dict[key]) > 0
+                assert len(json_dict[key]) > 0, f"{key} is empty"
             
             # 简单的逻辑校验：title 不应包含 LaTeX 符号
             # if "$" in json_dict["problem_title"] or "\\" in json_dict["problem_title"]:
@@ -172,12 +189,30 @@ Please generate the JSON response now.
             
             result = halfway_result
             return True
-        except:
+        except Exception as error:
+            last_parse_error = f"{type(error).__name__}: {error}"
             return False
 
+    def build_repair_prompt(
+        rejected_response: str,
+    )-> str:
+        # 未通过 JSON 解析或 schema 校验的回复不会进入 check_and_accept，此时从被拒收的回复本身取出错误
+        parse_error = last_parse_error
+        try:
+            schema_errors = validate_json_schema(parse_json_response(rejected_response), _understanding_schema)
+            if schema_errors: parse_error = "; ".join(schema_errors)
+        except ValueError as error:
+            parse_error = f"{type(error).__name__}: {error}"
+        return (
+            f"Your previous reply could not be parsed as the required JSON ({parse_error or 'unknown error'}). "
+            "Output the same JSON object again inside a single ```json code block, "
+            "with keys problem_title, problem_text and answer, and escape every backslash as \\\\."
+        )
+
     _ = await get_answer_async(
         prompt = prompt,
         model = model,
+        system_prompt = system_prompt,
         images = problem_images,
         image_placeholder = image_placeholder,
         temperature = temperature,
@@ -185,6 +220,14 @@ Please generate the JSON response now.
         trial_num = trial_num,
         trial_interval = trial_interval,
         check_and_accept = check_and_accept,
+        # 温度为 0 时同一条消息与图片的理解结果可复现，可直接复用
+        use_cache = (temperature == 0.0),
+        response_schema = _understanding_schema,
+        call_site = "understand_problem",
+        # JSON 常见的非法转义、尾随逗号等先本地修复，不行再追问一轮只修正格式
+        repair_functions = [repair_json_code_block],
+        repair_trial_num = 1,
+        repair_prompt_builder = build_repair_prompt,
     )
 
     return result
\ No newline at end of file
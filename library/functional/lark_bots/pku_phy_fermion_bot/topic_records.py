@@ -0,0 +1,135 @@
+from ....fundamental import *
+
+
+__all__ = [
+    "FermionTopicContext",
+    "FermionTrialRecord",
+    "FermionTopicTombstone",
+]
+
+
+def _new_topic_history(
+)-> Dict[str, List[Any]]:
+
+    return {
+        "prompt": [],
+        "images": [],
+        "roles": [],
+    }
+
+
+class FermionTopicContext(SlottedRecord):
+
+    """
+    PkuPhyFermionBot 每个话题的上下文，常驻内存的数量与 context_cache_size 同阶
+    """
+
+    __slots__ = (
+        "is_tombstone",
+        "lock",
+        "thread_root_id",
+        "is_accepted",
+        "owner",
+        "history",
+        "problem_no",
+        "problem_text",
+        "problem_images",
+        "problem_message_id",
+        "answer",
+        "raw_answer",
+        "document_created",
+        "document_id",
+        "document_title",
+        "document_url",
+        "document_block_num",
+        "document_ready",
+        "document_sequencer",
+        "topic_state",
+        "pending_workflows",
+        "trials",
+        "running_workflows",
+    )
+
+    _field_defaults = {
+        "is_tombstone": False,
+        "lock": asyncio.Lock,
+        "is_accepted": False,
+        "history": _new_topic_history,
+        "document_created": False,
+        "document_ready": asyncio.Event,
+        "document_sequencer": TicketSequencer,
+        "topic_state": "pending",
+        "pending_workflows": list,
+        "trials": list,
+        "running_workflows": 0,
+    }
+
+
+class FermionTrialRecord(SlottedRecord):
+
+    """
+    一次工作流执行的记录；工作流返回的未知字段放进 extras
+    """
+
+    __slots__ = (
+        "workflow",
+        "status",
+        "start_time",
+        "end_time",
+        "document_content",
+        "response",
+        "rendered_response",
+        "tool_use_trials",
+        "extras",
+    )
+
+    @classmethod
+    def from_workflow_result(
+        cls,
+        workflow: str,
+        status: str,
+        start_time: str,
+        end_time: str,
+        workflow_result: Dict[str, Any],
+    )-> "FermionTrialRecord":
+
+        reserved_fields = ("workflow", "status", "start_time", "end_time", "extras")
+        known_fields = {
+            key: value for key, value in workflow_result.items()
+            if key in cls._field_names and key not in reserved_fields
+        }
+        extras = {
+            key: value for key, value in workflow_result.items()
+            if key not in known_fields
+        }
+        return cls(
+            workflow = workflow,
+            status = status,
+            start_time = start_time,
+            end_time = end_time,
+            extras = extras or None,
+            **known_fields,
+        )
+
+
+class FermionTopicTombstone(SlottedRecord):
+
+    """
+    已被 LRU 驱逐的话题在题号索引中的残留，只保留 /glance 与 /view 需要的字段
+    """
+
+    __slots__ = (
+        "is_tombstone",
+        "problem_no",
+        "document_title",
+        "document_url",
+        "topic_state",
+        "trials",
+        "history",
+    )
+
+    _field_defaults = {
+        "is_tombstone": True,
+        "topic_state": "archived",
+        "trials": (),
+    }
@@ -1,5 +1,6 @@
 from .....fundamental import *
 from ..equation_rendering import *
+from ..topic_records import *
 
 
 __all__ = [
@@ -37,10 +38,10 @@ HET_problem_system_prompt_with_tool = """
 def with_tools_func_factory(
     model: str,
     lark_bot: LarkBot,
-)-> Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]:
+)-> Callable[[FermionTopicContext], Awaitable[Dict[str, Any]]]:
     
     async def workflow_func(
-        context: Dict[str, Any],
+        context: FermionTopicContext,
     )-> Dict[str, Any]:
         
         problem_text = context["problem_text"]
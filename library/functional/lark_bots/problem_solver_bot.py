@@ -75,7 +75,7 @@ class ProblemSolverBot(ParallelThreadLarkBot):
     
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         
         text: str = parsed_message.get("text", "")
@@ -28,7 +28,7 @@ class ReflectorBot(LarkBot):
         message: P2ImMessageReceiveV1,
     )-> None:
         
-        parsed_message: Dict[str, Any] = self.parse_message(message)
+        parsed_message: ParsedMessage = self.parse_message(message)
         if not parsed_message["success"]: return
         if parsed_message["chat_type"] == "group":
             if not parsed_message["mentioned_me"]: return
@@ -2,7 +2,7 @@ from typing import Dict, Any, List, Optional
 from collections import OrderedDict
 import traceback
 
-from ...fundamental.lark_tools import ParallelThreadLarkBot
+from ...fundamental.lark_tools import ParallelThreadLarkBot, ParsedMessage
 from ...fundamental.function_call_tools import mathematica_tool
 from pywheels.llm_tools.get_answer import get_answer_async, load_api_keys_async
 
@@ -126,7 +126,7 @@ class TestMCPBot(ParallelThreadLarkBot):
 
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         """
         判断是否应该处理此消息
@@ -1,4 +1,5 @@
 from .externals import *
+from .slotted_record import *
 from .lark_tools import *
 from .json_tools import *
 from .mcp_client import *
@@ -8,6 +9,15 @@ from .wolfram_tools import *
 from .backoff_decorators import *
 from .yaml_tools import *
 from .image_tools import *
+from .openai_client_pool import *
 from .get_answer_temp import *
 from .parquet_tools import *
 from .pdf_tools import *
+from .profiling_tools import *
+from .llm_response_cache import *
+from .response_repair_tools import *
+from .structured_output_tools import *
+from .context_window_manager import *
+from .block_id_allocator import *
+from .task_graph import *
+from .ticket_sequencer import *
\ No newline at end of file
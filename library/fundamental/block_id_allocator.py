@@ -0,0 +1,184 @@
+import sqlite3
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "BlockIdAllocator",
+]
+
+
+class BlockIdAllocator:
+
+    """
+    跨进程、跨重启唯一的递增编号分配器
+    - 各进程从同一个 SQLite 文件中按 block_size 批量租用连续编号段，租用在 BEGIN IMMEDIATE 事务中完成，不同进程拿到的段互不重叠
+    - 进程内从本地编号段直接取号，不经过数据库、不加锁；剩余编号不多于 prefetch_threshold 时在线程中预租下一段
+    - 进程退出时本地段中未用完的编号作废，因此编号全局唯一、进程内递增，但不保证连续
+    只应在同一个事件循环中调用 allocate_async
+    """
+
+    def __init__(
+        self,
+        path: str,
+        scope: str,
+        block_size: int = 16,
+        prefetch_threshold: int = 4,
+        first_id: int = 1,
+    )-> None:
+
+        assert block_size > 0 and 0 <= prefetch_threshold < block_size
+
+        self._path: str = path
+        self._scope: str = scope
+        self._block_size: int = block_size
+        self._prefetch_threshold: int = prefetch_threshold
+        self._first_id: int = first_id
+
+        # 本地可用编号为 [_next_id, _block_end)，预租到的下一段暂存在 _pending_blocks
+        self._next_id: int = 0
+        self._block_end: int = 0
+        self._pending_blocks: Deque[Tuple[int, int]] = deque()
+        self._prefetch_task: Optional[asyncio.Task] = None
+
+        self._connection_lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+
+        self.leased_block_num: int = 0
+        self.allocated_num: int = 0
+
+
+    async def allocate_async(
+        self,
+    )-> int:
+
+        while self._next_id >= self._block_end:
+            if self._pending_blocks:
+                self._next_id, self._block_end = self._pending_blocks.popleft()
+                continue
+            await self._start_prefetch()
+
+        allocated_id = self._next_id
+        self._next_id += 1
+        self.allocated_num += 1
+        self.prefetch()
+        return allocated_id
+
+
+    def prefetch(
+        self,
+    )-> None:
+
+        """
+        本地剩余编号不多时在后台预租下一段；可在确定即将取号时（例如受理请求之初）提前调用，使 allocate_async 不必等待数据库
+        """
+
+        if self._block_end - self._next_id <= self._prefetch_threshold and not self._pending_blocks:
+            self._start_prefetch()
+
+
+    async def get_high_water_mark_async(
+        self,
+    )-> int:
+
+        """
+        所有进程至今租出的最大编号（含尚未使用的编号）；从未租用时为 first_id - 1
+        """
+
+        return await asyncio.to_thread(self._get_high_water_mark)
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, int]:
+
+        return {
+            "allocated": self.allocated_num,
+            "leased_blocks": self.leased_block_num,
+            "local_remaining": max(0, self._block_end - self._next_id)
+                + sum(end - start for start, end in self._pending_blocks),
+        }
+
+
+    def _start_prefetch(
+        self,
+    )-> asyncio.Task:
+
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.create_task(self._prefetch_async())
+        return self._prefetch_task
+
+
+    async def _prefetch_async(
+        self,
+    )-> None:
+
+        block = await asyncio.to_thread(self._lease_block)
+        self._pending_blocks.append(block)
+        self.leased_block_num += 1
+
+
+    def _ensure_connection(
+        self,
+    )-> sqlite3.Connection:
+
+        # fork 出的子进程不能沿用父进程的连接
+        if self._connection is not None and self._connection_pid == os.getpid():
+            return self._connection
+
+        directory = os.path.dirname(self._path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path,
+            timeout = 30.0,
+            isolation_level = None,
+            check_same_thread = False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS id_blocks ("
+            "scope TEXT PRIMARY KEY, "
+            "next_id INTEGER NOT NULL)"
+        )
+        self._connection = connection
+        self._connection_pid = os.getpid()
+        return connection
+
+
+    def _lease_block(
+        self,
+    )-> Tuple[int, int]:
+
+        with self._connection_lock:
+            connection = self._ensure_connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR IGNORE INTO id_blocks (scope, next_id) VALUES (?, ?)",
+                    (self._scope, self._first_id),
+                )
+                block_start, = connection.execute(
+                    "SELECT next_id FROM id_blocks WHERE scope = ?", (self._scope,),
+                ).fetchone()
+                block_end = block_start + self._block_size
+                connection.execute(
+                    "UPDATE id_blocks SET next_id = ? WHERE scope = ?", (block_end, self._scope),
+                )
+                connection.execute("COMMIT")
+                return block_start, block_end
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+
+    def _get_high_water_mark(
+        self,
+    )-> int:
+
+        with self._connection_lock:
+            connection = self._ensure_connection()
+            row = connection.execute(
+                "SELECT next_id FROM id_blocks WHERE scope = ?", (self._scope,),
+            ).fetchone()
+        return (row[0] if row is not None else self._first_id) - 1
@@ -0,0 +1,234 @@
+from .typing import *
+from .externals import *
+from .get_answer_temp import *
+
+
+__all__ = [
+    "count_text_tokens",
+    "ContextWindowManager",
+]
+
+
+# 模型名前缀 -> (每个 CJK 字符的 token 数, 每个其他字符的 token 数)
+# 只用于预算估计，不追求与服务商计费完全一致；未列出的模型用 default
+_token_ratios: Dict[str, Tuple[float, float]] = {
+    "default": (1.0, 0.25),
+    "Qwen": (0.7, 0.25),
+    "GPT": (0.9, 0.25),
+    "Gemini": (0.8, 0.25),
+}
+
+
+_cjk_pattern = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def count_text_tokens(
+    text: str,
+    model: Optional[str] = None,
+)-> int:
+
+    """
+    按模型估算文本的 token 数：中日韩字符与其他字符分开计价
+    """
+
+    cjk_ratio, other_ratio = _token_ratios["default"]
+    if model is not None:
+        for prefix, ratios in _token_ratios.items():
+            if model.startswith(prefix):
+                cjk_ratio, other_ratio = ratios
+                break
+    cjk_num = len(_cjk_pattern.findall(text))
+    return int(cjk_num * cjk_ratio + (len(text) - cjk_num) * other_ratio) + 1
+
+
+class ContextWindowManager:
+
+    """
+    多轮对话的上下文窗口管理，让每轮请求的 token 数与图片数有上界：
+    - 最近 recent_turn_num 轮原文保留，更早的轮次由 summary_model 压缩成摘要
+    - 摘要边界按 summary_chunk_turn_num 轮一档推进，每轮对话最多只新增一次小规模的摘要调用
+    - 摘要按已压缩轮次的内容哈希缓存，同一话题的后续轮次直接复用
+    - 只保留最近 max_image_num 张图片，更早的图片替换为文字说明
+    - 总量仍超过 max_prompt_tokens 时，继续把最早的原文轮次并入摘要
+    history 的格式与 get_answer_async 的多轮 prompt 一致：用户 - 助手 - ... - 用户
+    """
+
+    def __init__(
+        self,
+        model: str,
+        summary_model: Optional[str] = None,
+        max_prompt_tokens: int = 16000,
+        recent_turn_num: int = 6,
+        summary_chunk_turn_num: int = 4,
+        max_image_num: int = 4,
+        image_tokens: int = 1000,
+        max_summary_tokens: int = 1500,
+        summary_cache_size: int = 256,
+    )-> None:
+
+        self._model: str = model
+        self._summary_model: str = summary_model if summary_model is not None else model
+        self._max_prompt_tokens: int = max_prompt_tokens
+        self._recent_turn_num: int = recent_turn_num
+        self._summary_chunk_turn_num: int = max(1, summary_chunk_turn_num)
+        self._max_image_num: int = max_image_num
+        self._image_tokens: int = image_tokens
+        self._max_summary_tokens: int = max_summary_tokens
+
+        # 已压缩轮次的链式哈希 -> 摘要
+        self._summary_cache_size: int = summary_cache_size
+        self._summary_cache: OrderedDict[str, str] = OrderedDict()
+
+        self.summary_calls: int = 0
+        self.summary_cache_hits: int = 0
+
+
+    def drop_old_images(
+        self,
+        prompt_list: Sequence[str],
+        images: Sequence[Any],
+        image_placeholder: str,
+    )-> Tuple[Sequence[str], Sequence[Any]]:
+
+        """
+        只保留最后 max_image_num 张图片，更早的占位符替换为文字说明
+        被丢弃的图片之后不会再发给模型，调用方可以直接用返回值覆盖保存的历史
+        没有图片需要丢弃时原样返回传入的对象，不做复制
+        """
+
+        drop_num = max(0, len(images) - self._max_image_num)
+        if drop_num == 0: return prompt_list, images
+
+        new_prompt_list: List[str] = []
+        remaining_drop_num = drop_num
+        for text in prompt_list:
+            while remaining_drop_num > 0 and image_placeholder in text:
+                text = text.replace(image_placeholder, "[较早的图片已省略]", 1)
+                remaining_drop_num -= 1
+            new_prompt_list.append(text)
+        return new_prompt_list, list(images[drop_num:])
+
+
+    async def build_request_async(
+        self,
+        prompt_list: Sequence[str],
+        images: Sequence[Any],
+        image_placeholder: str,
+    )-> Tuple[List[str], List[Any]]:
+
+        """
+        把完整历史压缩为本轮实际发送的 prompt 列表与图片列表
+        摘要失败时退化为直接截断较早的轮次，不影响本轮回复
+        """
+
+        assert len(prompt_list) % 2 == 1, "history 必须以用户消息结尾"
+        prompt_list, images = self.drop_old_images(prompt_list, images, image_placeholder)
+
+        # turns[i] = (用户消息, 助手回复)，最后一条用户消息单独处理
+        turns: List[Tuple[str, str]] = [
+            (prompt_list[index], prompt_list[index + 1])
+            for index in range(0, len(prompt_list) - 1, 2)
+        ]
+        current_message = prompt_list[-1]
+
+        # 摘要边界按档推进：最近的原文轮次数在 [recent_turn_num, recent_turn_num + chunk) 之间
+        summarized_turn_num = max(0, len(turns) - self._recent_turn_num)
+        summarized_turn_num -= summarized_turn_num % self._summary_chunk_turn_num
+
+        while True:
+            kept_turns = turns[summarized_turn_num:]
+            kept_texts = [text for turn in kept_turns for text in turn] + [current_message]
+            kept_image_num = sum(text.count(image_placeholder) for text in kept_texts)
+            total_tokens = (
+                sum(count_text_tokens(text, self._model) for text in kept_texts)
+                + kept_image_num * self._image_tokens
+                + (self._max_summary_tokens if summarized_turn_num else 0)
+            )
+            if total_tokens <= self._max_prompt_tokens or not kept_turns: break
+            summarized_turn_num += 1
+
+        summary = ""
+        if summarized_turn_num:
+            try:
+                summary = await self._get_summary_async(turns[:summarized_turn_num], image_placeholder)
+            except Exception as error:
+                print(f"[ContextWindowManager] 历史摘要失败，直接截断较早的轮次: {error}")
+                summary = "（更早的对话已省略）"
+
+        kept_prompt_list = [text for turn in turns[summarized_turn_num:] for text in turn] + [current_message]
+        if summary:
+            kept_prompt_list[0] = f"以下是此前对话的摘要：\n{summary}\n\n{kept_prompt_list[0]}"
+        dropped_image_num = sum(
+            text.count(image_placeholder) for turn in turns[:summarized_turn_num] for text in turn
+        )
+        return kept_prompt_list, list(images[dropped_image_num:])
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, Any]:
+
+        return {
+            "summary_calls": self.summary_calls,
+            "summary_cache_hits": self.summary_cache_hits,
+            "summary_cache_size": len(self._summary_cache),
+        }
+
+
+    async def _get_summary_async(
+        self,
+        turns: List[Tuple[str, str]],
+        image_placeholder: str,
+    )-> str:
+
+        # 链式哈希：前 k 轮的 key 只依赖前 k 轮内容，可以找到已缓存的最长前缀，在其基础上增量压缩
+        prefix_keys: List[str] = []
+        chain_hash = ""
+        for user_text, assistant_text in turns:
+            chain_hash = hashlib.sha256(
+                json.dumps([chain_hash, user_text, assistant_text], ensure_ascii=False).encode("UTF-8")
+            ).hexdigest()
+            prefix_keys.append(chain_hash)
+
+        cached_turn_num = 0
+        summary = ""
+        for turn_num in range(len(turns), 0, -1):
+            cached_summary = self._summary_cache.get(prefix_keys[turn_num - 1])
+            if cached_summary is not None:
+                cached_turn_num = turn_num
+                summary = cached_summary
+                self._summary_cache.move_to_end(prefix_keys[turn_num - 1])
+                break
+
+        if cached_turn_num == len(turns):
+            self.summary_cache_hits += 1
+            return summary
+
+        new_turns_text = "\n\n".join(
+            f"用户：{user_text.replace(image_placeholder, '[图片]')}\n助手：{assistant_text}"
+            for user_text, assistant_text in turns[cached_turn_num:]
+        )
+        summary_prompt = (
+            "请把下面的对话压缩成一段简洁的摘要，保留用户的问题、已得到的结论、关键公式与数值，以及尚未解决的事项。"
+            f"摘要不超过 {self._max_summary_tokens // 2} 字，直接输出摘要正文。\n\n"
+            + (f"<previous_summary>\n{summary}\n</previous_summary>\n\n" if summary else "")
+            + f"<new_turns>\n{new_turns_text}\n</new_turns>"
+        )
+        self.summary_calls += 1
+        summary = await get_answer_async(
+            prompt = summary_prompt,
+            model = self._summary_model,
+            temperature = 0.0,
+            max_completion_tokens = self._max_summary_tokens,
+            trial_num = 2,
+            use_cache = True,
+            check_and_accept = lambda response: bool(response.strip()),
+            call_site = "context_window_summary",
+        )
+        summary = summary.strip()
+
+        self._summary_cache[prefix_keys[-1]] = summary
+        self._summary_cache.move_to_end(prefix_keys[-1])
+        while len(self._summary_cache) > self._summary_cache_size:
+            self._summary_cache.popitem(last=False)
+        return summary
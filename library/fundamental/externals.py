@@ -26,6 +26,7 @@ from os.path import sep as seperator
 from ruamel.yaml import YAML as ruamel_yaml
 from concurrent.futures import ThreadPoolExecutor
 from collections import OrderedDict
+from collections import deque
 from pywheels import run_tasks_concurrently
 from pywheels import run_tasks_concurrently_async
 from pywheels.file_tools import get_file_paths
@@ -61,6 +62,7 @@ __all__ = [
     "ruamel_yaml",
     "contextlib",
     "OrderedDict",
+    "deque",
     "normalvariate",
     "ThreadPoolExecutor",
     "get_file_paths",
@@ -1,10 +1,17 @@
 import ast
-from openai import OpenAI, AsyncOpenAI
+import httpx
+import openai
 from threading import Lock
 import aiofiles.os as aiofiles_os
 from openai.types.chat import ChatCompletionMessageFunctionToolCall
 from .typing import *
 from .externals import *
+from .image_tools import *
+from .openai_client_pool import *
+from .model_instance_balancer import *
+from .llm_response_cache import *
+from .provider_request_scheduler import *
+from .structured_output_tools import *
 
 
 """
@@ -18,6 +25,10 @@ __all__ = [
     # "load_api_keys_async",
     "get_answer",
     "get_answer_async",
+    "get_response_cache_stats",
+    "get_provider_scheduler_stats",
+    "get_call_site_stats",
+    "get_prompt_cache_stats",
     # "get_available_models",
     # "get_available_models_async",
 ]
@@ -63,23 +74,22 @@ def _repair_tool_arguments(arg_str: str) -> str:
 translate = lambda text: text
 
 
-def _get_file_type_of_image_bytes(
-    image_bytes: bytes,
-)-> str:
+def _is_provider_error(
+    error: BaseException,
+)-> bool:
     
-    fallback_file_type = "jpeg"
-    if image_bytes.startswith(b'\xFF\xD8\xFF'):
-        return "jpeg"
-    elif image_bytes.startswith(b'\x89PNG'):
-        return "png"
-    elif image_bytes.startswith(b'GIF'):
-        return "gif"
-    else:
-        return fallback_file_type
+    """
+    判断异常是否源自模型服务商（网络、超时、HTTP 错误等），
+    只有这类异常才计入实例的健康统计；参数错误、被取消等不应导致实例被摘除
+    """
+    
+    return isinstance(error, (openai.APIError, httpx.HTTPError, TimeoutError))
 
 
 def _convert_image_to_url(
     image: Any,
+    image_max_edge: Optional[int] = None,
+    image_max_bytes: Optional[int] = None,
 )-> str:
     
     if isinstance(image, str) and \
@@ -109,26 +119,26 @@ def _convert_image_to_url(
             )
         with open(image, "rb") as file_pointer:
             image_bytes = file_pointer.read()
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8") 
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
     elif image_type == "base64":
         assert isinstance(image, str)
         image_bytes = base64.b64decode(image)
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8")
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
     else:
         assert image_type == "bytes"
         assert isinstance(image, bytes)
         image_bytes = image
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8")
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
+    
+    # 缩放、重编码并按内容哈希记忆化，重试时不再重复编码整张原图
+    return prepare_image_data_url(
+        image_bytes = image_bytes,
+        max_edge = image_max_edge,
+        max_bytes = image_max_bytes,
+    )
 
 
 async def _convert_image_to_url_async(
     image: Any,
+    image_max_edge: Optional[int] = None,
+    image_max_bytes: Optional[int] = None,
 )-> str:
     
     if isinstance(image, str) and \
@@ -158,22 +168,20 @@ async def _convert_image_to_url_async(
             )
         async with aiofiles.open(image, "rb") as file_pointer:
             image_bytes = await file_pointer.read()
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8") 
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
     elif image_type == "base64":
         assert isinstance(image, str)
         image_bytes = base64.b64decode(image)
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8")
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
     else:
         assert image_type == "bytes"
         assert isinstance(image, bytes)
         image_bytes = image
-        base64_data = base64.b64encode(image_bytes).decode("UTF-8")
-        file_type = _get_file_type_of_image_bytes(image_bytes)
-        return f"data:image/{file_type};base64,{base64_data}"
+    
+    # 解码、缩放与编码在线程中完成，并按内容哈希记忆化，重试时不再重复编码整张原图
+    return await prepare_image_data_url_async(
+        image_bytes = image_bytes,
+        max_edge = image_max_edge,
+        max_bytes = image_max_bytes,
+    )
 
 
 def _parse_tools(
@@ -263,6 +271,9 @@ def _parse_tools(
             "function": openai_function_def
         })
     
+    # 工具 schema 按名称排序，调用方传入顺序不同时请求前缀也逐字节一致，不破坏服务商的提示词缓存
+    openai_tools_schema.sort(key=lambda tool_schema: tool_schema["function"]["name"])
+    
     return openai_tools_schema, tool_registry
 
 
@@ -280,6 +291,8 @@ def _get_answer_raw(
     timeout: Optional[float],
     tools: List[Dict[str, Any]],
     tool_use_trial_num: int,
+    image_max_edge: Optional[int] = None,
+    image_max_bytes: Optional[int] = None,
 )-> str:
 
     if isinstance(prompt, str):
@@ -309,12 +322,9 @@ def _get_answer_raw(
             ) % (image_placeholder_count, len(images))
         )
     
-    client_optional_params = {}
-    if base_url != "": client_optional_params["base_url"] = base_url
-    if timeout is not None: client_optional_params["timeout"] = timeout
-    client = OpenAI(
+    client = get_openai_client(
         api_key = api_key,
-        **client_optional_params,
+        base_url = base_url,
     )
     
     messages: List[Any] = []
@@ -353,7 +363,11 @@ def _get_answer_raw(
                 content.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": _convert_image_to_url(current_image),
+                        "url": _convert_image_to_url(
+                            image = current_image,
+                            image_max_edge = image_max_edge,
+                            image_max_bytes = image_max_bytes,
+                        ),
                     },
                 })
                 image_index += 1
@@ -366,6 +380,8 @@ def _get_answer_raw(
     if temperature is not None: optional_params["temperature"] = temperature
     if top_p is not None: optional_params["top_p"] = top_p
     if max_completion_tokens is not None: optional_params["max_completion_tokens"] = max_completion_tokens
+    # 池中的客户端不带超时，超时随每次请求传入
+    if timeout is not None: optional_params["timeout"] = timeout
     
     openai_tools_schema, tool_registry = _parse_tools(tools)
     api_tool_params: Dict[str, Any] = {}
@@ -451,11 +467,16 @@ async def _get_answer_raw_async(
     timeout: Optional[float],
     tools: List[Dict[str, Any]],
     tool_use_trial_num: int,
+    image_max_edge: Optional[int] = None,
+    image_max_bytes: Optional[int] = None,
+    tool_call_concurrency: int = 4,
+    scheduler: Optional[ProviderRequestScheduler] = None,
+    response_format: Optional[Dict[str, Any]] = None,
+    structured_output: bool = False,
+    prompt_cache_control: bool = False,
+    usage_recorder: Optional[Callable[[Any], None]] = None,
 )-> str:
     
-    if any(keyword in base_url for keyword in ["yunwu"]):
-        await asyncio.sleep(random.uniform(5.0, 10.0))
-
     if isinstance(prompt, str):
         prompt_list = [prompt]
     elif isinstance(prompt, list):
@@ -483,17 +504,23 @@ async def _get_answer_raw_async(
             ) % (image_placeholder_count, len(images))
         )
     
-    client_optional_params = {}
-    if base_url != "": client_optional_params["base_url"] = base_url
-    if timeout is not None: client_optional_params["timeout"] = timeout
-    
-    client = AsyncOpenAI(
+    client = get_async_openai_client(
         api_key = api_key,
-        **client_optional_params,
+        base_url = base_url,
     )
     
     messages: List[Any] = []
-    if system_prompt is not None:
+    if system_prompt is not None and prompt_cache_control:
+        # 显式标记可缓存的静态前缀（Anthropic 风格 cache_control），OpenAI 风格的自动前缀缓存无需标记
+        messages.append({
+            "role": "system", 
+            "content": [{
+                "type": "text",
+                "text": system_prompt,
+                "cache_control": {"type": "ephemeral"},
+            }],
+        })
+    elif system_prompt is not None:
         messages.append({
             "role": "system", 
             "content": system_prompt
@@ -530,7 +557,11 @@ async def _get_answer_raw_async(
                 content.append({
                     "type": "image_url",
                     "image_url": {
-                        "url": await _convert_image_to_url_async(current_image),
+                        "url": await _convert_image_to_url_async(
+                            image = current_image,
+                            image_max_edge = image_max_edge,
+                            image_max_bytes = image_max_bytes,
+                        ),
                     },
                 })
                 image_index += 1
@@ -543,6 +574,10 @@ async def _get_answer_raw_async(
     if temperature is not None: optional_params["temperature"] = temperature
     if top_p is not None: optional_params["top_p"] = top_p
     if max_completion_tokens is not None: optional_params["max_completion_tokens"] = max_completion_tokens
+    # 池中的客户端不带超时，超时随每次请求传入
+    if timeout is not None: optional_params["timeout"] = timeout
+    # 仅对声明支持结构化输出的实例下发 response_format，其余实例靠调用方的本地 schema 校验兜底
+    if response_format is not None and structured_output: optional_params["response_format"] = response_format
     
     openai_tools_schema, tool_registry = _parse_tools(tools)
     api_tool_params: Dict[str, Any] = {}
@@ -550,15 +585,31 @@ async def _get_answer_raw_async(
         api_tool_params["tools"] = openai_tools_schema
         api_tool_params["tool_choice"] = "auto"
 
+    estimated_tokens = estimate_request_tokens(
+        prompt = prompt,
+        system_prompt = system_prompt,
+        image_num = len(images),
+        max_completion_tokens = max_completion_tokens,
+    )
+
     full_response_content = ""
     for _ in range(tool_use_trial_num):
-        response = await client.chat.completions.create(
-            model = model,
-            messages = messages,
-            stream = False,
-            **optional_params,
-            **api_tool_params,
-        )
+        # 按服务商的 RPM / TPM / 并发上限排队，容量允许时立即发出
+        async with (
+            scheduler.reserve(estimated_tokens) if scheduler is not None 
+            else contextlib.nullcontext()
+        ) as scheduler_ticket:
+            response = await client.chat.completions.create(
+                model = model,
+                messages = messages,
+                stream = False,
+                **optional_params,
+                **api_tool_params,
+            )
+            if scheduler_ticket is not None and getattr(response, "usage", None) is not None:
+                scheduler_ticket.actual_tokens = response.usage.total_tokens # type: ignore
+        if usage_recorder is not None and getattr(response, "usage", None) is not None:
+            usage_recorder(response.usage) # type: ignore
         if isinstance(response, str): return response
         response_message = response.choices[0].message
         if response_message.content:
@@ -574,44 +625,58 @@ async def _get_answer_raw_async(
             return full_response_content
         else:
             assert response_message.tool_calls is not None
-            for tool_call in response_message.tool_calls:
+            tool_calls = list(response_message.tool_calls)
+            for tool_call in tool_calls:
                 assert isinstance(tool_call, ChatCompletionMessageFunctionToolCall)
-                function_name = tool_call.function.name
-                function_args_str = tool_call.function.arguments
-                function_args_str = _repair_tool_arguments(function_args_str)
-                if function_name not in tool_registry:
+                if tool_call.function.name not in tool_registry:
                     raise NameError(
                         translate(
                             "'tool_registry' 中未找到名为 '%s' 的工具！"
-                        ) % (function_name)
+                        ) % (tool_call.function.name)
                     )
+            
+            # 同一轮的多个工具调用彼此独立，并发执行；结果仍按 tool_calls 原顺序追加
+            tool_call_semaphore = asyncio.Semaphore(max(1, tool_call_concurrency))
+            
+            async def execute_tool_call(
+                tool_call: ChatCompletionMessageFunctionToolCall,
+            )-> str:
+                
+                function_name = tool_call.function.name
+                function_args_str = _repair_tool_arguments(tool_call.function.arguments)
                 function_to_call = tool_registry[function_name]
-                try:
-                    function_args = json.loads(function_args_str)
-                    
-                    if asyncio.iscoroutinefunction(function_to_call):
-                        function_response = await function_to_call(**function_args)
-                    else:
-                        function_response = await asyncio.to_thread(
-                            function_to_call, 
-                            **function_args
-                        )
+                async with tool_call_semaphore:
+                    try:
+                        function_args = json.loads(function_args_str)
                         
-                    if not isinstance(function_response, str):
-                        function_response_str = json.dumps(
-                            function_response, 
-                            ensure_ascii=False,
-                        )
-                    else:
-                        function_response_str = function_response
-                except Exception as e:
-                    function_response_str = translate(
-                        "工具 '%s' 执行失败: %s"
-                    ) % (function_name, str(e))
+                        if asyncio.iscoroutinefunction(function_to_call):
+                            function_response = await function_to_call(**function_args)
+                        else:
+                            function_response = await asyncio.to_thread(
+                                function_to_call, 
+                                **function_args
+                            )
+                            
+                        if not isinstance(function_response, str):
+                            return json.dumps(
+                                function_response, 
+                                ensure_ascii=False,
+                            )
+                        return function_response
+                    except Exception as e:
+                        return translate(
+                            "工具 '%s' 执行失败: %s"
+                        ) % (function_name, str(e))
+            
+            function_response_strs = await asyncio.gather(*[
+                execute_tool_call(tool_call) # type: ignore
+                for tool_call in tool_calls
+            ])
+            for tool_call, function_response_str in zip(tool_calls, function_response_strs):
                 messages.append({
                     "role": "tool",
                     "tool_call_id": tool_call.id,
-                    "name": function_name,
+                    "name": tool_call.function.name, # type: ignore
                     "content": function_response_str,
                 })
             continue
@@ -619,6 +684,17 @@ async def _get_answer_raw_async(
     return full_response_content + f"\n最大工具调用次数 {tool_use_trial_num} 已达到，至此截断。"
 
 
+default_repair_prompt = (
+    "Your previous reply could not be parsed by the program. "
+    "Output the same content again, strictly in the required output format, "
+    "without any other text."
+)
+
+
+provider_limits_key = "__provider_limits__"
+fallback_chains_key = "__fallback_chains__"
+
+
 class ModelManager:
     
     def __init__(self):
@@ -629,6 +705,26 @@ class ModelManager:
         self._online_models_lock: Lock = Lock()
         self._online_models_lock_async: asyncio.Lock = asyncio.Lock()
         
+        # 调用点 -> 各项计数，用于比较不同调用点的重试与拒收率
+        self._call_site_stats: Dict[str, Dict[str, int]] = {}
+        
+        # 模型 -> 请求数、输入 token 数与服务商报告的缓存命中 token 数，用于观察提示词缓存的效果
+        self._prompt_cache_stats: Dict[str, Dict[str, int]] = {}
+        
+        # 模型 -> 备用模型链，由 api_keys.json 中的保留键 __fallback_chains__ 配置
+        self._fallback_chains: Dict[str, List[str]] = {}
+        
+        # 按 base_url 的请求调度器，由 api_keys.json 中的保留键 __provider_limits__ 配置
+        # scope 为 "host_wide" 时本机所有进程共享限额；per_api_key 为 true 时每个 api_key 单独计算限额
+        self._provider_limits: Dict[str, Dict[str, Any]] = {}
+        self._provider_schedulers: Dict[Tuple[str, str], ProviderRequestScheduler] = {}
+        self._provider_schedulers_lock: Lock = Lock()
+        self._provider_coordination_path: str = f"WorkingTable{seperator}local_storage{seperator}provider_limits.sqlite"
+        
+        # 回复缓存按需创建，只有 use_cache=True 的调用才会触发建库
+        self._response_cache_path: str = f"WorkingTable{seperator}local_storage{seperator}llm_response_cache.sqlite"
+        self._response_cache: Optional[LLMResponseCache] = None
+        
     
     def load_api_keys(
         self, 
@@ -697,27 +793,39 @@ class ModelManager:
             raise ValueError(
                 translate("[get_answer 报错] 模型 %s 未被记录！") % (model)
             )
-            
-        api_key, base_url, model = self._get_online_model_instance(model)
         
+        model_name = model
         last_error = None
         for trial in range(trial_num):
             try:
-                response = _get_answer_raw(
-                    prompt = prompt,
-                    model = model,
-                    api_key = api_key,
-                    base_url = base_url,
-                    system_prompt = system_prompt,
-                    images = images,
-                    image_placeholder = image_placeholder,
-                    temperature = temperature,
-                    top_p = top_p,
-                    max_completion_tokens = max_completion_tokens,
-                    timeout = timeout,
-                    tools = tools,
-                    tool_use_trial_num = tool_use_trial_num,
-                )
+                # 每次尝试都重新选实例，失败的实例不会拖住后续重试
+                instance_index, api_key, base_url, model = self._get_online_model_instance(model_name)
+                request_start_time = time.monotonic()
+                try:
+                    response = _get_answer_raw(
+                        prompt = prompt,
+                        model = model,
+                        api_key = api_key,
+                        base_url = base_url,
+                        system_prompt = system_prompt,
+                        images = images,
+                        image_placeholder = image_placeholder,
+                        temperature = temperature,
+                        top_p = top_p,
+                        max_completion_tokens = max_completion_tokens,
+                        timeout = timeout,
+                        tools = tools,
+                        tool_use_trial_num = tool_use_trial_num,
+                        **self._get_image_limits(model_name, instance_index),
+                    )
+                except BaseException as error:
+                    self._report_instance_result(
+                        model_name, instance_index, 
+                        time.monotonic() - request_start_time if _is_provider_error(error) else None, 
+                        False,
+                    )
+                    raise
+                self._report_instance_result(model_name, instance_index, time.monotonic() - request_start_time, True)
                 if not check_and_accept(response):
                     last_error = translate(
                         "模型 %s 的回复未通过 check_and_accept 函数的验收！"
@@ -762,61 +870,407 @@ class ModelManager:
         check_and_accept: Callable[[str], bool] = lambda _: True,
         tools: List[Dict[str, Any]] = [],
         tool_use_trial_num: int = 10,
+        hedging_percentile: Optional[float] = None,
+        hedging_max_extra_cost_ratio: float = 0.1,
+        use_cache: bool = False,
+        tool_call_concurrency: int = 4,
+        deadline: Optional[float] = None,
+        fallback_models: Optional[List[str]] = None,
+        switch_model_after_failures: int = 3,
+        repair_functions: List[Callable[[str], str]] = [],
+        repair_trial_num: int = 0,
+        repair_prompt_builder: Callable[[str], str] = lambda _: default_repair_prompt,
+        response_schema: Optional[Dict[str, Any]] = None,
+        call_site: Optional[str] = None,
     )-> str:
         
+        """
+        hedging_percentile: 开启对冲请求（默认关闭）。若主请求在该模型近期延迟的此分位数 (0~1) 内仍未返回，
+            就向另一个实例发出相同请求，先通过 check_and_accept 的结果胜出，另一个被取消
+        hedging_max_extra_cost_ratio: 对冲预算，对冲请求数最多占主请求数的这一比例
+        use_cache: 开启落盘回复缓存（默认关闭），仅适用于 temperature 0 等确定性调用
+            key 覆盖模型、消息、图片、工具 schema 与采样参数；命中时仍会跑一遍 check_and_accept，
+            只有通过验收的回复才会写入缓存
+        tool_call_concurrency: 同一轮多个工具调用的并发上限
+        deadline: 整次调用（含所有重试与间隔）的总时限，单位秒；每次尝试的 timeout 与重试间隔都会被裁剪到剩余时间内
+        fallback_models: 备用模型链；缺省时使用 api_keys.json 中 __fallback_chains__ 为该模型配置的链
+        switch_model_after_failures: 当前模型连续失败（报错或未通过验收）多少次后切换到链上的下一个模型
+        repair_functions: 回复未通过验收时，先依次尝试的本地修复函数（见 response_repair_tools），不发起新请求
+        repair_trial_num: 本地修复无效时，追加多少轮简短的追问让模型只修正格式，而不是从头重新生成
+        repair_prompt_builder: 由被拒收的回复构造追问内容，调用方可在其中引用解析错误
+        response_schema: 回复应满足的 JSON Schema。支持结构化输出的实例会收到 json_schema 的 response_format，
+            其余实例的回复先在本地宽松解析并按 schema 校验；通过后以规范化的 JSON 文本交给 check_and_accept
+        call_site: 调用点标签，用于按调用点统计尝试、拒收、修复与缓存命中次数（见 get_call_site_stats）
+        """
+        
         if not self._is_online_model[model]:
             raise ValueError(
                 translate("[get_answer 报错] 模型 %s 未被记录！") % (model)
             )
-            
-        api_key, base_url, model = await self._get_online_model_instance_async(model)
+        
+        model_name = model
+        call_site_label = call_site if call_site is not None else f"<{model_name}>"
+        self._record_call_site(call_site_label, "calls")
+        
+        accept_response = check_and_accept
+        if response_schema is not None:
+            def schema_check_and_accept(
+                response: str,
+            )-> bool:
+                try:
+                    structured_response = parse_json_response(response)
+                except ValueError as error:
+                    print(f"[get_answer] {call_site_label} 的回复无法解析为 JSON：{error}")
+                    return False
+                schema_errors = validate_json_schema(structured_response, response_schema)
+                if schema_errors:
+                    print(f"[get_answer] {call_site_label} 的回复未通过 schema 校验：{'; '.join(schema_errors)}")
+                    return False
+                return check_and_accept(json.dumps(structured_response, ensure_ascii=False))
+            accept_response = schema_check_and_accept
+        
+        raw_arguments: Dict[str, Any] = {
+            "prompt": prompt,
+            "system_prompt": system_prompt,
+            "images": images,
+            "image_placeholder": image_placeholder,
+            "temperature": temperature,
+            "top_p": top_p,
+            "max_completion_tokens": max_completion_tokens,
+            "timeout": timeout,
+            "tools": tools,
+            "tool_use_trial_num": tool_use_trial_num,
+            "tool_call_concurrency": tool_call_concurrency,
+            "response_format": build_json_schema_response_format(
+                schema = response_schema,
+                name = re.sub(r"[^a-zA-Z0-9_-]", "_", call_site or "response"),
+            ) if response_schema is not None else None,
+        }
+        
+        response_cache: Optional[LLMResponseCache] = None
+        cache_key: Optional[str] = None
+        if use_cache:
+            cached_response: Optional[str] = None
+            try:
+                response_cache = self.get_response_cache()
+                cache_key = await asyncio.to_thread(
+                    LLMResponseCache.make_key, model_name, raw_arguments,
+                )
+                cached_response = await response_cache.get_async(cache_key)
+            except Exception as error:
+                print(f"[get_answer] 回复缓存读取失败，退回直接请求：{error}")
+                response_cache = None
+            # check_and_accept 往往带有解析结果的副作用，命中缓存时也必须调用
+            if cached_response is not None and accept_response(cached_response):
+                self._record_call_site(call_site_label, "cache_hits")
+                self._record_call_site(call_site_label, "successes")
+                return cached_response
+        
+        model_chain = self._get_model_chain(model_name, fallback_models)
+        chain_position = 0
+        consecutive_failures = 0
+        deadline_at = time.monotonic() + deadline if deadline is not None else None
         
         last_error = None
         for trial in range(trial_num):
+            current_model_name = model_chain[chain_position]
+            attempt_arguments = raw_arguments
+            remaining_seconds: Optional[float] = None
+            if deadline_at is not None:
+                remaining_seconds = deadline_at - time.monotonic()
+                if remaining_seconds <= 0:
+                    last_error = translate(
+                        "已超过调用总时限 %.0f s，放弃剩余尝试！上一次失败原因：%s"
+                    ) % (deadline, last_error)
+                    break
+                attempt_arguments = {
+                    **raw_arguments,
+                    "timeout": remaining_seconds if timeout is None else min(timeout, remaining_seconds),
+                }
+            self._record_call_site(call_site_label, "attempts")
             try:
-                response = await _get_answer_raw_async(
-                    prompt = prompt,
-                    model = model,
-                    api_key = api_key,
-                    base_url = base_url,
-                    system_prompt = system_prompt,
-                    images = images,
-                    image_placeholder = image_placeholder,
-                    temperature = temperature,
-                    top_p = top_p,
-                    max_completion_tokens = max_completion_tokens,
-                    timeout = timeout,
-                    tools = tools,
-                    tool_use_trial_num = tool_use_trial_num,
+                response, accepted = await asyncio.wait_for(
+                    self._attempt_async(
+                        model_name = current_model_name,
+                        raw_arguments = attempt_arguments,
+                        check_and_accept = accept_response,
+                        hedging_percentile = hedging_percentile,
+                        hedging_max_extra_cost_ratio = hedging_max_extra_cost_ratio,
+                    ),
+                    timeout = remaining_seconds,
                 )
-                if not check_and_accept(response):
-                    last_error = translate(
-                        "模型 %s 的回复未通过 check_and_accept 函数的验收！"
-                    ) % (model)
-                    await asyncio.sleep(
-                        max(
-                            0, normalvariate(trial_interval, trial_interval / 3)
-                        )
+                if not accepted: self._record_call_site(call_site_label, "rejections")
+                if not accepted and (repair_functions or repair_trial_num > 0):
+                    repaired_response = await asyncio.wait_for(
+                        self._repair_async(
+                            model_name = current_model_name,
+                            raw_arguments = attempt_arguments,
+                            rejected_response = response,
+                            check_and_accept = accept_response,
+                            repair_functions = repair_functions,
+                            repair_trial_num = repair_trial_num,
+                            repair_prompt_builder = repair_prompt_builder,
+                            call_site_label = call_site_label,
+                        ),
+                        timeout = deadline_at - time.monotonic() if deadline_at is not None else None,
                     )
-                    continue
-                return response
+                    if repaired_response is not None:
+                        response, accepted = repaired_response, True
+                if accepted:
+                    # 备用模型的回复不写入原模型的缓存
+                    if response_cache is not None and cache_key is not None and current_model_name == model_name:
+                        try:
+                            await response_cache.put_async(cache_key, response)
+                        except Exception as error:
+                            print(f"[get_answer] 回复缓存写入失败：{error}")
+                    self._record_call_site(call_site_label, "successes")
+                    return response
+                last_error = translate(
+                    "模型 %s 的回复未通过 check_and_accept 函数的验收！"
+                ) % (current_model_name)
             except Exception as error:
-                last_error = str(error)
-                if trial != trial_num - 1:
-                    await asyncio.sleep(
-                        max(
-                            0, normalvariate(trial_interval, trial_interval / 3)
-                        )
-                    )
-                continue
+                self._record_call_site(call_site_label, "errors")
+                # 总时限触发的 TimeoutError 没有消息文本
+                last_error = str(error) or repr(error)
+            
+            consecutive_failures += 1
+            if consecutive_failures >= switch_model_after_failures and chain_position < len(model_chain) - 1:
+                chain_position += 1
+                consecutive_failures = 0
+                print(
+                    f"[get_answer] 模型 {current_model_name} 连续失败 {switch_model_after_failures} 次，"
+                    f"切换到备用模型 {model_chain[chain_position]}"
+                )
             
+            if trial != trial_num - 1:
+                sleep_seconds = max(
+                    0, normalvariate(trial_interval, trial_interval / 3)
+                )
+                if deadline_at is not None:
+                    sleep_seconds = min(sleep_seconds, max(0.0, deadline_at - time.monotonic()))
+                await asyncio.sleep(sleep_seconds)
+        
+        self._record_call_site(call_site_label, "failures")
         raise RuntimeError(
             translate(
                 f"[get_answer 报错] 所有尝试均失败！最后一次尝试的失败原因：%s\n调用栈：\n{traceback.format_exc()}"
             ) % (last_error)
         )
+    
+    
+    async def _attempt_async(
+        self,
+        model_name: str,
+        raw_arguments: Dict[str, Any],
+        check_and_accept: Callable[[str], bool],
+        hedging_percentile: Optional[float],
+        hedging_max_extra_cost_ratio: float,
+    )-> Tuple[str, bool]:
+        
+        """
+        一次尝试：返回 (回复, 是否通过 check_and_accept)；所有请求均失败时抛出最后一个异常
+        开启对冲时，主请求超过延迟分位数仍未返回，则在预算内向另一个实例补发一次
+        """
+        
+        balancer: ModelInstanceBalancer = self._online_models[model_name]["balancer"]
+        
+        primary_instance_index, primary_task = await self._start_instance_call_async(
+            model_name = model_name,
+            raw_arguments = raw_arguments,
+        )
+        pending_tasks = {primary_task}
+        
+        hedging_delay: Optional[float] = None
+        if hedging_percentile is not None and balancer.instance_num > 1:
+            hedging_delay = balancer.latency_percentile(hedging_percentile)
+        
+        try:
+            if hedging_delay is not None:
+                done_tasks, _ = await asyncio.wait(pending_tasks, timeout=hedging_delay)
+                if not done_tasks and balancer.try_spend_hedge(hedging_max_extra_cost_ratio):
+                    hedge_instance_index, hedge_task = await self._start_instance_call_async(
+                        model_name = model_name,
+                        raw_arguments = raw_arguments,
+                        exclude = (primary_instance_index,),
+                        is_hedge = True,
+                    )
+                    pending_tasks.add(hedge_task)
+                    print(
+                        f"[get_answer] 模型 {model_name} 主请求超过 {hedging_delay:.1f} s 未返回，"
+                        f"向实例 {hedge_instance_index} 发出对冲请求"
+                    )
             
+            rejected_response: Optional[str] = None
+            last_exception: Optional[BaseException] = None
+            while pending_tasks:
+                done_tasks, pending_tasks = await asyncio.wait(
+                    pending_tasks, 
+                    return_when = asyncio.FIRST_COMPLETED,
+                )
+                for task in done_tasks:
+                    if task.exception() is not None:
+                        last_exception = task.exception()
+                        continue
+                    response = task.result()
+                    if check_and_accept(response):
+                        return response, True
+                    rejected_response = response
             
+            if rejected_response is not None:
+                return rejected_response, False
+            assert last_exception is not None
+            raise last_exception
+        
+        finally:
+            for task in pending_tasks:
+                task.cancel()
+    
+    
+    async def _repair_async(
+        self,
+        model_name: str,
+        raw_arguments: Dict[str, Any],
+        rejected_response: str,
+        check_and_accept: Callable[[str], bool],
+        repair_functions: List[Callable[[str], str]],
+        repair_trial_num: int,
+        repair_prompt_builder: Callable[[str], str],
+        call_site_label: str,
+    )-> Optional[str]:
+        
+        """
+        被拒收回复的修复：先做本地修复，再在原对话后追问，让模型只修正输出格式
+        修复成功返回通过 check_and_accept 的回复，否则返回 None
+        """
+        
+        def try_local_repairs(
+            response: str,
+        )-> Optional[str]:
+            for repair_function in repair_functions:
+                try:
+                    repaired_response = repair_function(response)
+                except Exception as error:
+                    print(f"[get_answer] 本地修复函数出错：{error}")
+                    continue
+                if repaired_response != response and check_and_accept(repaired_response):
+                    return repaired_response
+            return None
+        
+        repaired_response = try_local_repairs(rejected_response)
+        if repaired_response is not None:
+            self._record_call_site(call_site_label, "local_repairs")
+            return repaired_response
+        
+        prompt = raw_arguments["prompt"]
+        conversation = [prompt] if isinstance(prompt, str) else list(prompt)
+        for _ in range(repair_trial_num):
+            # 助手消息中不允许出现图片占位符，此时无法把被拒收的回复放回对话
+            if raw_arguments["image_placeholder"] in rejected_response: return None
+            conversation = conversation + [rejected_response, repair_prompt_builder(rejected_response)]
+            response, accepted = await self._attempt_async(
+                model_name = model_name,
+                raw_arguments = {**raw_arguments, "prompt": conversation},
+                check_and_accept = check_and_accept,
+                hedging_percentile = None,
+                hedging_max_extra_cost_ratio = 0.0,
+            )
+            self._record_call_site(call_site_label, "followup_repairs")
+            if accepted: return response
+            repaired_response = try_local_repairs(response)
+            if repaired_response is not None: return repaired_response
+            rejected_response = response
+        
+        return None
+    
+    
+    async def _start_instance_call_async(
+        self,
+        model_name: str,
+        raw_arguments: Dict[str, Any],
+        exclude: Tuple[int, ...] = (),
+        is_hedge: bool = False,
+    )-> Tuple[int, asyncio.Task]:
+        
+        """
+        选取实例（计入负载均衡的在途计数）并在后台任务中调用它，返回 (实例编号, 任务)
+        在途计数总由任务归还：开始执行后由 _call_instance_async 归还；开始执行前就被取消时由完成回调归还
+        """
+        
+        async with self._online_models_lock_async:
+            instance = self._get_model_instance_logic(
+                model_name,
+                exclude = exclude,
+                is_hedge = is_hedge,
+            )
+            # acquire 与创建任务之间没有挂起点，取消要么发生在 acquire 之前，要么由任务负责归还
+            call_state = {"started": False}
+            task = asyncio.create_task(
+                self._call_instance_async(model_name, instance, raw_arguments, call_state)
+            )
+        
+        def release_if_never_started(
+            _: asyncio.Task,
+        )-> None:
+            if not call_state["started"]:
+                self._report_instance_result(model_name, instance[0], None, False)
+        
+        task.add_done_callback(release_if_never_started)
+        return instance[0], task
+    
+    
+    async def _call_instance_async(
+        self,
+        model_name: str,
+        instance: Tuple[int, str, str, str],
+        raw_arguments: Dict[str, Any],
+        call_state: Dict[str, bool],
+    )-> str:
+        
+        call_state["started"] = True
+        
+        instance_index, api_key, base_url, model = instance
+        request_start_time = time.monotonic()
+        try:
+            response = await _get_answer_raw_async(
+                model = model,
+                api_key = api_key,
+                base_url = base_url,
+                **raw_arguments,
+                **self._get_image_limits(model_name, instance_index),
+                scheduler = self._get_provider_scheduler(base_url, api_key),
+                structured_output = self._online_models[model_name]["instances"][instance_index]["structured_output"],
+                prompt_cache_control = self._online_models[model_name]["instances"][instance_index]["prompt_cache_control"],
+                usage_recorder = lambda usage: self._record_prompt_cache_usage(model_name, usage),
+            )
+        except BaseException as error:
+            self._report_instance_result(
+                model_name, instance_index, 
+                time.monotonic() - request_start_time if _is_provider_error(error) else None, 
+                False,
+            )
+            raise
+        self._report_instance_result(model_name, instance_index, time.monotonic() - request_start_time, True)
+        return response
+            
+            
+    def _get_model_chain(
+        self,
+        model_name: str,
+        fallback_models: Optional[List[str]],
+    )-> List[str]:
+        
+        if fallback_models is None:
+            fallback_models = self._fallback_chains.get(model_name, [])
+        model_chain: List[str] = [model_name]
+        for fallback_model in fallback_models:
+            if fallback_model in model_chain: continue
+            if not self._is_online_model.get(fallback_model, False):
+                print(f"[get_answer] 备用模型 {fallback_model} 未被记录，已跳过")
+                continue
+            model_chain.append(fallback_model)
+        return model_chain
+    
+    
     def get_available_models(
         self,
     )-> List[str]:
@@ -833,12 +1287,122 @@ class ModelManager:
             return [str(model) for model in self._online_models]
     
 
+    def get_response_cache(
+        self,
+    )-> LLMResponseCache:
+        
+        if self._response_cache is None:
+            self._response_cache = LLMResponseCache(self._response_cache_path)
+        return self._response_cache
+    
+    
+    def set_response_cache_path(
+        self,
+        response_cache_path: str,
+    )-> None:
+        
+        self._response_cache_path = response_cache_path
+        self._response_cache = None
+    
+
+    def get_call_site_stats(
+        self,
+    )-> Dict[str, Dict[str, Any]]:
+        
+        stats: Dict[str, Dict[str, Any]] = {}
+        for call_site_label, counters in self._call_site_stats.items():
+            calls = counters.get("calls", 0)
+            attempts = counters.get("attempts", 0)
+            stats[call_site_label] = {
+                **counters,
+                "attempts_per_call": attempts / calls if calls else 0.0,
+                "rejection_rate": counters.get("rejections", 0) / attempts if attempts else 0.0,
+            }
+        return stats
+    
+    
+    def _record_call_site(
+        self,
+        call_site_label: str,
+        counter_name: str,
+    )-> None:
+        
+        counters = self._call_site_stats.setdefault(call_site_label, {})
+        counters[counter_name] = counters.get(counter_name, 0) + 1
+    
+    
+    def get_prompt_cache_stats(
+        self,
+    )-> Dict[str, Dict[str, Any]]:
+        
+        stats: Dict[str, Dict[str, Any]] = {}
+        for model_name, counters in self._prompt_cache_stats.items():
+            prompt_tokens = counters["prompt_tokens"]
+            stats[model_name] = {
+                **counters,
+                "cached_token_rate": counters["cached_tokens"] / prompt_tokens if prompt_tokens else 0.0,
+            }
+        return stats
+    
+    
+    def _record_prompt_cache_usage(
+        self,
+        model_name: str,
+        usage: Any,
+    )-> None:
+        
+        # OpenAI 兼容接口报告在 prompt_tokens_details.cached_tokens，部分 Anthropic 中转报告在 cache_read_input_tokens
+        prompt_tokens_details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(prompt_tokens_details, "cached_tokens", None) if prompt_tokens_details is not None else None
+        if cached_tokens is None:
+            cached_tokens = getattr(usage, "cache_read_input_tokens", None)
+        counters = self._prompt_cache_stats.setdefault(
+            model_name, {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0},
+        )
+        counters["requests"] += 1
+        counters["prompt_tokens"] += getattr(usage, "prompt_tokens", None) or 0
+        counters["cached_tokens"] += cached_tokens or 0
+    
+    
+    def get_provider_scheduler_stats(
+        self,
+    )-> Dict[str, Dict[str, Any]]:
+        
+        with self._provider_schedulers_lock:
+            schedulers = list(self._provider_schedulers.items())
+        return {
+            base_url if not api_key_digest else f"{base_url} [{api_key_digest}]": scheduler.get_stats()
+            for (base_url, api_key_digest), scheduler in schedulers
+        }
+    
+
+    def get_instance_stats(
+        self,
+        model_name: str,
+    )-> List[Dict[str, Any]]:
+        
+        balancer: ModelInstanceBalancer = self._online_models[model_name]["balancer"]
+        stats = balancer.get_stats()
+        for instance_stats in stats:
+            instance = self._online_models[model_name]["instances"][instance_stats["index"]]
+            instance_stats["base_url"] = instance["base_url"]
+            instance_stats["model"] = instance["model"]
+        return stats
+    
+
     def _load_keys_to_memory(
         self,
         api_keys_dict: Dict[str, Any],
     )-> None:
         
+        provider_limits: Dict[str, Dict[str, Any]] = api_keys_dict.get(provider_limits_key, {})
+        with self._provider_schedulers_lock:
+            self._provider_limits = provider_limits
+            self._provider_schedulers = {}
+        self._fallback_chains = api_keys_dict.get(fallback_chains_key, {})
+        
         for model_name in api_keys_dict:
+            if model_name.startswith("__"): continue
             self._is_online_model[model_name] = True
             self._online_models[model_name] = {
                 "instances": [
@@ -846,35 +1410,49 @@ class ModelManager:
                         "api_key": api_keys_dict[model_name][index]["api_key"],
                         "base_url": api_keys_dict[model_name][index]["base_url"],
                         "model": api_keys_dict[model_name][index]["model"],
+                        # 可选：该实例可接受的图片最长边与单张字节上限，缺省时用 image_tools 的默认值
+                        "image_max_edge": api_keys_dict[model_name][index].get("image_max_edge"),
+                        "image_max_bytes": api_keys_dict[model_name][index].get("image_max_bytes"),
+                        # 可选：该实例是否支持 response_format 的 json_schema 结构化输出
+                        "structured_output": api_keys_dict[model_name][index].get("structured_output", False),
+                        # 可选：是否给 system_prompt 加 cache_control 标记（需服务商支持显式提示词缓存）
+                        "prompt_cache_control": api_keys_dict[model_name][index].get("prompt_cache_control", False),
                     }
                     for index in range(len(api_keys_dict[model_name]))
                 ],
-                "next_choice_index": 0,
+                "balancer": ModelInstanceBalancer(
+                    instance_num = len(api_keys_dict[model_name]),
+                ),
             }
 
     
     def _get_model_instance_logic(
         self,
         model_name: str,
-    )-> Tuple[str, str, str]:
+        exclude: Tuple[int, ...] = (),
+        is_hedge: bool = False,
+    )-> Tuple[int, str, str, str]:
         
         online_model = self._online_models[model_name]
-        
-        index_backup = online_model["next_choice_index"]
-        self._online_models[model_name]["next_choice_index"] = \
-            (online_model["next_choice_index"]+1) % len(online_model["instances"])
+        balancer: ModelInstanceBalancer = online_model["balancer"]
+        instance_index = balancer.acquire(
+            exclude = exclude,
+            is_hedge = is_hedge,
+        )
+        instance = online_model["instances"][instance_index]
         
         return (
-            online_model["instances"][index_backup]["api_key"],
-            online_model["instances"][index_backup]["base_url"],
-            online_model["instances"][index_backup]["model"],
+            instance_index,
+            instance["api_key"],
+            instance["base_url"],
+            instance["model"],
         )
 
 
     def _get_online_model_instance(
         self,
         model_name: str,
-    )-> Tuple[str, str, str]:
+    )-> Tuple[int, str, str, str]:
         
         with self._online_models_lock:
             return self._get_model_instance_logic(model_name)
@@ -883,10 +1461,83 @@ class ModelManager:
     async def _get_online_model_instance_async(
         self,
         model_name: str,
-    )-> Tuple[str, str, str]:
+        exclude: Tuple[int, ...] = (),
+        is_hedge: bool = False,
+    )-> Tuple[int, str, str, str]:
         
         async with self._online_models_lock_async:
-            return self._get_model_instance_logic(model_name)
+            return self._get_model_instance_logic(
+                model_name,
+                exclude = exclude,
+                is_hedge = is_hedge,
+            )
+    
+    
+    def _get_provider_scheduler(
+        self,
+        base_url: str,
+        api_key: str,
+    )-> Optional[ProviderRequestScheduler]:
+        
+        limits = self._provider_limits.get(base_url)
+        if limits is None: return None
+        
+        # 日志与 SQLite 中只出现 api_key 的摘要
+        api_key_digest = hashlib.sha256(api_key.encode("UTF-8")).hexdigest()[:12] \
+            if limits.get("per_api_key", False) else ""
+        scheduler_key = (base_url, api_key_digest)
+        with self._provider_schedulers_lock:
+            scheduler = self._provider_schedulers.get(scheduler_key)
+            if scheduler is not None: return scheduler
+            scope = limits.get("scope", "process")
+            if scope == "host_wide":
+                scheduler = HostWideRequestScheduler.from_config(
+                    limits,
+                    path = self._provider_coordination_path,
+                    scope = f"{base_url}|{api_key_digest}",
+                )
+            elif scope == "process":
+                scheduler = ProviderRequestScheduler.from_config(limits)
+            else:
+                raise ValueError(
+                    translate("[get_answer 报错] %s 的限流 scope 应为 process 或 host_wide，不应为 %s ！")
+                    % (base_url, scope)
+                )
+            self._provider_schedulers[scheduler_key] = scheduler
+            return scheduler
+    
+    
+    def _get_image_limits(
+        self,
+        model_name: str,
+        instance_index: int,
+    )-> Dict[str, Any]:
+        
+        instance = self._online_models[model_name]["instances"][instance_index]
+        return {
+            "image_max_edge": instance["image_max_edge"],
+            "image_max_bytes": instance["image_max_bytes"],
+        }
+    
+    
+    def _report_instance_result(
+        self,
+        model_name: str,
+        instance_index: int,
+        latency: Optional[float],
+        success: bool,
+    )-> None:
+        
+        """
+        归还实例的在途计数，并把本次请求的延迟与成败计入负载均衡统计
+        latency 为 None 时只归还计数，不影响健康统计
+        """
+        
+        balancer: ModelInstanceBalancer = self._online_models[model_name]["balancer"]
+        if latency is None:
+            balancer.cancel(instance_index)
+        else:
+            balancer.release(instance_index, latency, success)
     
 # ----------------------------- 常用 API -----------------------------
 
@@ -957,6 +1608,18 @@ async def get_answer_async(
     check_and_accept: Callable[[str], bool] = lambda _: True,
     tools: List[Dict[str, Any]] = [],
     tool_use_trial_num: int = 10,
+    hedging_percentile: Optional[float] = None,
+    hedging_max_extra_cost_ratio: float = 0.1,
+    use_cache: bool = False,
+    tool_call_concurrency: int = 4,
+    deadline: Optional[float] = None,
+    fallback_models: Optional[List[str]] = None,
+    switch_model_after_failures: int = 3,
+    repair_functions: List[Callable[[str], str]] = [],
+    repair_trial_num: int = 0,
+    repair_prompt_builder: Callable[[str], str] = lambda _: default_repair_prompt,
+    response_schema: Optional[Dict[str, Any]] = None,
+    call_site: Optional[str] = None,
 )-> str:
     
     response = await model_manager.get_answer_async(
@@ -974,6 +1637,18 @@ async def get_answer_async(
         check_and_accept = check_and_accept,
         tools = tools,
         tool_use_trial_num = tool_use_trial_num,
+        hedging_percentile = hedging_percentile,
+        hedging_max_extra_cost_ratio = hedging_max_extra_cost_ratio,
+        use_cache = use_cache,
+        tool_call_concurrency = tool_call_concurrency,
+        deadline = deadline,
+        fallback_models = fallback_models,
+        switch_model_after_failures = switch_model_after_failures,
+        repair_functions = repair_functions,
+        repair_trial_num = repair_trial_num,
+        repair_prompt_builder = repair_prompt_builder,
+        response_schema = response_schema,
+        call_site = call_site,
     )
     
     return response
@@ -991,6 +1666,30 @@ async def get_available_models_async(
     return await model_manager.get_available_models_async()
 
 
+def get_response_cache_stats(
+)-> Dict[str, Any]:
+    
+    return model_manager.get_response_cache().get_stats()
+
+
+def get_provider_scheduler_stats(
+)-> Dict[str, Dict[str, Any]]:
+    
+    return model_manager.get_provider_scheduler_stats()
+
+
+def get_call_site_stats(
+)-> Dict[str, Dict[str, Any]]:
+    
+    return model_manager.get_call_site_stats()
+
+
+def get_prompt_cache_stats(
+)-> Dict[str, Dict[str, Any]]:
+    
+    return model_manager.get_prompt_cache_stats()
+
+
 default_api_keys_path = "api_keys.json"
 try:
     load_api_keys(default_api_keys_path)
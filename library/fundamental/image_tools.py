@@ -5,6 +5,8 @@ from .externals import *
 __all__ = [
     "align_image_to_bytes",
     "align_image_to_bytes_async",
+    "prepare_image_data_url",
+    "prepare_image_data_url_async",
 ]
 
 
@@ -67,4 +69,127 @@ async def align_image_to_bytes_async(
     elif image_type == "url":
         raise NotImplementedError
 
-    raise RuntimeError("图片对齐逻辑出现未知错误。")
\ No newline at end of file
+    raise RuntimeError("图片对齐逻辑出现未知错误。")
+
+
+_image_data_url_cache: OrderedDict[Tuple[str, int, int], str] = OrderedDict()
+_image_data_url_cache_lock = threading.Lock()
+_image_data_url_cache_max_chars: int = 256 * 1024 * 1024
+_image_data_url_cache_chars: int = 0
+
+default_image_max_edge: int = 2048
+default_image_max_bytes: int = 3 * 1024 * 1024
+
+
+def _get_image_mime_type(
+    image_bytes: bytes,
+)-> Optional[str]:
+    
+    if image_bytes.startswith(b'\xFF\xD8\xFF'):
+        return "jpeg"
+    elif image_bytes.startswith(b'\x89PNG'):
+        return "png"
+    elif image_bytes.startswith(b'GIF'):
+        return "gif"
+    elif image_bytes[:4] == b'RIFF' and image_bytes[8:12] == b'WEBP':
+        return "webp"
+    return None
+
+
+def _normalize_image_bytes(
+    image_bytes: bytes,
+    max_edge: int,
+    max_bytes: int,
+)-> Tuple[str, bytes]:
+    
+    """
+    解码一次，按需缩放到最长边不超过 max_edge，再以 JPEG 重新编码到 max_bytes 以内
+    已经满足限制的 JPEG / PNG 原样返回，避免无谓的有损压缩
+    """
+    
+    mime_type = _get_image_mime_type(image_bytes)
+    try:
+        pixmap = fitz.Pixmap(image_bytes)
+    except Exception:
+        # 无法解码的格式（如 GIF 动图）交给服务端处理
+        return mime_type or "jpeg", image_bytes
+    
+    longest_edge = max(pixmap.width, pixmap.height)
+    if mime_type in ["jpeg", "png"] and longest_edge <= max_edge and len(image_bytes) <= max_bytes:
+        return mime_type, image_bytes
+    
+    if pixmap.alpha:
+        pixmap = fitz.Pixmap(pixmap, 0)
+    if pixmap.colorspace is None or pixmap.colorspace.n not in [1, 3]:
+        pixmap = fitz.Pixmap(fitz.csRGB, pixmap)
+    
+    target_edge = min(longest_edge, max_edge)
+    while True:
+        if target_edge < longest_edge:
+            scale = target_edge / longest_edge
+            scaled_pixmap = fitz.Pixmap(
+                pixmap,
+                max(1, round(pixmap.width * scale)),
+                max(1, round(pixmap.height * scale)),
+                None,
+            )
+        else:
+            scaled_pixmap = pixmap
+        for jpg_quality in [90, 80, 70, 60]:
+            encoded_bytes = scaled_pixmap.tobytes("jpeg", jpg_quality=jpg_quality)
+            if len(encoded_bytes) <= max_bytes:
+                return "jpeg", encoded_bytes
+        # 最低画质仍超预算时继续缩小尺寸
+        if target_edge <= 256:
+            return "jpeg", encoded_bytes
+        target_edge = int(target_edge * 0.75)
+
+
+def prepare_image_data_url(
+    image_bytes: bytes,
+    max_edge: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+)-> str:
+    
+    """
+    把图片整理成适合 VLM 请求的 data URL，结果按 (内容哈希, 尺寸限制) 记忆化
+    同一张图片在重试、对冲、多轮对话中反复发送时只做一次解码与编码
+    """
+    
+    global _image_data_url_cache_chars
+    
+    if max_edge is None: max_edge = default_image_max_edge
+    if max_bytes is None: max_bytes = default_image_max_bytes
+    
+    cache_key = (hashlib.sha256(image_bytes).hexdigest(), max_edge, max_bytes)
+    with _image_data_url_cache_lock:
+        data_url = _image_data_url_cache.get(cache_key)
+        if data_url is not None:
+            _image_data_url_cache.move_to_end(cache_key)
+            return data_url
+    
+    mime_type, encoded_bytes = _normalize_image_bytes(image_bytes, max_edge, max_bytes)
+    data_url = f"data:image/{mime_type};base64,{base64.b64encode(encoded_bytes).decode('UTF-8')}"
+    
+    with _image_data_url_cache_lock:
+        if cache_key not in _image_data_url_cache:
+            _image_data_url_cache[cache_key] = data_url
+            _image_data_url_cache_chars += len(data_url)
+        while _image_data_url_cache_chars > _image_data_url_cache_max_chars and len(_image_data_url_cache) > 1:
+            _, evicted_data_url = _image_data_url_cache.popitem(last=False)
+            _image_data_url_cache_chars -= len(evicted_data_url)
+    
+    return data_url
+
+
+async def prepare_image_data_url_async(
+    image_bytes: bytes,
+    max_edge: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+)-> str:
+    
+    """
+    解码、缩放与编码都是 CPU 密集操作，放到线程里执行，不阻塞事件循环
+    """
+    
+    return await asyncio.to_thread(prepare_image_data_url, image_bytes, max_edge, max_bytes)
@@ -1,2 +1,4 @@
 from .lark_bot import *
+from .thread_context import *
+from .task_supervisor import *
 from .parallel_thread_lark_bot import *
\ No newline at end of file
@@ -29,10 +29,13 @@ from lark_oapi.api.docx.v1 import TextElement
 from lark_oapi.api.docx.v1 import TextElementStyle
 from lark_oapi.api.docx.v1 import UpdateTextRequest
 from lark_oapi.api.docx.v1 import UpdateBlockRequest
+from lark_oapi.api.docx.v1 import UpdateTextElementsRequest
 from lark_oapi.api.docx.v1 import ReplaceImageRequest
 from lark_oapi.api.docx.v1 import CreateDocumentRequest
 from lark_oapi.api.docx.v1 import CreateDocumentResponse
 from lark_oapi.api.docx.v1 import CreateDocumentRequestBody
+from lark_oapi.api.docx.v1 import PatchDocumentBlockRequest
+from lark_oapi.api.docx.v1 import PatchDocumentBlockResponse
 from lark_oapi.api.docx.v1 import BatchUpdateDocumentBlockRequest
 from lark_oapi.api.docx.v1 import BatchUpdateDocumentBlockResponse
 from lark_oapi.api.docx.v1 import BatchUpdateDocumentBlockRequestBody
@@ -77,6 +80,7 @@ __all__ = [
     "TextElementStyle",
     "UpdateTextRequest",
     "UpdateBlockRequest",
+    "UpdateTextElementsRequest",
     "ReplaceImageRequest",
     "CreateDocumentRequest",
     "CreateDocumentResponse",
@@ -84,6 +88,8 @@ __all__ = [
     "CreateDocumentBlockChildrenRequest",
     "CreateDocumentBlockChildrenResponse",
     "CreateDocumentBlockChildrenRequestBody",
+    "PatchDocumentBlockRequest",
+    "PatchDocumentBlockResponse",
     "BatchUpdateDocumentBlockRequest",
     "BatchUpdateDocumentBlockResponse",
     "BatchUpdateDocumentBlockRequestBody",
@@ -5,11 +5,13 @@ from ..json_tools import *
 from ..backoff_decorators import *
 from ..image_tools import *
 from ..yaml_tools import *
+from ..slotted_record import *
 
 
 __all__ = [
     "get_lark_document_url",
     "LarkBot",
+    "ParsedMessage",
     "P2ImMessageReceiveV1",
     "ReplyMessageResponse",
 ]
@@ -24,6 +26,36 @@ def get_lark_document_url(
     return lark_document_url
 
 
+class ParsedMessage(SlottedRecord):
+
+    """
+    LarkBot.parse_message 的结果；以 slots 存储，兼容原先的字典访问方式
+    解析失败时只有 success (False) 与 error 有意义
+    """
+
+    __slots__ = (
+        "success",
+        "error",
+        "message_type",
+        "message_id",
+        "thread_root_id",
+        "is_thread_root",
+        "chat_type",
+        "sender",
+        "text",
+        "image_keys",
+        "hyperlinks",
+        "mentioned_me",
+        "message_content_dict",
+        "file_key",
+        "file_name",
+    )
+
+    _field_defaults = {
+        "success": False,
+    }
+
+
 never_used_string = f"never_used"
 class LarkBot:
     
@@ -123,6 +155,7 @@ class LarkBot:
     overwrite_document_backoff_seconds = [1.0] * 32 + [2.0] * 32 + [4.0] * 32 + [8.0] * 32
     append_document_blocks_backoff_seconds = [1.0] * 32 + [2.0] * 32 + [4.0] * 32 + [8.0] * 32
     delete_file_backoff_seconds = [1.0] * 32 + [2.0] * 32 + [4.0] * 32 + [8.0] * 32
+    update_document_title_backoff_seconds = [1.0] * 4 + [2.0] * 4
     
     def __init__(
         self,
@@ -312,22 +345,22 @@ class LarkBot:
     def parse_message(
         self,
         message: P2ImMessageReceiveV1,
-    )-> Dict[str, Any]:
+    )-> ParsedMessage:
 
         if message.event is None: 
-            return {"success": False, "error": "event 字段为空"}
+            return ParsedMessage(success=False, error="event 字段为空")
         if message.event.message is None: 
-            return {"success": False, "error": "event.message 字段为空"}
+            return ParsedMessage(success=False, error="event.message 字段为空")
 
         message_id = message.event.message.message_id
         chat_type = message.event.message.chat_type
         message_content = message.event.message.content
         if not isinstance(message_id, str):
-            return {"success": False, "error": f"收到非字符串 message_id: {message_id}"}
+            return ParsedMessage(success=False, error=f"收到非字符串 message_id: {message_id}")
         if not isinstance(chat_type, str):
-            return {"success": False, "error": f"收到非字符串 chat_type: {chat_type}"}
+            return ParsedMessage(success=False, error=f"收到非字符串 chat_type: {chat_type}")
         if not isinstance(message_content, str):
-            return {"success": False, "error": f"收到非字符串 message_content: {message_content}"}
+            return ParsedMessage(success=False, error=f"收到非字符串 message_content: {message_content}")
         try:
             assert message.event.sender
             assert message.event.sender.sender_id
@@ -345,7 +378,7 @@ class LarkBot:
         try:
             message_content_dict = deserialize_json(message_content)
         except Exception:
-            return {"success": False, "error": "反序列化 message_content 失败"}
+            return ParsedMessage(success=False, error="反序列化 message_content 失败")
         
         try:
             mention_list = message.event.message.mentions
@@ -370,20 +403,20 @@ class LarkBot:
                 sorted_keys: List[str] = sorted(mention_map.keys(), key=len, reverse=True)
                 pattern = re.compile("|".join(re.escape(k) for k in sorted_keys))
                 text = pattern.sub(lambda m: mention_map[m.group(0)], text)
-            parse_message_result = {
-                "success": True,
-                "message_type": "simple_message",
-                "message_id": message_id,
-                "thread_root_id": thread_root_id,
-                "is_thread_root": is_thread_root,
-                "chat_type": chat_type,
-                "sender": sender,
-                "text": text,
-                "image_keys": [],
-                "hyperlinks": [],
-                "mentioned_me": mentioned_me,
-                "message_content_dict": message_content_dict,
-            }
+            parse_message_result = ParsedMessage(
+                success = True,
+                message_type = "simple_message",
+                message_id = message_id,
+                thread_root_id = thread_root_id,
+                is_thread_root = is_thread_root,
+                chat_type = chat_type,
+                sender = sender,
+                text = text,
+                image_keys = [],
+                hyperlinks = [],
+                mentioned_me = mentioned_me,
+                message_content_dict = message_content_dict,
+            )
             return parse_message_result
         
         elif message_content_dict_keys == set(["title", "content"]):
@@ -408,70 +441,70 @@ class LarkBot:
                     elif tag == "at":
                         text += "@" + line_element["user_name"]
                     else:
-                        return {
-                            "success": False,
-                            "error": f"message line element 不合预期：tag 为 {tag}",
-                        }
-            parse_message_result = {
-                "success": True,
-                "message_type": "complex_message",
-                "message_id": message_id,
-                "thread_root_id": thread_root_id,
-                "is_thread_root": is_thread_root,
-                "chat_type": chat_type,
-                "sender": sender,
-                "text": text,
-                "image_keys": image_keys,
-                "hyperlinks": hyperlinks,
-                "mentioned_me": mentioned_me,
-                "message_content_dict": message_content_dict,
-            }
+                        return ParsedMessage(
+                            success = False,
+                            error = f"message line element 不合预期：tag 为 {tag}",
+                        )
+            parse_message_result = ParsedMessage(
+                success = True,
+                message_type = "complex_message",
+                message_id = message_id,
+                thread_root_id = thread_root_id,
+                is_thread_root = is_thread_root,
+                chat_type = chat_type,
+                sender = sender,
+                text = text,
+                image_keys = image_keys,
+                hyperlinks = hyperlinks,
+                mentioned_me = mentioned_me,
+                message_content_dict = message_content_dict,
+            )
             return parse_message_result
         
         elif message_content_dict_keys == set(["image_key"]):
             image_key = message_content_dict["image_key"]
-            parse_message_result = {
-                "success": True,
-                "message_type": "single_image",
-                "message_id": message_id,
-                "thread_root_id": thread_root_id,
-                "is_thread_root": is_thread_root,
-                "chat_type": chat_type,
-                "sender": sender,
-                "text": "",
-                "image_keys": [image_key],
-                "hyperlinks": [],
-                "mentioned_me": mentioned_me,
-                "message_content_dict": message_content_dict,
-            }
+            parse_message_result = ParsedMessage(
+                success = True,
+                message_type = "single_image",
+                message_id = message_id,
+                thread_root_id = thread_root_id,
+                is_thread_root = is_thread_root,
+                chat_type = chat_type,
+                sender = sender,
+                text = "",
+                image_keys = [image_key],
+                hyperlinks = [],
+                mentioned_me = mentioned_me,
+                message_content_dict = message_content_dict,
+            )
             return parse_message_result
         
         elif message_content_dict_keys == set(["file_key", "file_name"]):
             file_key = message_content_dict["file_key"]
             file_name = message_content_dict["file_name"]
-            parse_message_result = {
-                "success": True,
-                "message_type": "single_file",
-                "message_id": message_id,
-                "thread_root_id": thread_root_id,
-                "is_thread_root": is_thread_root,
-                "chat_type": chat_type,
-                "sender": sender,
-                "text": "",
-                "image_keys": [],
-                "hyperlinks": [],
-                "mentioned_me": mentioned_me,
-                "message_content_dict": message_content_dict,
-                "file_key": file_key,
-                "file_name": file_name,
-            }
+            parse_message_result = ParsedMessage(
+                success = True,
+                message_type = "single_file",
+                message_id = message_id,
+                thread_root_id = thread_root_id,
+                is_thread_root = is_thread_root,
+                chat_type = chat_type,
+                sender = sender,
+                text = "",
+                image_keys = [],
+                hyperlinks = [],
+                mentioned_me = mentioned_me,
+                message_content_dict = message_content_dict,
+                file_key = file_key,
+                file_name = file_name,
+            )
             return parse_message_result
         
         else:
-            return {
-                "success": False, 
-                "error": f"message_content 不合预期，包含字段：{', '.join(message_content_dict_keys)}"
-            }
+            return ParsedMessage(
+                success = False,
+                error = f"message_content 不合预期，包含字段：{', '.join(message_content_dict_keys)}",
+            )
     
     
     def _build_get_message_resource_request(
@@ -602,6 +635,35 @@ class LarkBot:
         return final_images
     
     
+    async def resolve_image_refs_async(
+        self,
+        image_refs: List[Tuple[str, str]],
+    )-> List[bytes]:
+        
+        """
+        把上下文中保存的图片引用 (message_id, image_key) 解析为图片字节
+        上下文只保存引用，字节由共享的图片缓存持有，缓存淘汰后按引用重新下载
+        """
+        
+        image_keys_by_message: Dict[str, List[str]] = {}
+        for message_id, image_key in image_refs:
+            image_keys_by_message.setdefault(message_id, []).append(image_key)
+        
+        images_by_ref: Dict[Tuple[str, str], bytes] = {}
+        for message_id, image_keys in image_keys_by_message.items():
+            image_bytes_list = await self.download_message_images_async(
+                message_id = message_id,
+                image_keys = image_keys,
+            )
+            for image_key, image_bytes in zip(image_keys, image_bytes_list):
+                images_by_ref[(message_id, image_key)] = image_bytes
+        
+        return [
+            images_by_ref[(message_id, image_key)]
+            for message_id, image_key in image_refs
+        ]
+    
+    
     def _build_create_image_request(
         self,
         image_type: str,
@@ -963,6 +1025,43 @@ class LarkBot:
             raise RuntimeError
     
     
+    # https://open.feishu.cn/document/server-docs/docs/docs/docx-v1/document-block/patch
+    # 文档标题即根块（block_id 与 document_id 相同）的文本
+    def _build_update_document_title_request(
+        self,
+        document_id: str,
+        title: str,
+    )-> PatchDocumentBlockRequest:
+        
+        text_element = TextElement.builder().text_run(TextRun.builder().content(title).build()).build()
+        update_text_elements = UpdateTextElementsRequest.builder().elements([text_element]).build()
+        request_body = UpdateBlockRequest.builder().update_text_elements(update_text_elements).build()
+        request_builder = PatchDocumentBlockRequest.builder()
+        request_builder = request_builder.document_id(document_id)
+        request_builder = request_builder.block_id(document_id)
+        request_builder = request_builder.request_body(request_body)
+        request = request_builder.build()
+        return request
+    
+    
+    @backoff_async(update_document_title_backoff_seconds)
+    async def update_document_title_async(
+        self,
+        document_id: str,
+        title: str,
+    )-> None:
+        
+        request = self._build_update_document_title_request(
+            document_id = document_id,
+            title = title,
+        )
+        assert self._lark_client.docx
+        update_title_result = await self._lark_client.docx.v1.document_block.apatch(request)
+        if not update_title_result.success():
+            raise RuntimeError(f"Failed to update document title: {update_title_result.code} {update_title_result.msg}")
+        return None
+    
+    
     # https://open.feishu.cn/document/server-docs/docs/drive-v1/media/introduction
     def _build_upload_image_for_document_request(
         self,
@@ -1,7 +1,11 @@
+import signal
 from .lark_bot import *
+from .thread_context import *
+from .task_supervisor import *
 from ._lark_sdk import *
 from ..typing import *
 from ..externals import *
+from ..profiling_tools import *
 
 
 __all__ = [
@@ -42,11 +46,15 @@ class ParallelThreadLarkBot(LarkBot):
         self._worker_timeout: float = worker_timeout
         
         self._context_cache_size: int = context_cache_size
-        self._context_cache: OrderedDict[str, Dict[str, Any]] = OrderedDict()
+        self._context_cache: OrderedDict[str, Union[Dict[str, Any], ThreadContext]] = OrderedDict()
         self._cache_lock: Optional[asyncio.Lock] = None
         
         self._max_workers: Optional[int] = max_workers
         
+        # 后台任务（例如话题触发的工作流）统一交给 TaskSupervisor，在事件循环启动时创建
+        self._task_supervisor: Optional[TaskSupervisor] = None
+        self._shutdown_started: bool = False
+        
         self._event_handler_builder.register_p2_im_message_receive_v1(
             self._sync_bridge_callback,
         )
@@ -81,6 +89,11 @@ class ParallelThreadLarkBot(LarkBot):
         ready_event.wait()
         print(f"[ParallelThreadLarkBot] Async worker thread started.")
         
+        # 主进程的 shutdown / terminate 向子进程发送 SIGTERM；终端里的 Ctrl+C 则把 SIGINT 发给整个进程组，
+        # 子进程同样会收到。两种信号都先排空后台任务、执行 on_shutdown 再退出
+        signal.signal(signal.SIGTERM, self._handle_shutdown_signal)
+        signal.signal(signal.SIGINT, self._handle_shutdown_signal)
+        
         super()._start_internal_logic()
         print(f"[ParallelThreadLarkBot] {self._config['name']} WS client shut down.")
     
@@ -92,7 +105,7 @@ class ParallelThreadLarkBot(LarkBot):
 
         assert self._async_loop is not None, "Bot not started. Call .start()"
 
-        parsed_event: Dict[str, Any] = self.parse_message(message)
+        parsed_event: ParsedMessage = self.parse_message(message)
         if not parsed_event.get("success"):
             print(f"[ParallelThreadLarkBot] Failed to parse message: {parsed_event.get('error')}")
             return
@@ -103,7 +116,7 @@ class ParallelThreadLarkBot(LarkBot):
 
     async def _async_distributor(
         self,
-        parsed_event: Dict[str, Any],
+        parsed_event: ParsedMessage,
     )-> None:
 
         try:
@@ -140,7 +153,7 @@ class ParallelThreadLarkBot(LarkBot):
         queue: asyncio.Queue,
     )-> None:
         
-        current_state: Optional[Dict[str, Any]] = None
+        current_state: Optional[Union[Dict[str, Any], ThreadContext]] = None
         assert self._cache_lock is not None
 
         async with self._cache_lock:
@@ -176,12 +189,21 @@ class ParallelThreadLarkBot(LarkBot):
                 except Exception as e:
                     print(f"[ParallelThreadLarkBot] Error in on_thread_timeout for {thread_root_id}: {e}")
                 
+                evicted_items: List[Tuple[str, Any]] = []
                 async with self._cache_lock:
                     self._context_cache[thread_root_id] = current_state
                     self._context_cache.move_to_end(thread_root_id)
                     if len(self._context_cache) > self._context_cache_size:
-                        evicted_key, _ = self._context_cache.popitem(last=False)
+                        evicted_key, evicted_context = self._context_cache.popitem(last=False)
                         print(f"[ParallelThreadLarkBot] Evicted context for {evicted_key} from LRU cache.")
+                        # 仍有活跃 worker 的话题会在 worker 结束时重新写回缓存，不算真正驱逐
+                        if evicted_key not in self.active_workers:
+                            evicted_items.append((evicted_key, evicted_context))
+                for evicted_key, evicted_context in evicted_items:
+                    try:
+                        self.on_context_evicted(evicted_key, evicted_context)
+                    except Exception as e:
+                        print(f"[ParallelThreadLarkBot] Error in on_context_evicted for {evicted_key}: {e}")
 
             
             assert self._manager_lock is not None
@@ -191,6 +213,102 @@ class ParallelThreadLarkBot(LarkBot):
                 print(f"[ParallelThreadLarkBot] Worker for thread {thread_root_id} terminated.")
 
 
+    def spawn_background_task(
+        self,
+        coroutine: Coroutine[Any, Any, Any],
+        thread_root_id: str,
+        name: str,
+        deadline: Optional[float] = None,
+        exempt_from_quota: bool = False,
+    )-> asyncio.Task:
+        
+        """
+        在事件循环中启动受监管的后台任务，按话题分组计入配额，退出时统一排空
+        配额与缺省截止时间来自配置字段 max_background_tasks、max_background_tasks_per_thread、background_task_deadline_seconds
+        """
+        
+        assert self._task_supervisor is not None, "Bot not started. Call .start()"
+        return self._task_supervisor.spawn(
+            coroutine = coroutine,
+            group = thread_root_id,
+            name = name,
+            deadline = deadline,
+            exempt_from_quota = exempt_from_quota,
+        )
+
+
+    def get_background_task_stats(
+        self,
+    )-> Dict[str, Any]:
+        
+        if self._task_supervisor is None: return {}
+        return self._task_supervisor.get_stats()
+
+
+    def _handle_shutdown_signal(
+        self,
+        signum: int,
+        frame: Any,
+    )-> None:
+        
+        signal_name = signal.Signals(signum).name
+        # Ctrl+C 之后主进程还会 terminate 子进程：排空期间再收到的信号直接忽略，由第一次的处理负责退出
+        if self._shutdown_started:
+            print(f"[ParallelThreadLarkBot] {signal_name} received while draining, ignored.")
+            return
+        self._shutdown_started = True
+        grace_seconds: float = self._config.get("shutdown_grace_seconds", 30.0)
+        print(f"[ParallelThreadLarkBot] {signal_name} received, draining background tasks (grace {grace_seconds:g} s)...")
+        if self._async_loop is not None and self._async_loop.is_running():
+            future = asyncio.run_coroutine_threadsafe(
+                self._drain_async(grace_seconds),
+                self._async_loop,
+            )
+            try:
+                future.result(timeout=grace_seconds + 30.0)
+            except Exception as error:
+                print(f"[ParallelThreadLarkBot] Drain did not finish cleanly: {error}")
+        raise SystemExit(0)
+
+
+    async def _drain_async(
+        self,
+        grace_seconds: float,
+    )-> None:
+        
+        if self._task_supervisor is not None:
+            drain_result = await self._task_supervisor.drain_async(grace_seconds)
+            print(
+                f"[ParallelThreadLarkBot] Background tasks drained: "
+                f"{drain_result['finished']} finished, {drain_result['cancelled']} cancelled."
+            )
+        try:
+            await self.on_shutdown()
+        except Exception as error:
+            print(f"[ParallelThreadLarkBot] Error in on_shutdown: {error}\n{traceback.format_exc()}")
+
+
+    def get_context_memory_stats(
+        self,
+    )-> Dict[str, Any]:
+        
+        """
+        统计 LRU 缓存中各话题上下文的内存占用（递归估算），用于确认上下文里没有囤积大对象
+        """
+        
+        context_sizes = [
+            get_deep_size(context)
+            for context in list(self._context_cache.values())
+        ]
+        total_bytes = sum(context_sizes)
+        return {
+            "context_num": len(context_sizes),
+            "total_bytes": total_bytes,
+            "mean_bytes": total_bytes / len(context_sizes) if context_sizes else 0.0,
+            "max_bytes": max(context_sizes, default=0),
+        }
+
+
     def _start_async_loop(
         self,
         loop: asyncio.AbstractEventLoop,
@@ -205,6 +323,11 @@ class ParallelThreadLarkBot(LarkBot):
         
         self._manager_lock = asyncio.Lock()
         self._cache_lock = asyncio.Lock()
+        self._task_supervisor = TaskSupervisor(
+            max_running = self._config.get("max_background_tasks"),
+            max_running_per_group = self._config.get("max_background_tasks_per_thread"),
+            default_deadline = self._config.get("background_task_deadline_seconds"),
+        )
         
         ready_event.set()
         loop.run_forever()
@@ -214,12 +337,12 @@ class ParallelThreadLarkBot(LarkBot):
     
     def should_process(
         self,
-        parsed_message: Dict[str, Any],
+        parsed_message: ParsedMessage,
     )-> bool:
         """
         [同步] 快速过滤器。
         
-        :param parsed_message: LarkBot.parse_message() 的输出字典。
+        :param parsed_message: LarkBot.parse_message() 的输出，可按字典方式读取字段。
         :return: True 表示处理，False 表示丢弃。
         """
         raise NotImplementedError("Subclass must implement should_process")
@@ -228,13 +351,16 @@ class ParallelThreadLarkBot(LarkBot):
     async def get_initial_context(
         self,
         thread_root_id: str,
-    )-> Dict[str, Any]:
+    )-> Any:
         """
         [异步] 当 LRU 缓存 (L1) 未命中时调用。
         用于创建新上下文，或从持久化存储 (L2, 如 DB) 加载。
         
         :param thread_root_id: 当前话题的 ID，用于 L2 查找。
-        :return: 状态字典 (例如: {"history": []})。
+        :return: 状态字典 (例如: {"history": []})，
+            或 ThreadContext (例如: ThreadContext.create(log_fields=["history"]))。
+            历史较长的话题推荐后者：快照不可变、历史结构共享，处理函数无需 deepcopy。
+            各钩子中的上下文在基类里标注为 Any，子类按自己使用的具体类型标注即可。
         """
         raise NotImplementedError("Subclass must implement get_initial_context")
     
@@ -242,14 +368,15 @@ class ParallelThreadLarkBot(LarkBot):
     async def process_message_in_context(
         self,
         parsed_message: Dict[str, Any],
-        context: Dict[str, Any],
-    )-> Dict[str, Any]:
+        context: Any,
+    )-> Any:
         """
         [异步] 核心业务逻辑，串行处理话题中的每个事件。
         
         :param parsed_message: 当前事件的 parsed_message 字典。
         :param context: 上一个事件处理后返回的状态。
-        :return: 处理完毕后需要保存的新状态。
+            若为 ThreadContext，它是只读快照，用 set / append 得到新版本即可。
+        :return: 处理完毕后需要保存的新状态。返回即提交；抛出异常时保留原状态。
         """
         raise NotImplementedError("Subclass must implement process_message_in_context")
     
@@ -257,7 +384,7 @@ class ParallelThreadLarkBot(LarkBot):
     async def on_thread_timeout(
         self,
         thread_root_id: str,
-        context: Dict[str, Any],
+        context: Any,
     )-> None:
         """
         [异步] (可选) Worker 因超时而终止前调用。
@@ -266,4 +393,28 @@ class ParallelThreadLarkBot(LarkBot):
         :param thread_root_id: 当前话题的 ID。
         :param context: 此话题最后一次的状态字典。
         """
-        pass
\ No newline at end of file
+        pass
+    
+    
+    def on_context_evicted(
+        self,
+        thread_root_id: str,
+        context: Any,
+    )-> None:
+        """
+        [同步] (可选) 话题上下文被 LRU 缓存 (L1) 驱逐、且该话题没有活跃 worker 时调用。
+        运行在事件循环线程上，应只做 O(1) 的索引维护，例如把外部索引中的条目转为墓碑。
+        
+        :param thread_root_id: 被驱逐话题的 ID。
+        :param context: 被驱逐的状态。
+        """
+        pass
+    
+    
+    async def on_shutdown(
+        self,
+    )-> None:
+        """
+        [异步] (可选) 进程收到 SIGTERM / SIGINT、后台任务排空之后调用，用于刷写缓冲中的持久化数据。
+        """
+        pass
@@ -0,0 +1,241 @@
+from ..typing import *
+from ..externals import *
+
+
+__all__ = [
+    "TaskSupervisor",
+]
+
+
+class _SupervisedTask:
+
+    __slots__ = ("task", "group", "name", "state", "deadline", "deadline_handle", "timed_out")
+
+    def __init__(
+        self,
+        group: str,
+        name: str,
+        deadline: Optional[float],
+    )-> None:
+
+        self.task: Optional[asyncio.Task] = None
+        self.group: str = group
+        self.name: str = name
+        self.state: Literal["queued", "running"] = "queued"
+        self.deadline: Optional[float] = deadline
+        self.deadline_handle: Optional[asyncio.TimerHandle] = None
+        self.timed_out: bool = False
+
+
+class TaskSupervisor:
+
+    """
+    后台任务组：代替裸的 asyncio.create_task，持有任务引用，并提供
+    - 配额：全局与每组（例如每个话题）同时运行的任务数上限，超出配额的任务排队等待
+    - 截止时间：任务开始运行后超过 deadline 秒即被取消
+    - 取消：按组或全部取消
+    - 统计：运行中 / 排队中的数量，以及已完成、失败、取消、超时的累计数
+    - 排空：停止接收新任务，等待已有任务结束，超过宽限期后取消剩余任务
+    所有方法都应在同一个事件循环中调用
+    """
+
+    def __init__(
+        self,
+        max_running: Optional[int] = None,
+        max_running_per_group: Optional[int] = None,
+        default_deadline: Optional[float] = None,
+    )-> None:
+
+        self._max_running: Optional[int] = max_running
+        self._max_running_per_group: Optional[int] = max_running_per_group
+        self._default_deadline: Optional[float] = default_deadline
+
+        self._global_semaphore: Optional[asyncio.Semaphore] = \
+            asyncio.Semaphore(max_running) if max_running is not None else None
+        # 每组的信号量随组内第一个任务创建，组内任务全部结束时删除
+        self._group_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._group_members: Dict[str, Set[_SupervisedTask]] = {}
+
+        self._records: Set[_SupervisedTask] = set()
+        self._closed: bool = False
+        self._counters: Dict[str, int] = {
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "timed_out": 0,
+        }
+
+
+    def spawn(
+        self,
+        coroutine: Coroutine[Any, Any, Any],
+        group: str,
+        name: str,
+        deadline: Optional[float] = None,
+        exempt_from_quota: bool = False,
+    )-> asyncio.Task:
+
+        """
+        在后台运行 coroutine
+        - deadline 为 None 时使用 default_deadline；两者都为 None 则不设截止时间
+        - exempt_from_quota 的任务不占用也不等待配额，用于必须立即执行的短任务（例如题目受理）
+        """
+
+        if self._closed:
+            coroutine.close()
+            raise RuntimeError(f"[TaskSupervisor] 正在排空，拒绝新任务 {name}")
+
+        record = _SupervisedTask(
+            group = group,
+            name = name,
+            deadline = deadline if deadline is not None else self._default_deadline,
+        )
+        self._records.add(record)
+        self._group_members.setdefault(group, set()).add(record)
+        if self._max_running_per_group is not None and group not in self._group_semaphores:
+            self._group_semaphores[group] = asyncio.Semaphore(self._max_running_per_group)
+
+        record.task = asyncio.create_task(self._run_async(record, coroutine, exempt_from_quota))
+        return record.task
+
+
+    def cancel_group(
+        self,
+        group: str,
+        exclude_task: Optional[asyncio.Task] = None,
+    )-> int:
+
+        """
+        取消组内的全部任务，返回取消的数量
+        - exclude_task 不会被取消，用于组内任务取消同组的其他任务（传入 asyncio.current_task()）
+        """
+
+        records = [
+            record for record in self._group_members.get(group, ())
+            if record.task is not exclude_task
+        ]
+        for record in records:
+            assert record.task is not None
+            record.task.cancel()
+        return len(records)
+
+
+    def cancel_all(
+        self,
+    )-> int:
+
+        records = list(self._records)
+        for record in records:
+            assert record.task is not None
+            record.task.cancel()
+        return len(records)
+
+
+    def get_group_stats(
+        self,
+        group: str,
+    )-> Dict[str, int]:
+
+        records = self._group_members.get(group, ())
+        running = sum(1 for record in records if record.state == "running")
+        return {
+            "running": running,
+            "queued": len(records) - running,
+        }
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, Any]:
+
+        running = sum(1 for record in self._records if record.state == "running")
+        by_name: Dict[str, int] = {}
+        for record in self._records:
+            by_name[record.name] = by_name.get(record.name, 0) + 1
+        return {
+            "running": running,
+            "queued": len(self._records) - running,
+            "groups": len(self._group_members),
+            "by_name": by_name,
+            "closed": self._closed,
+            **self._counters,
+        }
+
+
+    async def drain_async(
+        self,
+        grace_seconds: float,
+        cancel_wait_seconds: float = 10.0,
+    )-> Dict[str, int]:
+
+        """
+        停止接收新任务，等待已有任务在 grace_seconds 内结束，之后取消剩余任务并最多再等 cancel_wait_seconds
+        返回自然结束与被取消的任务数
+        """
+
+        self._closed = True
+        tasks = [record.task for record in self._records if record.task is not None]
+        if not tasks:
+            return {"finished": 0, "cancelled": 0}
+        _, pending = await asyncio.wait(tasks, timeout=grace_seconds)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending, timeout=cancel_wait_seconds)
+        return {"finished": len(tasks) - len(pending), "cancelled": len(pending)}
+
+
+    async def _run_async(
+        self,
+        record: _SupervisedTask,
+        coroutine: Coroutine[Any, Any, Any],
+        exempt_from_quota: bool,
+    )-> Any:
+
+        started = False
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                if not exempt_from_quota:
+                    # 先占组内配额再占全局配额，避免排队中的组占着全局名额
+                    group_semaphore = self._group_semaphores.get(record.group)
+                    if group_semaphore is not None:
+                        await stack.enter_async_context(group_semaphore)
+                    if self._global_semaphore is not None:
+                        await stack.enter_async_context(self._global_semaphore)
+                record.state = "running"
+                if record.deadline is not None:
+                    record.deadline_handle = asyncio.get_running_loop().call_later(
+                        record.deadline, self._expire, record,
+                    )
+                started = True
+                result = await coroutine
+            self._counters["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            self._counters["timed_out" if record.timed_out else "cancelled"] += 1
+            raise
+        except Exception as error:
+            self._counters["failed"] += 1
+            print(f"[TaskSupervisor] 任务 {record.name} ({record.group}) 异常退出: {error}\n{traceback.format_exc()}")
+            return None
+        finally:
+            # 排队期间就被取消的协程从未开始执行，需要显式关闭
+            if not started: coroutine.close()
+            if record.deadline_handle is not None: record.deadline_handle.cancel()
+            self._records.discard(record)
+            members = self._group_members.get(record.group)
+            if members is not None:
+                members.discard(record)
+                if not members:
+                    del self._group_members[record.group]
+                    self._group_semaphores.pop(record.group, None)
+
+
+    def _expire(
+        self,
+        record: _SupervisedTask,
+    )-> None:
+
+        record.timed_out = True
+        assert record.task is not None
+        record.task.cancel()
@@ -0,0 +1,199 @@
+from ..typing import *
+from ..externals import *
+
+
+__all__ = [
+    "AppendOnlyLog",
+    "ThreadContext",
+]
+
+
+class AppendOnlyLog:
+
+    """
+    结构共享的只追加日志：多个版本共用同一个底层 list，每个版本只记录自己的长度
+    - 在最新版本上 append 是 O(1)，不复制已有元素
+    - 在旧版本上 append（分叉）时才复制该版本的前缀
+    已有元素不可修改，元素本身应视为不可变
+    """
+
+    __slots__ = (
+        "_items",
+        "_length",
+    )
+
+    def __init__(
+        self,
+        items: Optional[List[Any]] = None,
+        length: Optional[int] = None,
+    )-> None:
+
+        self._items: List[Any] = items if items is not None else []
+        self._length: int = length if length is not None else len(self._items)
+
+
+    def append(
+        self,
+        *new_items: Any,
+    )-> "AppendOnlyLog":
+
+        if not new_items: return self
+        if self._length == len(self._items):
+            items = self._items
+        else:
+            items = self._items[:self._length]
+        items.extend(new_items)
+        return AppendOnlyLog(items, self._length + len(new_items))
+
+
+    def to_list(
+        self,
+    )-> List[Any]:
+
+        return self._items[:self._length]
+
+
+    def __len__(
+        self,
+    )-> int:
+
+        return self._length
+
+
+    def __iter__(
+        self,
+    )-> Iterator[Any]:
+
+        items = self._items
+        for index in range(self._length):
+            yield items[index]
+
+
+    def __getitem__(
+        self,
+        index: Union[int, slice],
+    )-> Any:
+
+        if isinstance(index, slice):
+            # 只复制切片覆盖的元素，不先复制整个前缀
+            items = self._items
+            return [items[position] for position in range(*index.indices(self._length))]
+        if index < 0: index += self._length
+        if not 0 <= index < self._length:
+            raise IndexError("AppendOnlyLog index out of range")
+        return self._items[index]
+
+
+    def __repr__(
+        self,
+    )-> str:
+
+        return f"AppendOnlyLog({self.to_list()!r})"
+
+
+class ThreadContext:
+
+    """
+    话题上下文的不可变快照，替代每条消息 deepcopy 整个上下文的做法
+    - 字段值应为不可变对象（数字、字符串、元组）或 AppendOnlyLog
+    - set / append 返回新版本，只复制字段表本身，历史日志结构共享，单条消息的开销与历史长度无关
+    - 处理函数拿到的快照不会被其他版本改动；返回新版本即为提交，中途抛异常时旧快照保持原样
+    """
+
+    __slots__ = (
+        "_fields",
+        "version",
+    )
+
+    def __init__(
+        self,
+        fields: Optional[Dict[str, Any]] = None,
+        version: int = 0,
+    )-> None:
+
+        self._fields: Dict[str, Any] = fields if fields is not None else {}
+        self.version: int = version
+
+
+    @classmethod
+    def create(
+        cls,
+        log_fields: Sequence[str] = (),
+        **fields: Any,
+    )-> "ThreadContext":
+
+        """
+        创建初始版本：log_fields 中的字段初始化为空的 AppendOnlyLog
+        """
+
+        initial_fields = dict(fields)
+        for field_name in log_fields:
+            initial_fields[field_name] = AppendOnlyLog()
+        return cls(initial_fields)
+
+
+    def get(
+        self,
+        key: str,
+        default: Any = None,
+    )-> Any:
+
+        return self._fields.get(key, default)
+
+
+    def __getitem__(
+        self,
+        key: str,
+    )-> Any:
+
+        return self._fields[key]
+
+
+    def __contains__(
+        self,
+        key: str,
+    )-> bool:
+
+        return key in self._fields
+
+
+    def set(
+        self,
+        **changes: Any,
+    )-> "ThreadContext":
+
+        fields = dict(self._fields)
+        fields.update(changes)
+        return ThreadContext(fields, self.version + 1)
+
+
+    def append(
+        self,
+        key: str,
+        *items: Any,
+    )-> "ThreadContext":
+
+        fields = dict(self._fields)
+        fields[key] = fields[key].append(*items)
+        return ThreadContext(fields, self.version + 1)
+
+
+    def to_dict(
+        self,
+    )-> Dict[str, Any]:
+
+        """
+        导出为普通字典（日志转换为 list），用于持久化或调试，开销与历史长度成正比
+        """
+
+        return {
+            key: value.to_list() if isinstance(value, AppendOnlyLog) else value
+            for key, value in self._fields.items()
+        }
+
+
+    def __repr__(
+        self,
+    )-> str:
+
+        return f"ThreadContext(version={self.version}, fields={list(self._fields)})"
@@ -0,0 +1,284 @@
+import sqlite3
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "LLMResponseCache",
+]
+
+
+class LLMResponseCache:
+
+    """
+    面向确定性调用 (temperature 0、固定 prompt) 的内容寻址回复缓存
+    - key 为模型、消息、图片、工具 schema 与采样参数的 SHA-256
+    - SQLite 落盘，支持 TTL 过期与按总字节数的 LRU 淘汰
+    - 多个进程共用同一个文件：总字节数由触发器维护在 cache_stats 表中，而不是各进程各记一份
+    - 只应写入已经通过 check_and_accept 的回复
+    SQLite 读写放到线程里执行，不阻塞事件循环
+    """
+
+    def __init__(
+        self,
+        path: str,
+        ttl_seconds: float = 30 * 24 * 3600.0,
+        max_bytes: int = 512 * 1024 * 1024,
+    )-> None:
+
+        self._path: str = path
+        self._ttl_seconds: float = ttl_seconds
+        self._max_bytes: int = max_bytes
+
+        self._lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._puts_since_purge: int = 0
+
+        self.hits: int = 0
+        self.misses: int = 0
+        self.stores: int = 0
+        self.evictions: int = 0
+
+
+    @staticmethod
+    def make_key(
+        model_name: str,
+        raw_arguments: Dict[str, Any],
+    )-> str:
+
+        """
+        计算缓存 key；本地图片文件会按内容哈希，所以涉及文件读取，异步调用方应放到线程里执行
+        """
+
+        def image_fingerprint(image: Any)-> str:
+            if isinstance(image, bytes):
+                return hashlib.sha256(image).hexdigest()
+            if isinstance(image, str) and os.path.isfile(image):
+                with open(image, "rb") as file_pointer:
+                    return hashlib.sha256(file_pointer.read()).hexdigest()
+            return hashlib.sha256(str(image).encode("UTF-8")).hexdigest()
+
+        key_material = {
+            "model": model_name,
+            "prompt": raw_arguments["prompt"],
+            "system_prompt": raw_arguments["system_prompt"],
+            "image_placeholder": raw_arguments["image_placeholder"],
+            "images": [image_fingerprint(image) for image in raw_arguments["images"]],
+            "tools": [
+                {
+                    "name": tool.get("name"),
+                    "description": tool.get("description"),
+                    "parameters": tool.get("parameters"),
+                }
+                for tool in raw_arguments["tools"]
+            ],
+            "temperature": raw_arguments["temperature"],
+            "top_p": raw_arguments["top_p"],
+            "max_completion_tokens": raw_arguments["max_completion_tokens"],
+            "tool_use_trial_num": raw_arguments["tool_use_trial_num"],
+            "response_format": raw_arguments.get("response_format"),
+        }
+        serialized = json.dumps(
+            key_material,
+            ensure_ascii = False,
+            sort_keys = True,
+            separators = (",", ":"),
+            default = str,
+        )
+        return hashlib.sha256(serialized.encode("UTF-8")).hexdigest()
+
+
+    async def get_async(
+        self,
+        key: str,
+    )-> Optional[str]:
+
+        response = await asyncio.to_thread(self._get, key)
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+
+    async def put_async(
+        self,
+        key: str,
+        response: str,
+    )-> None:
+
+        await asyncio.to_thread(self._put, key, response)
+        self.stores += 1
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, Any]:
+
+        lookups = self.hits + self.misses
+        try:
+            with self._lock:
+                total_bytes: Optional[int] = self._read_total_bytes(self._ensure_connection())
+        except sqlite3.Error:
+            total_bytes = None
+        return {
+            "path": self._path,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "total_bytes": total_bytes,
+        }
+
+
+    def _ensure_connection(
+        self,
+    )-> sqlite3.Connection:
+
+        if self._connection is not None: return self._connection
+
+        directory = os.path.dirname(self._path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self._path, check_same_thread=False, timeout=30.0)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, "
+            "response TEXT NOT NULL, "
+            "created_at REAL NOT NULL, "
+            "last_access REAL NOT NULL, "
+            "size INTEGER NOT NULL)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)"
+        )
+        # 总字节数随每次增删改在同一事务中更新，任何进程写入或淘汰都会反映出来
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_stats ("
+                "id INTEGER PRIMARY KEY CHECK (id = 0), "
+                "total_bytes INTEGER NOT NULL)"
+            )
+            connection.execute(
+                "INSERT OR IGNORE INTO cache_stats (id, total_bytes) "
+                "SELECT 0, COALESCE(SUM(size), 0) FROM responses"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_insert AFTER INSERT ON responses BEGIN "
+                "UPDATE cache_stats SET total_bytes = total_bytes + NEW.size WHERE id = 0; END"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_delete AFTER DELETE ON responses BEGIN "
+                "UPDATE cache_stats SET total_bytes = total_bytes - OLD.size WHERE id = 0; END"
+            )
+            connection.execute(
+                "CREATE TRIGGER IF NOT EXISTS responses_size_update AFTER UPDATE OF size ON responses BEGIN "
+                "UPDATE cache_stats SET total_bytes = total_bytes + NEW.size - OLD.size WHERE id = 0; END"
+            )
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        self._connection = connection
+        return connection
+
+
+    def _get(
+        self,
+        key: str,
+    )-> Optional[str]:
+
+        with self._lock:
+            connection = self._ensure_connection()
+            row = connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None: return None
+            response, created_at = row
+            now = time.time()
+            if now - created_at > self._ttl_seconds:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                self.evictions += 1
+                return None
+            connection.execute(
+                "UPDATE responses SET last_access = ? WHERE key = ?", (now, key)
+            )
+            connection.commit()
+            return response
+
+
+    def _put(
+        self,
+        key: str,
+        response: str,
+    )-> None:
+
+        size = len(response.encode("UTF-8"))
+        with self._lock:
+            connection = self._ensure_connection()
+            now = time.time()
+            # 用 UPSERT 而不是 INSERT OR REPLACE：REPLACE 隐式删除旧行时不会触发删除触发器
+            connection.execute(
+                "INSERT INTO responses (key, response, created_at, last_access, size) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET response = excluded.response, "
+                "created_at = excluded.created_at, last_access = excluded.last_access, size = excluded.size",
+                (key, response, now, now, size),
+            )
+
+            # 写入已持有数据库写锁，此时读到的总字节数包含其他进程已提交的改动
+            self._puts_since_purge += 1
+            if self._puts_since_purge >= 256:
+                self._puts_since_purge = 0
+                self._purge_expired(connection, now)
+            if self._read_total_bytes(connection) > self._max_bytes:
+                self._evict_least_recently_used(connection)
+            connection.commit()
+
+
+    def _purge_expired(
+        self,
+        connection: sqlite3.Connection,
+        now: float,
+    )-> None:
+
+        cursor = connection.execute(
+            "DELETE FROM responses WHERE created_at < ?", (now - self._ttl_seconds,)
+        )
+        self.evictions += max(0, cursor.rowcount)
+
+
+    def _evict_least_recently_used(
+        self,
+        connection: sqlite3.Connection,
+    )-> None:
+
+        # 一次淘汰到上限的 90%，避免每次写入都触发淘汰
+        target_bytes = int(self._max_bytes * 0.9)
+        total_bytes = self._read_total_bytes(connection)
+        rows = connection.execute(
+            "SELECT key, size FROM responses ORDER BY last_access ASC"
+        )
+        keys_to_delete: List[str] = []
+        for key, size in rows:
+            if total_bytes <= target_bytes: break
+            keys_to_delete.append(key)
+            total_bytes -= size
+        connection.executemany(
+            "DELETE FROM responses WHERE key = ?", [(key,) for key in keys_to_delete]
+        )
+        self.evictions += len(keys_to_delete)
+
+
+    def _read_total_bytes(
+        self,
+        connection: sqlite3.Connection,
+    )-> int:
+
+        return connection.execute(
+            "SELECT total_bytes FROM cache_stats WHERE id = 0"
+        ).fetchone()[0]
@@ -0,0 +1,272 @@
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "ModelInstanceBalancer",
+]
+
+
+class _InstanceState:
+
+    __slots__ = (
+        "outstanding",
+        "ewma_latency",
+        "ewma_error",
+        "consecutive_failures",
+        "ejection_count",
+        "ejected_until",
+        "total_requests",
+        "total_failures",
+    )
+
+    def __init__(
+        self,
+    )-> None:
+
+        self.outstanding: int = 0
+        self.ewma_latency: Optional[float] = None
+        self.ewma_error: float = 0.0
+        self.consecutive_failures: int = 0
+        self.ejection_count: int = 0
+        self.ejected_until: float = 0.0
+        self.total_requests: int = 0
+        self.total_failures: int = 0
+
+
+class ModelInstanceBalancer:
+
+    """
+    同一模型多个实例 (api_key / base_url) 之间的负载均衡器
+    - 每个实例维护 EWMA 延迟、EWMA 错误率与在途请求数
+    - 采用 power-of-two-choices：随机抽两个可用实例，选预期代价更低的那个
+    - 连续失败达到阈值的实例被暂时摘除，摘除时长指数退避
+    - 摘除期满后在 readmission_seconds 内线性恢复权重，逐步重新接流量
+    内部自带线程锁，同步与异步调用方可以共用同一个实例
+    """
+
+    def __init__(
+        self,
+        instance_num: int,
+        ewma_alpha: float = 0.3,
+        failure_threshold: int = 3,
+        base_ejection_seconds: float = 30.0,
+        max_ejection_seconds: float = 600.0,
+        readmission_seconds: float = 60.0,
+        min_readmission_weight: float = 0.1,
+        latency_window_size: int = 256,
+        min_latency_samples: int = 20,
+    )-> None:
+
+        if instance_num <= 0:
+            raise ValueError("instance_num 必须为正整数！")
+
+        self._states: List[_InstanceState] = [_InstanceState() for _ in range(instance_num)]
+        self._ewma_alpha: float = ewma_alpha
+        self._failure_threshold: int = failure_threshold
+        self._base_ejection_seconds: float = base_ejection_seconds
+        self._max_ejection_seconds: float = max_ejection_seconds
+        self._readmission_seconds: float = readmission_seconds
+        self._min_readmission_weight: float = min_readmission_weight
+        self._lock: threading.Lock = threading.Lock()
+        
+        # 模型级别（跨实例）的近期成功延迟，供对冲请求计算触发阈值
+        self._recent_latencies: Deque[float] = deque(maxlen=latency_window_size)
+        self._min_latency_samples: int = min_latency_samples
+        self._primary_request_num: int = 0
+        self._hedged_request_num: int = 0
+
+
+    @property
+    def instance_num(
+        self,
+    )-> int:
+
+        return len(self._states)
+
+
+    def acquire(
+        self,
+        exclude: Tuple[int, ...] = (),
+        is_hedge: bool = False,
+    )-> int:
+
+        """
+        选出一个实例并将其在途请求数加一；调用方必须随后调用 release 或 cancel
+        exclude 中的实例尽量不选（例如对冲请求希望换一个实例），除非别无选择
+        """
+
+        with self._lock:
+            if not is_hedge: self._primary_request_num += 1
+            now = time.monotonic()
+            available = [
+                index for index, state in enumerate(self._states)
+                if state.ejected_until <= now and index not in exclude
+            ]
+            if not available:
+                available = [
+                    index for index, state in enumerate(self._states)
+                    if state.ejected_until <= now
+                ]
+            if not available:
+                # 全部被摘除时兜底：选最早恢复的实例，不让请求直接失败
+                chosen_index = min(
+                    range(len(self._states)),
+                    key = lambda index: self._states[index].ejected_until,
+                )
+            elif len(available) == 1:
+                chosen_index = available[0]
+            else:
+                first_index, second_index = random.sample(available, 2)
+                if self._expected_cost(first_index, now) <= self._expected_cost(second_index, now):
+                    chosen_index = first_index
+                else:
+                    chosen_index = second_index
+
+            state = self._states[chosen_index]
+            state.outstanding += 1
+            state.total_requests += 1
+            return chosen_index
+
+
+    def release(
+        self,
+        index: int,
+        latency: float,
+        success: bool,
+    )-> None:
+
+        with self._lock:
+            state = self._states[index]
+            state.outstanding = max(0, state.outstanding - 1)
+            alpha = self._ewma_alpha
+            state.ewma_error = (1 - alpha) * state.ewma_error + alpha * (0.0 if success else 1.0)
+
+            if success:
+                self._recent_latencies.append(latency)
+                if state.ewma_latency is None:
+                    state.ewma_latency = latency
+                else:
+                    state.ewma_latency = (1 - alpha) * state.ewma_latency + alpha * latency
+                state.consecutive_failures = 0
+                # 完全恢复权重后仍然健康，才逐步降低下次摘除的退避档位
+                if state.ejection_count and state.ejected_until + self._readmission_seconds <= time.monotonic():
+                    state.ejection_count -= 1
+                return
+
+            state.total_failures += 1
+            state.consecutive_failures += 1
+            if state.consecutive_failures >= self._failure_threshold:
+                ejection_seconds = min(
+                    self._base_ejection_seconds * (2 ** state.ejection_count),
+                    self._max_ejection_seconds,
+                )
+                state.ejected_until = time.monotonic() + ejection_seconds
+                state.ejection_count += 1
+                state.consecutive_failures = 0
+                print(
+                    f"[ModelInstanceBalancer] 实例 {index} 连续失败 {self._failure_threshold} 次，"
+                    f"摘除 {ejection_seconds:.0f} s"
+                )
+
+
+    def cancel(
+        self,
+        index: int,
+    )-> None:
+
+        """
+        请求被主动取消（如对冲落败）时调用：只归还在途计数，不计入延迟与错误统计
+        """
+
+        with self._lock:
+            state = self._states[index]
+            state.outstanding = max(0, state.outstanding - 1)
+
+
+    def latency_percentile(
+        self,
+        percentile: float,
+    )-> Optional[float]:
+
+        """
+        近期成功请求延迟的分位数 (percentile 取 0~1)；样本不足时返回 None
+        """
+
+        with self._lock:
+            if len(self._recent_latencies) < self._min_latency_samples: return None
+            sorted_latencies = sorted(self._recent_latencies)
+        position = min(len(sorted_latencies) - 1, max(0, int(percentile * len(sorted_latencies))))
+        return sorted_latencies[position]
+
+
+    def try_spend_hedge(
+        self,
+        max_extra_cost_ratio: float,
+    )-> bool:
+
+        """
+        对冲预算：累计对冲请求数不超过主请求数的 max_extra_cost_ratio 倍
+        """
+
+        with self._lock:
+            if self._hedged_request_num + 1 > max_extra_cost_ratio * self._primary_request_num:
+                return False
+            self._hedged_request_num += 1
+            return True
+
+
+    def get_stats(
+        self,
+    )-> List[Dict[str, Any]]:
+
+        with self._lock:
+            now = time.monotonic()
+            return [
+                {
+                    "index": index,
+                    "outstanding": state.outstanding,
+                    "ewma_latency": state.ewma_latency,
+                    "ewma_error": round(state.ewma_error, 4),
+                    "ejected": state.ejected_until > now,
+                    "weight": round(self._admission_weight(state, now), 3),
+                    "total_requests": state.total_requests,
+                    "total_failures": state.total_failures,
+                }
+                for index, state in enumerate(self._states)
+            ]
+
+
+    def _admission_weight(
+        self,
+        state: _InstanceState,
+        now: float,
+    )-> float:
+
+        if state.ejected_until > now: return 0.0
+        if state.ejected_until == 0.0 or self._readmission_seconds <= 0: return 1.0
+        recovered_seconds = now - state.ejected_until
+        if recovered_seconds >= self._readmission_seconds: return 1.0
+        ramp = recovered_seconds / self._readmission_seconds
+        return self._min_readmission_weight + (1 - self._min_readmission_weight) * ramp
+
+
+    def _expected_cost(
+        self,
+        index: int,
+        now: float,
+    )-> float:
+
+        state = self._states[index]
+        if state.ewma_latency is not None:
+            latency = state.ewma_latency
+        else:
+            # 新实例乐观估计为已知实例中最快的延迟，使其尽快被探测到
+            known_latencies = [
+                other.ewma_latency for other in self._states
+                if other.ewma_latency is not None
+            ]
+            latency = min(known_latencies) if known_latencies else 1.0
+        error_penalty = 1.0 / max(0.1, 1.0 - state.ewma_error)
+        weight = max(self._admission_weight(state, now), 1e-6)
+        return latency * (state.outstanding + 1) * error_penalty / weight
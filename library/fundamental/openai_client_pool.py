@@ -0,0 +1,162 @@
+import atexit
+import httpx
+from openai import OpenAI, AsyncOpenAI
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "get_openai_client",
+    "get_async_openai_client",
+    "close_openai_clients",
+    "close_openai_clients_async",
+]
+
+
+"""
+按 (api_key, base_url) 复用 OpenAI 客户端，所有客户端共享同一个 httpx 连接池
+这样重试、工具调用循环乃至不同模型之间都能复用 keep-alive 连接，省掉反复的 TCP / TLS 握手
+httpx.AsyncClient 的连接绑定在创建它的事件循环上，所以异步连接池按事件循环分别维护
+超时不属于客户端：调用方逐请求传给 create(timeout=...)，否则每个不同的剩余时限都会缓存一个新客户端
+"""
+
+
+try:
+    import h2 # type: ignore ; httpx 的 HTTP/2 支持依赖 h2，可选
+    _http2_available = True
+except ImportError:
+    _http2_available = False
+
+
+_connection_limits = httpx.Limits(
+    max_connections = 512,
+    max_keepalive_connections = 128,
+    keepalive_expiry = 120.0,
+)
+# 连接层面的超时；单次请求的总超时由调用方在 create(timeout=...) 中逐请求覆盖
+_connection_timeout = httpx.Timeout(
+    timeout = 600.0,
+    connect = 15.0,
+)
+
+
+_pool_lock = threading.Lock()
+
+_sync_http_client: Optional[httpx.Client] = None
+_sync_clients: Dict[Tuple[str, str], OpenAI] = {}
+
+_async_http_clients: Dict[int, Tuple[asyncio.AbstractEventLoop, httpx.AsyncClient]] = {}
+_async_clients: Dict[Tuple[int, str, str], AsyncOpenAI] = {}
+
+
+def _build_client_optional_params(
+    base_url: str,
+)-> Dict[str, Any]:
+
+    client_optional_params: Dict[str, Any] = {}
+    if base_url != "": client_optional_params["base_url"] = base_url
+    return client_optional_params
+
+
+def get_openai_client(
+    api_key: str,
+    base_url: str,
+)-> OpenAI:
+
+    global _sync_http_client
+
+    client_key = (api_key, base_url)
+    with _pool_lock:
+        client = _sync_clients.get(client_key)
+        if client is not None: return client
+        if _sync_http_client is None:
+            _sync_http_client = httpx.Client(
+                http2 = _http2_available,
+                limits = _connection_limits,
+                timeout = _connection_timeout,
+            )
+        client = OpenAI(
+            api_key = api_key,
+            http_client = _sync_http_client,
+            **_build_client_optional_params(base_url),
+        )
+        _sync_clients[client_key] = client
+        return client
+
+
+def get_async_openai_client(
+    api_key: str,
+    base_url: str,
+)-> AsyncOpenAI:
+
+    loop = asyncio.get_running_loop()
+    loop_id = id(loop)
+    client_key = (loop_id, api_key, base_url)
+
+    with _pool_lock:
+        client = _async_clients.get(client_key)
+        http_client_entry = _async_http_clients.get(loop_id)
+        if client is not None and http_client_entry is not None and http_client_entry[0] is loop:
+            return client
+
+        # 已关闭的事件循环上的连接池无法再使用，直接丢弃引用（id 也可能被新循环复用）
+        for stale_loop_id in [
+            stale_loop_id
+            for stale_loop_id, (stale_loop, _) in _async_http_clients.items()
+            if stale_loop.is_closed() or (stale_loop_id == loop_id and stale_loop is not loop)
+        ]:
+            del _async_http_clients[stale_loop_id]
+            for stale_client_key in [key for key in _async_clients if key[0] == stale_loop_id]:
+                del _async_clients[stale_client_key]
+
+        http_client_entry = _async_http_clients.get(loop_id)
+        if http_client_entry is None:
+            http_client_entry = (
+                loop,
+                httpx.AsyncClient(
+                    http2 = _http2_available,
+                    limits = _connection_limits,
+                    timeout = _connection_timeout,
+                ),
+            )
+            _async_http_clients[loop_id] = http_client_entry
+
+        client = AsyncOpenAI(
+            api_key = api_key,
+            http_client = http_client_entry[1],
+            **_build_client_optional_params(base_url),
+        )
+        _async_clients[client_key] = client
+        return client
+
+
+def close_openai_clients(
+)-> None:
+
+    global _sync_http_client
+
+    with _pool_lock:
+        _sync_clients.clear()
+        if _sync_http_client is not None:
+            _sync_http_client.close()
+            _sync_http_client = None
+
+
+async def close_openai_clients_async(
+)-> None:
+
+    """
+    关闭当前事件循环上的异步连接池；应在事件循环退出前调用
+    """
+
+    loop_id = id(asyncio.get_running_loop())
+    with _pool_lock:
+        http_client_entry = _async_http_clients.pop(loop_id, None)
+        for client_key in [key for key in _async_clients if key[0] == loop_id]:
+            del _async_clients[client_key]
+
+    if http_client_entry is not None:
+        await http_client_entry[1].aclose()
+
+
+atexit.register(close_openai_clients)
@@ -0,0 +1,189 @@
+import sys
+import pstats
+import cProfile
+import tracemalloc
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "EventLoopProfiler",
+    "MemorySnapshotDiffer",
+    "get_deep_size",
+]
+
+
+class EventLoopProfiler:
+
+    """
+    在线上进程中按需开关的 cProfile 采样器
+    cProfile 只统计调用 enable() 的线程，所以 start / stop 必须在事件循环线程中调用
+    """
+
+    def __init__(
+        self,
+    )-> None:
+
+        self._profile: Optional[cProfile.Profile] = None
+        self._start_time: Optional[float] = None
+        self._auto_stop_handle: Optional[asyncio.TimerHandle] = None
+
+
+    @property
+    def is_running(
+        self,
+    )-> bool:
+
+        return self._profile is not None
+
+
+    @property
+    def elapsed_seconds(
+        self,
+    )-> float:
+
+        if self._start_time is None: return 0.0
+        return time.perf_counter() - self._start_time
+
+
+    def start(
+        self,
+        seconds: Optional[float] = None,
+        on_auto_stop: Optional[Callable[[str], Coroutine[Any, Any, None]]] = None,
+    )-> None:
+
+        if self._profile is not None:
+            raise RuntimeError("profiler 已在运行中，请先 stop")
+
+        self._profile = cProfile.Profile()
+        self._start_time = time.perf_counter()
+        self._profile.enable()
+
+        if seconds is not None:
+            loop = asyncio.get_running_loop()
+            def auto_stop()-> None:
+                self._auto_stop_handle = None
+                if self._profile is None: return
+                report = self.stop()
+                if on_auto_stop is not None:
+                    loop.create_task(on_auto_stop(report))
+            self._auto_stop_handle = loop.call_later(seconds, auto_stop)
+
+
+    def stop(
+        self,
+        sort_key: str = "cumulative",
+        top_n: int = 60,
+    )-> str:
+
+        if self._profile is None:
+            raise RuntimeError("profiler 未在运行")
+
+        if self._auto_stop_handle is not None:
+            self._auto_stop_handle.cancel()
+            self._auto_stop_handle = None
+
+        self._profile.disable()
+        elapsed_seconds = self.elapsed_seconds
+
+        stream = io.StringIO()
+        stats = pstats.Stats(self._profile, stream=stream)
+        stats.strip_dirs().sort_stats(sort_key).print_stats(top_n)
+
+        self._profile = None
+        self._start_time = None
+
+        return f"采样时长: {elapsed_seconds:.1f} s，排序方式: {sort_key}\n{stream.getvalue().strip()}"
+
+
+class MemorySnapshotDiffer:
+
+    """
+    tracemalloc 快照差分器
+    首次调用开启追踪并记录基线，此后每次调用都与上一次快照比较，报告增长最多的分配位置
+    """
+
+    def __init__(
+        self,
+        traceback_frames: int = 1,
+    )-> None:
+
+        self._traceback_frames: int = traceback_frames
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+        self._last_snapshot_time: Optional[str] = None
+
+
+    def snapshot(
+        self,
+        top_n: int = 30,
+    )-> str:
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self._traceback_frames)
+
+        snapshot = tracemalloc.take_snapshot()
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+        snapshot_time = get_time_stamp(show_minute=True, show_second=True)
+        current_size, peak_size = tracemalloc.get_traced_memory()
+
+        lines: List[str] = [
+            f"当前追踪内存: {current_size / 1024 / 1024:.1f} MiB，峰值: {peak_size / 1024 / 1024:.1f} MiB",
+        ]
+        if self._last_snapshot is None:
+            lines.append("已开启 tracemalloc 并记录基线快照；再次调用以查看增量。")
+            lines.append(f"当前占用最多的 {top_n} 个位置：")
+            for statistic in snapshot.statistics("lineno")[:top_n]:
+                lines.append(str(statistic))
+        else:
+            lines.append(f"与上次快照 ({self._last_snapshot_time}) 相比增长最多的 {top_n} 个位置：")
+            for statistic in snapshot.compare_to(self._last_snapshot, "lineno")[:top_n]:
+                lines.append(str(statistic))
+
+        self._last_snapshot = snapshot
+        self._last_snapshot_time = snapshot_time
+
+        return "\n".join(lines)
+
+
+    def stop(
+        self,
+    )-> None:
+
+        self._last_snapshot = None
+        self._last_snapshot_time = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+def get_deep_size(
+    obj: Any,
+)-> int:
+
+    """
+    递归估算容器对象及其引用的全部对象占用的字节数，同一对象只计一次
+    用于比较上下文等纯数据结构的内存开销，不适合带复杂引用关系的对象
+    """
+
+    seen_ids: Set[int] = set()
+    pending: List[Any] = [obj]
+    total_size = 0
+    while pending:
+        current = pending.pop()
+        if id(current) in seen_ids: continue
+        seen_ids.add(id(current))
+        total_size += sys.getsizeof(current)
+        if isinstance(current, dict):
+            pending.extend(current.keys())
+            pending.extend(current.values())
+        elif isinstance(current, (list, tuple, set, frozenset, deque)):
+            pending.extend(current)
+        elif hasattr(type(current), "__slots__"):
+            for klass in type(current).__mro__:
+                slots = klass.__dict__.get("__slots__", ())
+                for slot_name in ((slots,) if isinstance(slots, str) else slots):
+                    if hasattr(current, slot_name): pending.append(getattr(current, slot_name))
+    return total_size
@@ -0,0 +1,522 @@
+import sqlite3
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "ProviderRequestScheduler",
+    "HostWideRequestScheduler",
+    "estimate_request_tokens",
+]
+
+
+def estimate_request_tokens(
+    prompt: Union[str, List[str]],
+    system_prompt: Optional[str],
+    image_num: int,
+    max_completion_tokens: Optional[int],
+)-> int:
+
+    """
+    粗略估计一次请求消耗的 token 数，仅用于 TPM 限流的预占
+    文本按约 3 字符 / token 估计，每张图片按 1000 token 计；请求结束后会用 usage 中的实际值修正
+    """
+
+    prompt_list = [prompt] if isinstance(prompt, str) else prompt
+    text_length = sum(len(text) for text in prompt_list)
+    if system_prompt is not None: text_length += len(system_prompt)
+    completion_tokens = max_completion_tokens if max_completion_tokens is not None else 1000
+    return text_length // 3 + image_num * 1000 + completion_tokens
+
+
+class _SchedulerTicket:
+
+    __slots__ = (
+        "window_entry",
+        "grant_id",
+        "actual_tokens",
+        "lease_renewal",
+    )
+
+    def __init__(
+        self,
+        window_entry: Optional[List[float]] = None,
+        grant_id: Optional[int] = None,
+    )-> None:
+
+        # window_entry: 进程内调度器的 [发出时刻, 计入 TPM 的 token 数]
+        # grant_id: 跨进程调度器在 SQLite 中登记的记录 id
+        self.window_entry: Optional[List[float]] = window_entry
+        self.grant_id: Optional[int] = grant_id
+        self.actual_tokens: Optional[int] = None
+        # 跨进程调度器在请求在途期间定期续租的任务，归还时取消
+        self.lease_renewal: Optional[asyncio.Task] = None
+
+
+class ProviderRequestScheduler:
+
+    """
+    单个服务商 (base_url) 的请求调度器，同时约束：
+    - requests_per_minute: 任意 60 s 滑动窗口内发出的请求数
+    - tokens_per_minute: 任意 60 s 滑动窗口内消耗的 token 数（先按估计值预占，结束后按实际值修正）
+    - max_concurrency: 同时在途的请求数
+    请求按到达顺序排队，容量一旦允许立即放行，并记录排队等待时长
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        window_seconds: float = 60.0,
+        wait_sample_size: int = 1024,
+    )-> None:
+
+        self._requests_per_minute: Optional[int] = requests_per_minute
+        self._tokens_per_minute: Optional[int] = tokens_per_minute
+        self._max_concurrency: Optional[int] = max_concurrency
+        self._window_seconds: float = window_seconds
+
+        self._window: Deque[List[float]] = deque()
+        self._window_tokens: float = 0.0
+        self._in_flight: int = 0
+
+        # 队首请求持有 _queue_lock 等待容量，保证先来先服务
+        self._queue_lock: asyncio.Lock = asyncio.Lock()
+        self._capacity_released: asyncio.Event = asyncio.Event()
+
+        self._queued_num: int = 0
+        self._granted_num: int = 0
+        self._total_wait_seconds: float = 0.0
+        self._max_wait_seconds: float = 0.0
+        self._recent_wait_seconds: Deque[float] = deque(maxlen=wait_sample_size)
+
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+    )-> "ProviderRequestScheduler":
+
+        return cls(
+            requests_per_minute = config.get("requests_per_minute"),
+            tokens_per_minute = config.get("tokens_per_minute"),
+            max_concurrency = config.get("max_concurrency"),
+        )
+
+
+    @contextlib.asynccontextmanager
+    async def reserve(
+        self,
+        estimated_tokens: int,
+    )-> AsyncIterator[_SchedulerTicket]:
+
+        """
+        async with scheduler.reserve(estimated_tokens) as ticket:
+            response = await client.chat.completions.create(...)
+            ticket.actual_tokens = response.usage.total_tokens
+        """
+
+        ticket = await self._acquire(estimated_tokens)
+        try:
+            yield ticket
+        finally:
+            await self._release_async(ticket)
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, Any]:
+
+        self._prune_window(time.monotonic())
+        sorted_wait_seconds = sorted(self._recent_wait_seconds)
+        def wait_percentile(percentile: float)-> float:
+            if not sorted_wait_seconds: return 0.0
+            return sorted_wait_seconds[min(len(sorted_wait_seconds) - 1, int(percentile * len(sorted_wait_seconds)))]
+        return {
+            "queued": self._queued_num,
+            "in_flight": self._in_flight,
+            "window_requests": len(self._window),
+            "window_tokens": int(self._window_tokens),
+            "granted": self._granted_num,
+            "mean_wait_seconds": self._total_wait_seconds / self._granted_num if self._granted_num else 0.0,
+            "p50_wait_seconds": wait_percentile(0.5),
+            "p95_wait_seconds": wait_percentile(0.95),
+            "max_wait_seconds": self._max_wait_seconds,
+        }
+
+
+    async def _acquire(
+        self,
+        estimated_tokens: int,
+    )-> _SchedulerTicket:
+
+        if self._tokens_per_minute is not None:
+            # 单个请求超过整个 TPM 额度时按额度封顶，否则会永远排不上
+            estimated_tokens = min(estimated_tokens, self._tokens_per_minute)
+
+        enqueue_time = time.monotonic()
+        self._queued_num += 1
+        try:
+            async with self._queue_lock:
+                while True:
+                    ticket, wait_seconds = await self._try_grant_async(estimated_tokens)
+                    if ticket is not None: break
+                    self._capacity_released.clear()
+                    try:
+                        await asyncio.wait_for(
+                            self._capacity_released.wait(),
+                            timeout = wait_seconds if wait_seconds != float("inf") else None,
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+        finally:
+            self._queued_num -= 1
+
+        waited_seconds = time.monotonic() - enqueue_time
+        self._granted_num += 1
+        self._total_wait_seconds += waited_seconds
+        self._max_wait_seconds = max(self._max_wait_seconds, waited_seconds)
+        self._recent_wait_seconds.append(waited_seconds)
+        return ticket
+
+
+    async def _try_grant_async(
+        self,
+        estimated_tokens: int,
+    )-> Tuple[Optional[_SchedulerTicket], float]:
+
+        """
+        容量允许时登记并返回 (ticket, 0)，否则返回 (None, 建议等待秒数)
+        """
+
+        now = time.monotonic()
+        self._prune_window(now)
+        wait_seconds = self._seconds_until_capacity(
+            now = now,
+            estimated_tokens = estimated_tokens,
+            window = self._window,
+            window_tokens = self._window_tokens,
+            in_flight = self._in_flight,
+        )
+        if wait_seconds > 0.0: return None, wait_seconds
+
+        window_entry = [now, float(estimated_tokens)]
+        self._window.append(window_entry)
+        self._window_tokens += estimated_tokens
+        self._in_flight += 1
+        return _SchedulerTicket(window_entry), 0.0
+
+
+    async def _release_async(
+        self,
+        ticket: _SchedulerTicket,
+    )-> None:
+
+        self._in_flight -= 1
+        window_entry = ticket.window_entry
+        if ticket.actual_tokens is not None and window_entry is not None:
+            # 条目可能已滑出窗口，此时修正值不再影响 TPM 统计
+            if any(entry is window_entry for entry in self._window):
+                self._window_tokens += ticket.actual_tokens - window_entry[1]
+            window_entry[1] = float(ticket.actual_tokens)
+        self._capacity_released.set()
+
+
+    def _prune_window(
+        self,
+        now: float,
+    )-> None:
+
+        while self._window and self._window[0][0] <= now - self._window_seconds:
+            self._window_tokens -= self._window.popleft()[1]
+
+
+    def _seconds_until_capacity(
+        self,
+        now: float,
+        estimated_tokens: int,
+        window: Sequence[Sequence[float]],
+        window_tokens: float,
+        in_flight: int,
+    )-> float:
+
+        """
+        根据窗口内的 (发出时刻, token 数) 记录与在途请求数，
+        返回距离容量允许放行还需等待的秒数；0 表示可以立即放行，inf 表示需等在途请求结束
+        """
+
+        if self._max_concurrency is not None and in_flight >= self._max_concurrency:
+            return float("inf")
+
+        wait_seconds = 0.0
+
+        if self._requests_per_minute is not None and len(window) >= self._requests_per_minute:
+            expire_index = len(window) - self._requests_per_minute
+            wait_seconds = max(wait_seconds, window[expire_index][0] + self._window_seconds - now)
+
+        if self._tokens_per_minute is not None and window_tokens + estimated_tokens > self._tokens_per_minute:
+            excess_tokens = window_tokens + estimated_tokens - self._tokens_per_minute
+            for timestamp, tokens in window:
+                excess_tokens -= tokens
+                wait_seconds = max(wait_seconds, timestamp + self._window_seconds - now)
+                if excess_tokens <= 0: break
+
+        return max(0.0, wait_seconds)
+
+
+class HostWideRequestScheduler(ProviderRequestScheduler):
+
+    """
+    同一台机器上所有 bot 进程共享的调度器，配额登记在本机 SQLite 文件中
+    - 每次放行在立即事务中检查窗口与在途数并写入一条记录，多进程之间互斥
+    - 记录带租约，在途期间每隔 lease_seconds / 3 续租一次，因此请求可以比租约更长；
+      进程崩溃没来得及归还时不再续租，租约到期后不再占用并发额度
+    - 进程内仍先排队，只有队首请求访问数据库；其他进程归还额度无法唤醒本进程，故按 poll_interval 轮询
+    同一 scope 的所有进程应使用相同的限额配置
+    """
+
+    def __init__(
+        self,
+        path: str,
+        scope: str,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+        lease_seconds: float = 900.0,
+        poll_interval: float = 0.5,
+        window_seconds: float = 60.0,
+        wait_sample_size: int = 1024,
+    )-> None:
+
+        super().__init__(
+            requests_per_minute = requests_per_minute,
+            tokens_per_minute = tokens_per_minute,
+            max_concurrency = max_concurrency,
+            window_seconds = window_seconds,
+            wait_sample_size = wait_sample_size,
+        )
+        self._path: str = path
+        self._scope: str = scope
+        self._lease_seconds: float = lease_seconds
+        self._poll_interval: float = poll_interval
+
+        self._connection_lock: threading.Lock = threading.Lock()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        # 调用方已被取消、仍在归还中的授权，持有引用以免任务被回收
+        self._orphan_release_tasks: Set[asyncio.Task] = set()
+
+
+    @classmethod
+    def from_config(
+        cls,
+        config: Dict[str, Any],
+        path: str = "",
+        scope: str = "",
+    )-> "HostWideRequestScheduler":
+
+        return cls(
+            path = config.get("coordination_path", path),
+            scope = scope,
+            requests_per_minute = config.get("requests_per_minute"),
+            tokens_per_minute = config.get("tokens_per_minute"),
+            max_concurrency = config.get("max_concurrency"),
+            lease_seconds = config.get("lease_seconds", 900.0),
+        )
+
+
+    def get_stats(
+        self,
+    )-> Dict[str, Any]:
+
+        stats = super().get_stats()
+        try:
+            with self._connection_lock:
+                connection = self._ensure_connection()
+                now = time.time()
+                host_in_flight, = connection.execute(
+                    "SELECT COUNT(*) FROM grants WHERE scope = ? AND released = 0 AND lease_until > ?",
+                    (self._scope, now),
+                ).fetchone()
+                host_window_requests, host_window_tokens = connection.execute(
+                    "SELECT COUNT(*), COALESCE(SUM(tokens), 0) FROM grants WHERE scope = ? AND granted_at > ?",
+                    (self._scope, now - self._window_seconds),
+                ).fetchone()
+            stats["host_in_flight"] = host_in_flight
+            stats["host_window_requests"] = host_window_requests
+            stats["host_window_tokens"] = int(host_window_tokens)
+        except sqlite3.Error as error:
+            stats["host_error"] = str(error)
+        return stats
+
+
+    async def _try_grant_async(
+        self,
+        estimated_tokens: int,
+    )-> Tuple[Optional[_SchedulerTicket], float]:
+
+        # 线程中的登记无法中断：调用方被取消时仍等线程结束，若已登记成功则立即归还，否则该授权要占满整个租约
+        grant_future = asyncio.ensure_future(asyncio.to_thread(self._try_grant, estimated_tokens))
+        try:
+            grant_id, wait_seconds = await asyncio.shield(grant_future)
+        except asyncio.CancelledError:
+            grant_future.add_done_callback(self._release_orphan_grant)
+            raise
+        if grant_id is None:
+            return None, min(wait_seconds, self._poll_interval)
+        self._in_flight += 1
+        ticket = _SchedulerTicket(grant_id=grant_id)
+        ticket.lease_renewal = asyncio.create_task(self._renew_lease_async(grant_id))
+        return ticket, 0.0
+
+
+    async def _release_async(
+        self,
+        ticket: _SchedulerTicket,
+    )-> None:
+
+        self._in_flight -= 1
+        if ticket.lease_renewal is not None: ticket.lease_renewal.cancel()
+        try:
+            await asyncio.to_thread(self._release_grant, ticket)
+        finally:
+            self._capacity_released.set()
+
+
+    async def _renew_lease_async(
+        self,
+        grant_id: int,
+    )-> None:
+
+        # 请求可能比租约更长（例如 30 分钟超时的评测请求），租约不能在在途期间过期，否则其他进程会超额放行
+        while True:
+            await asyncio.sleep(self._lease_seconds / 3)
+            try:
+                await asyncio.to_thread(self._renew_grant, grant_id)
+            except sqlite3.Error as error:
+                print(f"[HostWideRequestScheduler] 续租失败: {error}")
+
+
+    def _release_orphan_grant(
+        self,
+        grant_future: asyncio.Future,
+    )-> None:
+
+        if grant_future.cancelled() or grant_future.exception() is not None: return
+        grant_id, _ = grant_future.result()
+        if grant_id is None: return
+        task = asyncio.ensure_future(
+            asyncio.to_thread(self._release_grant, _SchedulerTicket(grant_id=grant_id))
+        )
+        self._orphan_release_tasks.add(task)
+        task.add_done_callback(self._orphan_release_tasks.discard)
+
+
+    def _ensure_connection(
+        self,
+    )-> sqlite3.Connection:
+
+        # fork 出的子进程不能沿用父进程的连接
+        if self._connection is not None and self._connection_pid == os.getpid():
+            return self._connection
+
+        directory = os.path.dirname(self._path)
+        if directory: os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(
+            self._path,
+            timeout = 30.0,
+            isolation_level = None,
+            check_same_thread = False,
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS grants ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "scope TEXT NOT NULL, "
+            "granted_at REAL NOT NULL, "
+            "lease_until REAL NOT NULL, "
+            "tokens REAL NOT NULL, "
+            "released INTEGER NOT NULL DEFAULT 0)"
+        )
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS grants_scope_granted_at ON grants (scope, granted_at)"
+        )
+        self._connection = connection
+        self._connection_pid = os.getpid()
+        return connection
+
+
+    def _try_grant(
+        self,
+        estimated_tokens: int,
+    )-> Tuple[Optional[int], float]:
+
+        with self._connection_lock:
+            connection = self._ensure_connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                # 滑出窗口且已归还（或租约过期）的记录不再影响任何限额
+                connection.execute(
+                    "DELETE FROM grants WHERE scope = ? AND granted_at <= ? AND (released = 1 OR lease_until <= ?)",
+                    (self._scope, now - self._window_seconds, now),
+                )
+                in_flight, = connection.execute(
+                    "SELECT COUNT(*) FROM grants WHERE scope = ? AND released = 0 AND lease_until > ?",
+                    (self._scope, now),
+                ).fetchone()
+                window = connection.execute(
+                    "SELECT granted_at, tokens FROM grants WHERE scope = ? AND granted_at > ? ORDER BY granted_at",
+                    (self._scope, now - self._window_seconds),
+                ).fetchall()
+                wait_seconds = self._seconds_until_capacity(
+                    now = now,
+                    estimated_tokens = estimated_tokens,
+                    window = window,
+                    window_tokens = sum(tokens for _, tokens in window),
+                    in_flight = in_flight,
+                )
+                if wait_seconds > 0.0:
+                    connection.execute("COMMIT")
+                    return None, wait_seconds
+                cursor = connection.execute(
+                    "INSERT INTO grants (scope, granted_at, lease_until, tokens) VALUES (?, ?, ?, ?)",
+                    (self._scope, now, now + self._lease_seconds, float(estimated_tokens)),
+                )
+                connection.execute("COMMIT")
+                return cursor.lastrowid, 0.0
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+
+
+    def _renew_grant(
+        self,
+        grant_id: int,
+    )-> None:
+
+        with self._connection_lock:
+            connection = self._ensure_connection()
+            connection.execute(
+                "UPDATE grants SET lease_until = ? WHERE id = ? AND released = 0",
+                (time.time() + self._lease_seconds, grant_id),
+            )
+
+
+    def _release_grant(
+        self,
+        ticket: _SchedulerTicket,
+    )-> None:
+
+        with self._connection_lock:
+            connection = self._ensure_connection()
+            if ticket.actual_tokens is None:
+                connection.execute(
+                    "UPDATE grants SET released = 1 WHERE id = ?", (ticket.grant_id,)
+                )
+            else:
+                connection.execute(
+                    "UPDATE grants SET released = 1, tokens = ? WHERE id = ?",
+                    (float(ticket.actual_tokens), ticket.grant_id),
+                )
@@ -0,0 +1,165 @@
+import ast
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "make_xml_tag_repair",
+    "make_xml_cdata_repair",
+    "repair_json_code_block",
+    "escape_latex_backslashes",
+]
+
+
+"""
+check_and_accept 拒收后先尝试的本地修复：只做格式层面的补救，不改动内容
+每个修复函数接收原始回复、返回修复后的文本，交由同一个 check_and_accept 再验收一次
+"""
+
+
+# 以 JSON 转义字母 b / f / n / r / t 开头的常见 LaTeX 命令：裸写在 JSON 字符串里时会被误读成退格、换页、换行等控制字符
+_latex_commands_like_json_escapes: Set[str] = {
+    "bar", "beta", "bf", "big", "bigg", "biggl", "biggr", "bigl", "bigr", "binom", "bmod",
+    "boldsymbol", "bot", "boxed", "breve", "bullet", "because", "backslash", "bigcup", "bigcap",
+    "frac", "forall", "flat", "fbox",
+    "nu", "nabla", "ne", "neq", "neg", "not", "ni", "notin", "nonumber", "newline", "nolimits", "nmid", "nearrow", "nwarrow",
+    "rho", "right", "rightarrow", "rightleftharpoons", "rangle", "rbrace", "rbrack", "rceil", "rfloor", "rm", "rvert", "rVert",
+    "tau", "theta", "times", "tan", "tanh", "text", "textbf", "textit", "textrm", "textsf", "texttt", "textstyle",
+    "tfrac", "tbinom", "tilde", "to", "top", "triangle", "therefore", "tag", "tiny",
+}
+_json_escape_pattern = re.compile(r'\\(?:u[0-9a-fA-F]{4}|["\\/]|([bfnrt])([A-Za-z]*)|(.))', re.DOTALL)
+
+
+def _strip_code_fence(
+    text: str,
+)-> str:
+
+    fence_match = re.search(r"```[a-zA-Z]*\s*(.*?)(?:```|$)", text, re.DOTALL)
+    if fence_match is None: return text
+    return fence_match.group(1)
+
+
+def make_xml_tag_repair(
+    tag: str,
+)-> Callable[[str], str]:
+
+    """
+    修复 <tag>...</tag> 外层包装：去掉代码块围栏，补上缺失的起始或结束标签
+    """
+
+    def repair(
+        response: str,
+    )-> str:
+
+        text = _strip_code_fence(response).strip()
+        has_begin = re.search(f"<{tag}>", text, re.IGNORECASE) is not None
+        has_end = re.search(f"</{tag}>", text, re.IGNORECASE) is not None
+        if has_begin and has_end: return text
+        if has_begin:
+            return f"{text}</{tag}>" if "<![CDATA[" not in text or "]]>" in text else f"{text}]]></{tag}>"
+        if has_end:
+            return f"<{tag}>{text}"
+        return f"<{tag}>{text}</{tag}>"
+
+    return repair
+
+
+def make_xml_cdata_repair(
+    root_tag: str,
+    field_tags: List[str],
+)-> Callable[[str], str]:
+
+    """
+    修复严格 XML 解析失败的常见原因：字段文本里出现裸的 < 或 &
+    把 root_tag 内各字段的内容包进 CDATA，并补上缺失的根结束标签
+    """
+
+    def repair(
+        response: str,
+    )-> str:
+
+        text = make_xml_tag_repair(root_tag)(response)
+        for field_tag in field_tags:
+            def wrap_in_cdata(match: re.Match)-> str:
+                content = match.group(1)
+                if content.strip().startswith("<![CDATA["): return match.group(0)
+                content = content.replace("]]>", "]]]]><![CDATA[>")
+                return f"<{field_tag}><![CDATA[{content}]]></{field_tag}>"
+            text = re.sub(
+                f"<{field_tag}>(.*?)</{field_tag}>",
+                wrap_in_cdata,
+                text,
+                flags = re.DOTALL,
+            )
+        return text
+
+    return repair
+
+
+def escape_latex_backslashes(
+    text: str,
+)-> Optional[str]:
+
+    """
+    把 JSON 文本中裸写的 LaTeX 反斜杠加倍，使 \\frac、\\theta、\\nu 等解析后原样保留，而不是变成控制字符
+    - 文本中没有裸写 LaTeX 的迹象（非法转义或常见 LaTeX 命令）时原样返回，合法的 \\n 等转义照常生效
+    - 有迹象时：非法转义与 LaTeX 命令前的反斜杠加倍；\\n 等后面跟非字母或大写字母时仍视为控制字符
+    - \\n 等后面跟着不认识的小写单词时无法判断是换行还是 LaTeX，返回 None，调用方应拒收而不是猜测
+    """
+
+    matches = list(_json_escape_pattern.finditer(text))
+
+    def is_latex(
+        match: re.Match,
+    )-> bool:
+        if match.group(3) is not None: return True
+        return match.group(1) is not None and match.group(1) + match.group(2) in _latex_commands_like_json_escapes
+
+    if not any(is_latex(match) for match in matches): return text
+
+    pieces: List[str] = []
+    last_index = 0
+    for match in matches:
+        if is_latex(match):
+            pieces.append(text[last_index : match.start()])
+            pieces.append("\\\\")
+            last_index = match.start() + 1
+        elif match.group(1) is not None and match.group(2) and match.group(2)[0].islower():
+            return None
+    pieces.append(text[last_index:])
+    return "".join(pieces)
+
+
+def repair_json_code_block(
+    response: str,
+)-> str:
+
+    """
+    宽松解析 JSON 回复，成功时重新输出为标准的 ```json 代码块
+    依次处理：围栏缺失或未闭合、首尾多余文本、裸写的 LaTeX 反斜杠（见 escape_latex_backslashes）、尾随逗号、Python 字面量写法
+    反斜杠无法判断含义时不做修复，原样返回
+    """
+
+    text = _strip_code_fence(response)
+    begin_index = text.find("{")
+    end_index = text.rfind("}")
+    if begin_index == -1 or end_index <= begin_index: return response
+    escaped_text = escape_latex_backslashes(text[begin_index : end_index + 1])
+    if escaped_text is None: return response
+
+    without_trailing_commas = re.sub(r",\s*([}\]])", r"\1", escaped_text)
+    candidates = [escaped_text, without_trailing_commas]
+
+    for candidate in candidates:
+        try:
+            json_object = json.loads(candidate)
+            break
+        except json.JSONDecodeError:
+            continue
+    else:
+        try:
+            json_object = ast.literal_eval(without_trailing_commas)
+        except (ValueError, SyntaxError):
+            return response
+
+    return f"```json\n{json.dumps(json_object, ensure_ascii=False, indent=4)}\n```"
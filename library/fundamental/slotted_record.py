@@ -0,0 +1,120 @@
+from collections.abc import MutableMapping
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "SlottedRecord",
+]
+
+
+class SlottedRecord(MutableMapping):
+
+    """
+    以 __slots__ 存储字段的紧凑记录，替代大量常驻内存、键集合固定的字典
+    同时提供 dict 风格的映射视图（record["key"]、get、items、in、update ...），既有处理函数无需改动
+    - 子类在 __slots__ 中声明字段，在 _field_defaults 中给出缺省值
+    - 缺省值若为可调用对象（如 list、asyncio.Lock）则视为工厂，每个实例各调用一次；不可变的缺省值直接共享
+    - 字段集合固定：读写未声明的字段抛 KeyError，不支持删除字段
+    """
+
+    __slots__ = ()
+
+    _field_defaults: Dict[str, Any] = {}
+    _field_names: Tuple[str, ...] = ()
+
+    def __init_subclass__(
+        cls,
+        **kwargs: Any,
+    )-> None:
+
+        super().__init_subclass__(**kwargs)
+        field_names: List[str] = []
+        for klass in reversed(cls.__mro__):
+            slots = klass.__dict__.get("__slots__", ())
+            if isinstance(slots, str): slots = (slots,)
+            for slot_name in slots:
+                if not slot_name.startswith("__") and slot_name not in field_names:
+                    field_names.append(slot_name)
+        cls._field_names = tuple(field_names)
+
+
+    def __init__(
+        self,
+        **fields: Any,
+    )-> None:
+
+        for field_name in self._field_names:
+            if field_name in fields:
+                value = fields.pop(field_name)
+            else:
+                default = self._field_defaults.get(field_name)
+                value = default() if callable(default) else default
+            object.__setattr__(self, field_name, value)
+        if fields:
+            raise TypeError(
+                f"{type(self).__name__} 不支持字段: {', '.join(fields)}"
+            )
+
+
+    def __getitem__(
+        self,
+        key: str,
+    )-> Any:
+
+        if key not in self._field_names: raise KeyError(key)
+        return getattr(self, key)
+
+
+    def __setitem__(
+        self,
+        key: str,
+        value: Any,
+    )-> None:
+
+        if key not in self._field_names: raise KeyError(key)
+        setattr(self, key, value)
+
+
+    def __delitem__(
+        self,
+        key: str,
+    )-> None:
+
+        raise TypeError(f"{type(self).__name__} 的字段不可删除: {key}")
+
+
+    def __iter__(
+        self,
+    )-> Iterator[str]:
+
+        return iter(self._field_names)
+
+
+    def __len__(
+        self,
+    )-> int:
+
+        return len(self._field_names)
+
+
+    def __contains__(
+        self,
+        key: object,
+    )-> bool:
+
+        return key in self._field_names
+
+
+    def to_dict(
+        self,
+    )-> Dict[str, Any]:
+
+        return {field_name: getattr(self, field_name) for field_name in self._field_names}
+
+
+    def __repr__(
+        self,
+    )-> str:
+
+        return f"{type(self).__name__}({self.to_dict()!r})"
@@ -0,0 +1,120 @@
+from .typing import *
+from .externals import *
+from .response_repair_tools import *
+
+
+__all__ = [
+    "build_json_schema_response_format",
+    "parse_json_response",
+    "validate_json_schema",
+]
+
+
+def build_json_schema_response_format(
+    schema: Dict[str, Any],
+    name: str = "response",
+)-> Dict[str, Any]:
+
+    """
+    OpenAI 兼容接口的 response_format 参数；strict 模式下服务商会按 schema 约束解码
+    """
+
+    return {
+        "type": "json_schema",
+        "json_schema": {
+            "name": name,
+            "schema": schema,
+            "strict": True,
+        },
+    }
+
+
+def parse_json_response(
+    response: str,
+)-> Any:
+
+    """
+    解析模型回复中的 JSON：原生结构化输出时回复本身就是 JSON，
+    否则可能带有代码块围栏或格式瑕疵，交给 repair_json_code_block 宽松解析
+    两种情况都先处理裸写的 LaTeX 反斜杠（见 escape_latex_backslashes），\\frac 等不会被解析成控制字符
+    解析失败或反斜杠无法判断含义时抛出 ValueError
+    """
+
+    escaped_response = escape_latex_backslashes(response)
+    if escaped_response is None:
+        raise ValueError("回复中的反斜杠无法判断是 JSON 转义还是 LaTeX 命令")
+    try:
+        return json.loads(escaped_response)
+    except json.JSONDecodeError:
+        pass
+    repaired_response = repair_json_code_block(response)
+    if repaired_response == response:
+        raise ValueError("回复中没有可解析的 JSON 对象")
+    fence_match = re.search(r"```json\s*(.*?)\s*```", repaired_response, re.DOTALL)
+    assert fence_match is not None
+    return json.loads(fence_match.group(1))
+
+
+_json_schema_type_checkers: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda value: isinstance(value, dict),
+    "array": lambda value: isinstance(value, list),
+    "string": lambda value: isinstance(value, str),
+    "integer": lambda value: isinstance(value, int) and not isinstance(value, bool),
+    "number": lambda value: isinstance(value, (int, float)) and not isinstance(value, bool),
+    "boolean": lambda value: isinstance(value, bool),
+    "null": lambda value: value is None,
+}
+
+
+def validate_json_schema(
+    value: Any,
+    schema: Dict[str, Any],
+    path: str = "$",
+)-> List[str]:
+
+    """
+    本地 JSON Schema 校验（服务商不支持结构化输出时的兜底），返回错误列表，空列表表示通过
+    只覆盖结构化输出常用的子集：type / properties / required / additionalProperties /
+    items / enum / minLength / maxLength / minimum / maximum
+    """
+
+    errors: List[str] = []
+
+    expected_type = schema.get("type")
+    if expected_type is not None:
+        expected_types = [expected_type] if isinstance(expected_type, str) else list(expected_type)
+        if not any(_json_schema_type_checkers[type_name](value) for type_name in expected_types):
+            errors.append(f"{path}: 应为 {'/'.join(expected_types)}，实际为 {type(value).__name__}")
+            return errors
+
+    if "enum" in schema and value not in schema["enum"]:
+        errors.append(f"{path}: {value!r} 不在可选值 {schema['enum']} 中")
+
+    if isinstance(value, str):
+        if "minLength" in schema and len(value) < schema["minLength"]:
+            errors.append(f"{path}: 长度 {len(value)} 小于 {schema['minLength']}")
+        if "maxLength" in schema and len(value) > schema["maxLength"]:
+            errors.append(f"{path}: 长度 {len(value)} 大于 {schema['maxLength']}")
+
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if "minimum" in schema and value < schema["minimum"]:
+            errors.append(f"{path}: {value} 小于 {schema['minimum']}")
+        if "maximum" in schema and value > schema["maximum"]:
+            errors.append(f"{path}: {value} 大于 {schema['maximum']}")
+
+    if isinstance(value, dict):
+        properties: Dict[str, Any] = schema.get("properties", {})
+        for key in schema.get("required", []):
+            if key not in value:
+                errors.append(f"{path}: 缺少字段 {key}")
+        for key, item in value.items():
+            if key in properties:
+                errors.extend(validate_json_schema(item, properties[key], f"{path}.{key}"))
+            elif schema.get("additionalProperties", True) is False:
+                errors.append(f"{path}: 不允许的字段 {key}")
+
+    if isinstance(value, list) and "items" in schema:
+        for index, item in enumerate(value):
+            errors.extend(validate_json_schema(item, schema["items"], f"{path}[{index}]"))
+
+    return errors
@@ -0,0 +1,98 @@
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "TaskGraph",
+]
+
+
+class TaskGraph:
+
+    """
+    小型异步依赖图：节点是协程函数，所依赖的节点全部成功后立即启动，互不依赖的节点并发执行
+    - 节点函数以依赖节点的名称为关键字参数接收它们的结果，因此节点名应是合法的标识符
+    - 某个节点抛出异常时，只有（直接或间接）依赖它的节点被跳过，其余节点照常执行完毕
+    - run_async 返回成功节点的结果；失败节点的异常记在 errors 中，被跳过的节点记在 skipped 中
+    - 每个节点相对 run_async 开始时刻的起止时间记在 timings 中，format_timings 给出便于打印的摘要
+    每个 TaskGraph 实例只运行一次
+    """
+
+    def __init__(
+        self,
+        name: str,
+    )-> None:
+
+        self.name: str = name
+        self._nodes: Dict[str, Tuple[Callable[..., Awaitable[Any]], Tuple[str, ...]]] = {}
+
+        self.results: Dict[str, Any] = {}
+        self.errors: Dict[str, BaseException] = {}
+        self.skipped: List[str] = []
+        self.timings: Dict[str, Tuple[float, float]] = {}
+        self.total_seconds: Optional[float] = None
+
+
+    def add_node(
+        self,
+        name: str,
+        func: Callable[..., Awaitable[Any]],
+        dependencies: Sequence[str] = (),
+    )-> None:
+
+        if name in self._nodes:
+            raise ValueError(f"[TaskGraph] 节点 {name} 重复定义")
+        for dependency in dependencies:
+            if dependency not in self._nodes:
+                raise ValueError(f"[TaskGraph] 节点 {name} 依赖的 {dependency} 尚未定义，请按拓扑序添加节点")
+        self._nodes[name] = (func, tuple(dependencies))
+
+
+    async def run_async(
+        self,
+    )-> Dict[str, Any]:
+
+        start_time = time.perf_counter()
+        tasks: Dict[str, asyncio.Task] = {}
+
+        async def run_node(
+            name: str,
+        )-> Any:
+
+            func, dependencies = self._nodes[name]
+            for dependency in dependencies:
+                try:
+                    await tasks[dependency]
+                except BaseException:
+                    self.skipped.append(name)
+                    raise
+            node_start = time.perf_counter() - start_time
+            try:
+                result = await func(**{dependency: self.results[dependency] for dependency in dependencies})
+            except BaseException as error:
+                self.errors[name] = error
+                raise
+            finally:
+                self.timings[name] = (node_start, time.perf_counter() - start_time)
+            self.results[name] = result
+            return result
+
+        # 节点按拓扑序添加，依赖的任务总是先于当前任务创建
+        for name in self._nodes:
+            tasks[name] = asyncio.create_task(run_node(name))
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        self.total_seconds = time.perf_counter() - start_time
+        return self.results
+
+
+    def format_timings(
+        self,
+    )-> str:
+
+        parts = [
+            f"{name} {start:.2f}->{end:.2f}s"
+            for name, (start, end) in sorted(self.timings.items(), key=lambda item: item[1][0])
+        ]
+        parts.extend(f"{name} 跳过" for name in self.skipped)
+        total = f"{self.total_seconds:.2f}s" if self.total_seconds is not None else "未完成"
+        return f"[TaskGraph] {self.name} 共 {total}: " + "，".join(parts)
@@ -0,0 +1,103 @@
+from .typing import *
+from .externals import *
+
+
+__all__ = [
+    "TicketSequencer",
+]
+
+
+class TicketSequencer:
+
+    """
+    按票号顺序放行的异步临界区，用于让并发产生的结果按领取顺序落地（例如按解答编号追加云文档）
+    - take_ticket 同步领取递增票号；领号的顺序就是放行的顺序
+    - async with sequencer.turn(ticket) 等前面的票号全部离开临界区后进入
+    - 每个票号都必须用 turn 兑现或用 skip 放弃，否则后面的票号会一直等待
+    - 临界区内抛出异常照常放行下一位；在 turn 的等待中被取消的票号自动放弃
+    只应在同一个事件循环中使用
+    """
+
+    __slots__ = ("_next_ticket", "_serving", "_waiters", "_abandoned")
+
+    def __init__(
+        self,
+    )-> None:
+
+        self._next_ticket: int = 0
+        self._serving: int = 0
+        self._waiters: Dict[int, asyncio.Event] = {}
+        self._abandoned: Set[int] = set()
+
+
+    def take_ticket(
+        self,
+    )-> int:
+
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        return ticket
+
+
+    @contextlib.asynccontextmanager
+    async def turn(
+        self,
+        ticket: int,
+    )-> AsyncIterator[None]:
+
+        if ticket != self._serving:
+            waiter = self._waiters.setdefault(ticket, asyncio.Event())
+            try:
+                await waiter.wait()
+            except BaseException:
+                self._abandon(ticket)
+                raise
+        try:
+            yield
+        finally:
+            self._advance()
+
+
+    def skip(
+        self,
+        ticket: int,
+    )-> None:
+
+        """
+        放弃尚未进入临界区的票号，例如领号之后、轮到之前出错或被取消
+        """
+
+        self._abandon(ticket)
+
+
+    @property
+    def pending_num(
+        self,
+    )-> int:
+
+        return self._next_ticket - self._serving
+
+
+    def _abandon(
+        self,
+        ticket: int,
+    )-> None:
+
+        self._waiters.pop(ticket, None)
+        # 取消与放行可能同时发生：轮到自己时直接让给下一位
+        if ticket == self._serving:
+            self._advance()
+        else:
+            self._abandoned.add(ticket)
+
+
+    def _advance(
+        self,
+    )-> None:
+
+        self._serving += 1
+        while self._serving in self._abandoned:
+            self._abandoned.discard(self._serving)
+            self._serving += 1
+        waiter = self._waiters.pop(self._serving, None)
+        if waiter is not None: waiter.set()
@@ -1,7 +1,9 @@
 from typing import Any
 from typing import cast
 from typing import Dict
+from typing import Deque
 from typing import List
+from typing import Set
 from typing import Type
 from typing import Tuple
 from typing import Union
@@ -10,15 +12,20 @@ from typing import Literal
 from typing import Callable
 from typing import Hashable
 from typing import Optional
+from typing import Sequence
+from typing import Iterator
 from typing import Awaitable
 from typing import Coroutine
+from typing import AsyncIterator
 
 
 __all__ = [
     "Any",
     "cast",
     "Dict",
+    "Deque",
     "List",
+    "Set",
     "Type",
     "Tuple",
     "Union",
@@ -27,6 +34,9 @@ __all__ = [
     "Callable",
     "Hashable",
     "Optional",
+    "Sequence",
+    "Iterator",
     "Awaitable",
     "Coroutine",
+    "AsyncIterator",
 ]
\ No newline at end of file
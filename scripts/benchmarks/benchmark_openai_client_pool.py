@@ -0,0 +1,125 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from openai import AsyncOpenAI
+from library import *
+
+
+"""
+在本地桩服务器上对比两种客户端用法：
+    - fresh：每次请求新建 AsyncOpenAI（旧版 _get_answer_raw_async 的做法）
+    - pooled：get_async_openai_client 复用客户端与 httpx 连接池
+统计总耗时、单请求耗时与服务端实际接受的 TCP 连接数
+"""
+
+
+request_num = 500
+concurrency = 20
+
+
+_stub_response_body = serialize_json({
+    "id": "chatcmpl-stub",
+    "object": "chat.completion",
+    "created": 0,
+    "model": "stub-model",
+    "choices": [{
+        "index": 0,
+        "message": {"role": "assistant", "content": "pong"},
+        "finish_reason": "stop",
+    }],
+    "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+}).encode("UTF-8")
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    accepted_connections: int = 0
+    accepted_connections_lock = threading.Lock()
+
+    def setup(self)-> None:
+        super().setup()
+        with _StubHandler.accepted_connections_lock:
+            _StubHandler.accepted_connections += 1
+
+    def do_POST(self)-> None:
+        content_length = int(self.headers.get("Content-Length", 0))
+        self.rfile.read(content_length)
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(_stub_response_body)))
+        self.end_headers()
+        self.wfile.write(_stub_response_body)
+
+    def log_message(self, format: str, *args: Any)-> None:
+        pass
+
+
+async def _request_once(
+    client: AsyncOpenAI,
+)-> None:
+
+    await client.chat.completions.create(
+        model = "stub-model",
+        messages = [{"role": "user", "content": "ping"}],
+        timeout = 30,
+    )
+
+
+async def _run_mode(
+    mode: Literal["fresh", "pooled"],
+    base_url: str,
+)-> Tuple[float, int]:
+
+    semaphore = asyncio.Semaphore(concurrency)
+    with _StubHandler.accepted_connections_lock:
+        _StubHandler.accepted_connections = 0
+
+    async def one_request()-> None:
+        async with semaphore:
+            if mode == "fresh":
+                client = AsyncOpenAI(api_key="stub", base_url=base_url, timeout=30)
+                try:
+                    await _request_once(client)
+                finally:
+                    await client.close()
+            else:
+                client = get_async_openai_client(
+                    api_key = "stub",
+                    base_url = base_url,
+                )
+                await _request_once(client)
+
+    start_time = time.perf_counter()
+    await asyncio.gather(*[one_request() for _ in range(request_num)])
+    elapsed_seconds = time.perf_counter() - start_time
+    return elapsed_seconds, _StubHandler.accepted_connections
+
+
+async def main():
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+    server.daemon_threads = True
+    server_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    server_thread.start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    # 预热，排除 import 与首次解析等一次性开销；随后关闭连接池，pooled 一行只统计它自己建立的连接
+    await _run_mode("pooled", base_url)
+    await close_openai_clients_async()
+
+    print(f"{request_num} 次请求，并发 {concurrency}")
+    print(f"{'Mode':<8} | {'Total (s)':<10} | {'Per request (ms)':<17} | {'TCP connections':<15}")
+    print("-" * 60)
+    for mode in ["fresh", "pooled"]:
+        elapsed_seconds, connections = await _run_mode(mode, base_url) # type: ignore
+        print(f"{mode:<8} | {elapsed_seconds:<10.3f} | {elapsed_seconds / request_num * 1000:<17.2f} | {connections:<15}")
+
+    await close_openai_clients_async()
+    server.shutdown()
+
+    print("Program OK.")
+
+
+if __name__ == "__main__":
+
+    asyncio.run(main())
@@ -0,0 +1,74 @@
+from library import *
+
+
+"""
+对比两种话题上下文的单条消息开销：
+    - deepcopy：每条消息 deepcopy 整个字典再追加（旧版 ParallelThreadChatBot / AccumulatorBot 的做法）
+    - snapshot：ThreadContext 的不可变快照，append 结构共享历史日志
+在已有不同长度历史的话题上统计新增一批消息的平均耗时，snapshot 应与话题长度无关
+"""
+
+
+thread_lengths = [100, 1000, 10000]
+measured_message_num = 100
+message_text = "请帮我推导一下这个积分的结果，并给出每一步的理由。" * 4
+
+
+def _run_deepcopy(
+    thread_length: int,
+)-> float:
+
+    # 直接构造出已有 thread_length 轮的历史，只对新增的一批消息计时
+    context: Dict[str, Any] = {
+        "is_accepted": True,
+        "history": {
+            "prompt": [message_text] * (2 * thread_length),
+            "images": [(f"om_{index}", f"img_{index}") for index in range(thread_length)],
+        },
+    }
+    start_time = time.perf_counter()
+    for index in range(measured_message_num):
+        context = deepcopy(context)
+        context["history"]["prompt"].append(message_text)
+        context["history"]["images"].append((f"om_new_{index}", f"img_new_{index}"))
+        context["history"]["prompt"].append(message_text)
+    return (time.perf_counter() - start_time) / measured_message_num
+
+
+def _run_snapshot(
+    thread_length: int,
+)-> float:
+
+    context = ThreadContext.create(
+        log_fields = ["history_prompt", "history_images"],
+        is_accepted = True,
+    )
+    context = context.append("history_prompt", *([message_text] * (2 * thread_length)))
+    context = context.append(
+        "history_images",
+        *[(f"om_{index}", f"img_{index}") for index in range(thread_length)],
+    )
+    start_time = time.perf_counter()
+    for index in range(measured_message_num):
+        context = context.append("history_prompt", message_text)
+        context = context.append("history_images", (f"om_new_{index}", f"img_new_{index}"))
+        context = context.append("history_prompt", message_text)
+    return (time.perf_counter() - start_time) / measured_message_num
+
+
+def main():
+
+    print(f"每个话题长度统计新增 {measured_message_num} 条消息的平均上下文更新耗时")
+    print(f"{'Thread length':<14} | {'deepcopy (us)':<14} | {'snapshot (us)':<14}")
+    print("-" * 48)
+    for thread_length in thread_lengths:
+        deepcopy_seconds = _run_deepcopy(thread_length)
+        snapshot_seconds = _run_snapshot(thread_length)
+        print(f"{thread_length:<14} | {deepcopy_seconds * 1e6:<14.1f} | {snapshot_seconds * 1e6:<14.1f}")
+
+    print("Program OK.")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,183 @@
+import tracemalloc
+from library import *
+
+
+"""
+对比 PkuPhyFermionBot 话题状态的两种存储方式在 topic_num 个缓存话题下的内存占用：
+    - dict：旧版的字典上下文、字典 trial 与字典墓碑
+    - slots：FermionTopicContext / FermionTrialRecord / FermionTopicTombstone 与 ParsedMessage
+每个话题包含一条根消息的解析结果与 trial_num 条 trial；字段内容本身在两种方式间共享，只比较容器开销
+"""
+
+
+topic_num = 10000
+trial_num = 2
+
+
+_problem_text = "一质量为 m 的小球从高 h 处自由下落，求落地时的速度。"
+_document_content = "由机械能守恒，v = sqrt(2 g h)。"
+
+
+def _build_dict_topic(
+    index: int,
+)-> Tuple[Dict[str, Any], Dict[str, Any]]:
+
+    parsed_message = {
+        "success": True,
+        "message_type": "simple_message",
+        "message_id": f"om_{index}",
+        "thread_root_id": f"om_{index}",
+        "is_thread_root": True,
+        "chat_type": "group",
+        "sender": "ou_sender",
+        "text": _problem_text,
+        "image_keys": [],
+        "hyperlinks": [],
+        "mentioned_me": True,
+        "message_content_dict": None,
+    }
+    context = {
+        "is_tombstone": False,
+        "lock": asyncio.Lock(),
+        "thread_root_id": f"om_{index}",
+        "is_accepted": True,
+        "owner": "ou_sender",
+        "history": {"prompt": [_problem_text], "images": [], "roles": ["user"]},
+        "problem_no": index,
+        "problem_text": _problem_text,
+        "problem_images": [],
+        "problem_message_id": f"om_{index}",
+        "answer": "sqrt(2 g h)",
+        "document_created": True,
+        "document_id": f"doc_{index}",
+        "document_title": f"题目 {index}",
+        "document_url": f"https://example.feishu.cn/docx/doc_{index}",
+        "document_block_num": 0,
+        "trials": [
+            {
+                "workflow": "straight_forwarding",
+                "status": "success",
+                "start_time": "2025-01-01 00:00:00",
+                "end_time": "2025-01-01 00:01:00",
+                "document_content": _document_content,
+                "response": _document_content,
+                "rendered_response": _document_content,
+            }
+            for _ in range(trial_num)
+        ],
+        "running_workflows": 0,
+        "is_archived": False,
+    }
+    return context, parsed_message
+
+
+def _build_slotted_topic(
+    index: int,
+)-> Tuple[FermionTopicContext, ParsedMessage]:
+
+    parsed_message = ParsedMessage(
+        success = True,
+        message_type = "simple_message",
+        message_id = f"om_{index}",
+        thread_root_id = f"om_{index}",
+        is_thread_root = True,
+        chat_type = "group",
+        sender = "ou_sender",
+        text = _problem_text,
+        image_keys = [],
+        hyperlinks = [],
+        mentioned_me = True,
+    )
+    context = FermionTopicContext(
+        thread_root_id = f"om_{index}",
+        is_accepted = True,
+        owner = "ou_sender",
+        problem_no = index,
+        problem_text = _problem_text,
+        problem_images = [],
+        problem_message_id = f"om_{index}",
+        answer = "sqrt(2 g h)",
+        document_created = True,
+        document_id = f"doc_{index}",
+        document_title = f"题目 {index}",
+        document_url = f"https://example.feishu.cn/docx/doc_{index}",
+        document_block_num = 0,
+    )
+    context["history"]["prompt"].append(_problem_text)
+    context["history"]["roles"].append("user")
+    for _ in range(trial_num):
+        context["trials"].append(FermionTrialRecord.from_workflow_result(
+            workflow = "straight_forwarding",
+            status = "success",
+            start_time = "2025-01-01 00:00:00",
+            end_time = "2025-01-01 00:01:00",
+            workflow_result = {
+                "document_content": _document_content,
+                "response": _document_content,
+                "rendered_response": _document_content,
+            },
+        ))
+    return context, parsed_message
+
+
+def _build_dict_tombstone(
+    index: int,
+)-> Dict[str, Any]:
+
+    return {
+        "is_tombstone": True,
+        "problem_no": index,
+        "document_title": f"题目 {index}",
+        "document_url": f"https://example.feishu.cn/docx/doc_{index}",
+        "is_archived": True,
+        "trials": [],
+        "history": {},
+    }
+
+
+def _build_slotted_tombstone(
+    index: int,
+)-> FermionTopicTombstone:
+
+    return FermionTopicTombstone(
+        problem_no = index,
+        document_title = f"题目 {index}",
+        document_url = f"https://example.feishu.cn/docx/doc_{index}",
+    )
+
+
+def _measure_bytes_per_item(
+    builder: Callable[[int], Any],
+)-> float:
+
+    tracemalloc.start()
+    baseline_bytes, _ = tracemalloc.get_traced_memory()
+    items = [builder(index) for index in range(topic_num)]
+    current_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return (current_bytes - baseline_bytes) / topic_num
+
+
+def main():
+
+    print(f"{topic_num} 个话题，每个话题 {trial_num} 条 trial")
+    print(f"{'Kind':<10} | {'dict (B/topic)':<15} | {'slots (B/topic)':<15} | {'Saving':<8}")
+    print("-" * 58)
+    for kind, dict_builder, slotted_builder in [
+        ("topic", _build_dict_topic, _build_slotted_topic),
+        ("tombstone", _build_dict_tombstone, _build_slotted_tombstone),
+    ]:
+        dict_bytes = _measure_bytes_per_item(dict_builder)
+        slotted_bytes = _measure_bytes_per_item(slotted_builder)
+        print(
+            f"{kind:<10} | {dict_bytes:<15.0f} | {slotted_bytes:<15.0f} | "
+            f"{1 - slotted_bytes / dict_bytes:<8.1%}"
+        )
+
+    print("Program OK.")
+
+
+if __name__ == "__main__":
+
+    main()
@@ -0,0 +1,39 @@
+from library import *
+
+
+r"""
+检查 repair_json_code_block / parse_json_response 不会把裸写的 LaTeX 命令误读成 JSON 控制字符转义
+（\frac 中的 \f 是换页符，\theta 中的 \t 是制表符，\nu 中的 \n 是换行符）
+"""
+
+
+def parse_repaired(
+    response: str,
+)-> Optional[Dict[str, Any]]:
+
+    repaired_response = repair_json_code_block(response)
+    if repaired_response == response: return None
+    fence_match = re.search(r"```json\s*(.*?)\s*```", repaired_response, re.DOTALL)
+    assert fence_match is not None
+    return json.loads(fence_match.group(1))
+
+
+def main():
+
+    latex_response = r'```json' + "\n" + r'{"a": "\frac{1}{2}", "b": "\theta", "c": "\nu",}' + "\n```"
+    expected = {"a": r"\frac{1}{2}", "b": r"\theta", "c": r"\nu"}
+    assert parse_repaired(latex_response) == expected, parse_repaired(latex_response)
+    assert parse_json_response(latex_response) == expected
+    assert parse_json_response(r'{"a": "\frac{1}{2}", "b": "\theta", "c": "\nu"}') == expected
+
+    # 合法的换行转义照常生效，无法判断含义时拒收
+    assert parse_repaired(r'{"a": "x\n\nThe \frac{1}{2}",}') == {"a": "x\n\nThe " + r"\frac{1}{2}"}
+    assert parse_repaired(r'{"a": "line\nthen \frac{1}{2}"}') is None
+    assert parse_json_response(r'{"a": "line\nthen"}') == {"a": "line\nthen"}
+
+    print("Program OK.")
+
+
+if __name__ == "__main__":
+
+    main()
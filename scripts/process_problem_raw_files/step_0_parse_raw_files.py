@@ -20,9 +20,6 @@ async def parse_pdf_to_problems(
     trial_num = 20
     trial_interval = 5
     
-    # 对 yunwu 温柔一点
-    await asyncio.sleep(random.uniform(5, 10))
-
     vlm_input_placeholder = "<image_page_input>" 
     output_image_token = "<image>"
 
@@ -153,6 +150,7 @@ Please generate the JSON List now.
         trial_num = trial_num,
         trial_interval = trial_interval,
         check_and_accept = check_and_accept,
+        call_site = "parse_pdf_to_problems",
     )
 
     return final_result
@@ -235,6 +233,8 @@ async def main():
     print(f"All done. Total problems processed: {global_problem_count}")
     print(f"Please check '{output_base_path}' and manually add images.")
     
+    await close_openai_clients_async()
+    
     print("Program OK.")
 
 
@@ -72,7 +72,12 @@ async def rollout_coroutine(
         ))
     
     rollout_result = await run_tasks_concurrently_async(
-        task = get_answer_async,
+        # 30 分钟超时下长尾极重，开启对冲：超过 P95 延迟仍未返回就换实例补发，额外开销不超过 10%
+        task = partial(
+            get_answer_async,
+            hedging_percentile = 0.95,
+            hedging_max_extra_cost_ratio = 0.1,
+        ),
         task_indexers = task_indexers,
         task_inputs = task_inputs,
         progress_bar_description = f"{model} rollout 中...",
@@ -118,6 +123,73 @@ async def eval_coroutine(
     return None
 
 
+def report_local_verifier_agreement(
+)-> None:
+    
+    """
+    在 HET bench 上统计本地答案比对（HET_local_verify）的命中率，以及命中时与 AI 裁判员打分的一致率
+    eval 阶段仍对每道题调用 AI 裁判员，作为比较的基准
+    """
+    
+    print("\n" + "="*40)
+    print("本地答案比对 vs AI 裁判员")
+    print("="*40)
+    
+    total_count = 0
+    decided_count = 0
+    agreed_count = 0
+    for model in model_to_api_setting_name:
+        if model not in eval_results:
+            continue
+        model_total_count = 0
+        model_decided_count = 0
+        model_agreed_count = 0
+        model_disagreements = []
+        for problem in HET_bench_problems:
+            question_id = problem["question_id"]
+            model_result = eval_results[model].get(question_id)
+            response = rollout_results[model].get(question_id)
+            if not isinstance(model_result, dict) or "score" not in model_result:
+                continue
+            # 没有解答记录的题不计入命中率，否则会被算作本地无法判定
+            if not isinstance(response, str):
+                continue
+            model_total_count += 1
+            local_result = HET_local_verify(
+                problem = problem["question"],
+                answer = problem["answer"],
+                response = response,
+            )
+            if local_result["verdict"] == "undecided":
+                continue
+            model_decided_count += 1
+            if abs(local_result["score"] - model_result["score"]) <= 0.1:
+                model_agreed_count += 1
+            else:
+                model_disagreements.append((question_id, local_result["score"], model_result["score"]))
+        
+        total_count += model_total_count
+        decided_count += model_decided_count
+        agreed_count += model_agreed_count
+        if not model_total_count:
+            continue
+        print(
+            f"{model}: 本地判定 {model_decided_count}/{model_total_count} 题"
+            f"（命中率 {model_decided_count / model_total_count:.1%}），"
+            f"与 AI 裁判员一致 {model_agreed_count}/{model_decided_count} 题"
+            + (f"（一致率 {model_agreed_count / model_decided_count:.1%}）" if model_decided_count else "")
+        )
+        for question_id, local_score, model_score in model_disagreements:
+            print(f"    不一致：{question_id} 本地 {local_score:.1f} / AI 裁判员 {model_score:.1f}")
+    
+    if total_count:
+        print(
+            f"合计：命中率 {decided_count / total_count:.1%}"
+            + (f"，一致率 {agreed_count / decided_count:.1%}" if decided_count else "")
+        )
+    print("="*40 + "\n")
+
+
 async def upload_model_answer_sheet(
     model: str,
     lark_bot: LarkBot,
@@ -347,8 +419,33 @@ async def main():
         print(f"{rank:<5} | {model_name:<30} | {score:.1f}")
     print("="*40 + "\n")
     
+    report_local_verifier_agreement()
+    
+    response_cache_stats = get_response_cache_stats()
+    print(
+        f"LLM 回复缓存：命中 {response_cache_stats['hits']} 次，未命中 {response_cache_stats['misses']} 次，"
+        f"命中率 {response_cache_stats['hit_rate']:.1%}"
+    )
+    for call_site, call_site_stats in get_call_site_stats().items():
+        print(
+            f"{call_site}: {call_site_stats.get('calls', 0)} 次调用，"
+            f"平均 {call_site_stats['attempts_per_call']:.2f} 次尝试，拒收率 {call_site_stats['rejection_rate']:.1%}"
+        )
+    for model_name, prompt_cache_stats in get_prompt_cache_stats().items():
+        print(
+            f"{model_name} 提示词缓存：输入 {prompt_cache_stats['prompt_tokens']} tokens，"
+            f"命中 {prompt_cache_stats['cached_tokens']} tokens ({prompt_cache_stats['cached_token_rate']:.1%})"
+        )
+    for base_url, scheduler_stats in get_provider_scheduler_stats().items():
+        print(
+            f"{base_url} 排队等待：平均 {scheduler_stats['mean_wait_seconds']:.2f} s，"
+            f"p95 {scheduler_stats['p95_wait_seconds']:.2f} s，最长 {scheduler_stats['max_wait_seconds']:.2f} s"
+        )
+    
     # PKU_PHY_fermion_for_testing.shutdown()
     
+    await close_openai_clients_async()
+    
     print("Program OK.")
 
 